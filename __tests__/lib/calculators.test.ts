@@ -0,0 +1,46 @@
+import {
+  calculatorEntries,
+  getCalculatorEntry,
+  getCalculatorsByCategory,
+  getLoadedCalculator,
+  loadCalculator,
+  searchCalculators,
+} from '../../lib/calculators';
+
+const COCKCROFT_GAULT = 'Cockcroft-Gault Creatinine Clearance';
+
+describe('calculator registry', () => {
+  it('indexes the manifest by name and category without loading modules', () => {
+    const entry = getCalculatorEntry(COCKCROFT_GAULT);
+
+    expect(entry?.category).toBe('nephrology');
+    expect(getCalculatorEntry('Unknown')).toBeUndefined();
+    expect(getCalculatorsByCategory().get('nephrology')).toContain(entry);
+    expect(getLoadedCalculator(COCKCROFT_GAULT)).toBeUndefined();
+  });
+
+  it('searches keywords by word prefix in English and Russian', () => {
+    expect(searchCalculators('creat clear')[0]?.name).toBe(COCKCROFT_GAULT);
+    expect(searchCalculators('Клиренс')[0]?.name).toBe(COCKCROFT_GAULT);
+    expect(searchCalculators('creatinine cardiology')).toEqual([]);
+    expect(searchCalculators('  ')).toHaveLength(calculatorEntries.length);
+  });
+
+  it('loads a calculator once and caches it', async () => {
+    const entry = getCalculatorEntry(COCKCROFT_GAULT)!;
+    const load = jest.spyOn(entry, 'load');
+
+    const [first, second] = await Promise.all([loadCalculator(COCKCROFT_GAULT), loadCalculator(COCKCROFT_GAULT)]);
+    const third = await loadCalculator(COCKCROFT_GAULT);
+
+    expect(load).toHaveBeenCalledTimes(1);
+    expect(first).toBe(second);
+    expect(third).toBe(first);
+    expect(getLoadedCalculator(COCKCROFT_GAULT)).toBe(first);
+    expect(first.calculate({ age: 65, weight: 72, creatinine: 1.2, sex_factor: 1 })).toBe(62.5);
+  });
+
+  it('rejects unknown calculators', async () => {
+    await expect(loadCalculator('Unknown')).rejects.toThrow("Unknown calculator 'Unknown'");
+  });
+});
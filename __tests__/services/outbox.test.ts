@@ -0,0 +1,158 @@
+import { ApiError } from '../../services/api';
+import { Outbox, OUTBOX_BATCH_SIZE, type BatchItemOutcome, type OutboxEntry } from '../../services/outbox';
+
+class MemoryStorage {
+  data = new Map<string, string>();
+
+  async get(key: string) {
+    return this.data.get(key) ?? null;
+  }
+
+  async set(key: string, value: string) {
+    this.data.set(key, value);
+  }
+
+  async remove(key: string) {
+    this.data.delete(key);
+  }
+}
+
+const input = (resultValue: number) => ({
+  calculatorName: 'Cockcroft-Gault Creatinine Clearance',
+  inputData: { age: 65, weight: 72.5, creatinine: 1.2, sex: 'male' },
+  resultValue,
+});
+
+const accept = (entries: OutboxEntry[]): BatchItemOutcome[] =>
+  entries.map((entry) => ({ idempotencyKey: entry.key, status: 201, result: { id: `id-${entry.key}` } as any }));
+
+const offline = async (): Promise<BatchItemOutcome[]> => {
+  throw new Error('Network request failed');
+};
+
+describe('Outbox', () => {
+  beforeEach(() => {
+    jest.useFakeTimers();
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+  });
+
+  it('should keep queued saves across restarts', async () => {
+    const storage = new MemoryStorage();
+    const first = new Outbox(offline, storage);
+    await first.enqueue(input(1));
+    await first.enqueue(input(2));
+    await first.flush();
+
+    const second = new Outbox(async (entries) => accept(entries), storage);
+    await second.load();
+    expect(second.pending().map((entry) => entry.payload.resultValue)).toEqual([1, 2]);
+  });
+
+  it('should coalesce identical saves made in quick succession', async () => {
+    const outbox = new Outbox(offline, new MemoryStorage());
+    const first = await outbox.enqueue(input(1));
+    const second = await outbox.enqueue(input(1));
+
+    expect(second.key).toBe(first.key);
+    expect(outbox.pending()).toHaveLength(1);
+  });
+
+  it('should send the queue in batches with stable idempotency keys', async () => {
+    const send = jest.fn()
+      .mockImplementationOnce(offline)
+      .mockImplementation(async (entries: OutboxEntry[]) => accept(entries));
+    const outbox = new Outbox(send, new MemoryStorage());
+    const saved = jest.fn();
+    outbox.subscribe({ onSaved: saved });
+
+    for (let i = 0; i < OUTBOX_BATCH_SIZE + 5; i++) {
+      await outbox.enqueue(input(i));
+    }
+    await outbox.flush();
+    expect(outbox.pending()).toHaveLength(OUTBOX_BATCH_SIZE + 5);
+
+    await outbox.flush();
+    expect(send).toHaveBeenCalledTimes(3);
+    expect(send.mock.calls[1][0]).toHaveLength(OUTBOX_BATCH_SIZE);
+    // The retried batch reuses the keys of the failed attempt
+    expect(send.mock.calls[1][0].map((entry: OutboxEntry) => entry.key))
+      .toEqual(send.mock.calls[0][0].map((entry: OutboxEntry) => entry.key));
+    expect(saved).toHaveBeenCalledTimes(OUTBOX_BATCH_SIZE + 5);
+    expect(outbox.pending()).toHaveLength(0);
+  });
+
+  it('should keep saves the server rejects for the user', async () => {
+    const storage = new MemoryStorage();
+    const outbox = new Outbox(
+      async (entries) => entries.map((entry) => ({ idempotencyKey: entry.key, status: 422, detail: 'invalid' })),
+      storage
+    );
+    const rejected = jest.fn();
+    outbox.subscribe({ onRejected: rejected });
+
+    await outbox.enqueue(input(1));
+    await outbox.flush();
+
+    expect(rejected).toHaveBeenCalledWith(expect.objectContaining({ payload: input(1), status: 422 }), 'invalid');
+    expect(outbox.pending()).toHaveLength(0);
+    expect(outbox.rejected()).toEqual([expect.objectContaining({ payload: input(1), detail: 'invalid' })]);
+    expect(JSON.parse(outbox.exportRejected())).toEqual([expect.objectContaining({ resultValue: 1, status: 422 })]);
+
+    // Kept across restarts until discarded
+    const restarted = new Outbox(offline, storage);
+    await restarted.load();
+    expect(restarted.rejected()).toHaveLength(1);
+    await restarted.discardRejected(restarted.rejected()[0].key);
+    expect(restarted.rejected()).toHaveLength(0);
+    const again = new Outbox(offline, storage);
+    await again.load();
+    expect(again.rejected()).toHaveLength(0);
+  });
+
+  it('should retry a rejected save through the single create', async () => {
+    const create = jest.fn()
+      .mockRejectedValueOnce(new ApiError('invalid', 422))
+      .mockImplementation(async (_payload, key: string) => ({ id: `id-${key}` }));
+    const outbox = new Outbox(
+      async (entries) => entries.map((entry) => ({ idempotencyKey: entry.key, status: 409, detail: 'conflict' })),
+      new MemoryStorage(),
+      create
+    );
+    const saved = jest.fn();
+    outbox.subscribe({ onSaved: saved });
+    const entry = await outbox.enqueue(input(1));
+    await outbox.flush();
+
+    await expect(outbox.retryRejected(entry.key)).rejects.toThrow('invalid');
+    expect(outbox.rejected()).toEqual([expect.objectContaining({ key: entry.key, status: 422 })]);
+
+    const result = await outbox.retryRejected(entry.key);
+    // A 409 means the original key is taken: both attempts use one new key
+    const retryKey = create.mock.calls[0][1];
+    expect(retryKey).not.toBe(entry.key);
+    expect(create.mock.calls[1][1]).toBe(retryKey);
+    expect(result).toEqual({ id: `id-${retryKey}` });
+    expect(saved).toHaveBeenCalledWith(expect.objectContaining({ key: entry.key }), result);
+    expect(outbox.rejected()).toHaveLength(0);
+  });
+
+  it('should send saves too old for the batch through the single create', async () => {
+    const send = jest.fn(async (entries: OutboxEntry[]) => accept(entries));
+    const create = jest.fn(async (_payload: unknown, key: string) => ({ id: `id-${key}` }) as any);
+    const outbox = new Outbox(send, new MemoryStorage(), create);
+    jest.setSystemTime(Date.now() - 29.5 * 24 * 60 * 60 * 1000);
+    const stale = await outbox.enqueue(input(1));
+    jest.setSystemTime(Date.now() + 29.5 * 24 * 60 * 60 * 1000);
+    const fresh = await outbox.enqueue(input(2));
+
+    await outbox.flush();
+
+    expect(create).toHaveBeenCalledWith(input(1), stale.key);
+    expect(send).toHaveBeenCalledTimes(1);
+    expect(send.mock.calls[0][0].map((entry: OutboxEntry) => entry.key)).toEqual([fresh.key]);
+    expect(outbox.pending()).toHaveLength(0);
+  });
+});
@@ -3,7 +3,7 @@ API v1 router
 """
 from fastapi import APIRouter
 
-from app.api.v1 import auth, calculation_results, profiles, health, integrations
+from app.api.v1 import auth, calculation_results, profiles, health, integrations, dose_adjustments, usage
 
 api_router = APIRouter()
 
@@ -13,3 +13,5 @@ api_router.include_router(auth.router, tags=["auth"])
 api_router.include_router(calculation_results.router, tags=["calculation_results"])
 api_router.include_router(profiles.router, tags=["profiles"])
 api_router.include_router(integrations.router, tags=["integrations"])
+api_router.include_router(dose_adjustments.router, tags=["dose_adjustments"])
+api_router.include_router(usage.router, tags=["usage"])
@@ -5,7 +5,9 @@ This module is kept for future custom auth requirements.
 """
 from fastapi import APIRouter
 
-router = APIRouter()
+from app.core.metrics import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
 
 # Firebase Auth handles authentication
 # Custom auth endpoints can be added here if needed
@@ -1,20 +1,42 @@
 """
 Calculation Results API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
-from typing import List, Dict, Any
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import ValidationError
 
+from app.core.cache import hashed_key, shared_cache
+from app.core.config import settings
+from app.core.counters import usage_counters
 from app.core.firebase_auth import get_current_user_firebase
+from app.core.rate_limit import rate_limit
+from app.core.events import BrokerClosed, StreamClosed, TooManyConnections, result_events
 from app.core.firestore import FirestoreCalculationResult
-from app.schemas import CalculationResultCreate, CalculationResultResponse
-from app.services.pdf_export import pdf_exporter
-from app.services.external_integrations import analytics_service
+from app.core.idempotency import IdempotencyKeyConflict
+from app.core.metrics import TimedRoute, timed
+from app.schemas import (
+    CalculationResultBatchCreate,
+    CalculationResultBatchItem,
+    CalculationResultBatchResponse,
+    CalculationResultCreate,
+    CalculationResultResponse,
+    CalculationSeriesResponse,
+)
 
-router = APIRouter()
+# Services are imported inside the endpoints that use them so that app
+# startup (and /health) doesn't load ReportLab or the integration stack.
 
+router = APIRouter(route_class=TimedRoute)
 
-@router.get("/calculation_results", response_model=List[Dict[str, Any]])
+
+@router.get(
+    "/calculation_results",
+    response_model=List[Dict[str, Any]],
+    dependencies=[Depends(rate_limit("results_read"))]
+)
 async def get_calculation_results(
     current_user: Dict[str, Any] = Depends(get_current_user_firebase)
 ):
@@ -23,23 +45,55 @@ async def get_calculation_results(
     return results
 
 
-@router.post("/calculation_results", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/calculation_results",
+    response_model=Dict[str, Any],
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("results_write"))]
+)
 async def create_calculation_result(
     calculation_data: CalculationResultCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: Dict[str, Any] = Depends(get_current_user_firebase)
 ):
-    """Create new calculation result"""
+    """Create new calculation result (retries with the same Idempotency-Key return the original)"""
+    from app.services.external_integrations import analytics_service
+    from app.services.timeseries import series_cache
+    
     # Save result to Firestore
-    new_result = await FirestoreCalculationResult.create(
-        user_id=current_user['id'],
-        calculator_name=calculation_data.calculator_name,
-        calculator_name_ru=calculation_data.calculator_name_ru,
-        input_data=calculation_data.input_data,
-        result_value=calculation_data.result_value,
-        interpretation=calculation_data.interpretation
-    )
+    if idempotency_key:
+        try:
+            new_result, replayed = await FirestoreCalculationResult.create_idempotent(
+                user_id=current_user['id'],
+                idempotency_key=idempotency_key,
+                calculator_name=calculation_data.calculator_name,
+                calculator_name_ru=calculation_data.calculator_name_ru,
+                input_data=calculation_data.input_data,
+                result_value=calculation_data.result_value,
+                interpretation=calculation_data.interpretation
+            )
+        except IdempotencyKeyConflict as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+            return new_result
+    else:
+        new_result = await FirestoreCalculationResult.create(
+            user_id=current_user['id'],
+            calculator_name=calculation_data.calculator_name,
+            calculator_name_ru=calculation_data.calculator_name_ru,
+            input_data=calculation_data.input_data,
+            result_value=calculation_data.result_value,
+            interpretation=calculation_data.interpretation
+        )
     
-    # Track analytics event
+    # Trend series for this calculator now has a new point
+    series_cache.invalidate(current_user['id'], calculation_data.calculator_name)
+    
+    # Global per-calculator count and analytics event
+    usage_counters.record(calculation_data.calculator_name)
     analytics_service.track_calculation(
         calculator_name=calculation_data.calculator_name,
         calculator_category="medical",
@@ -49,7 +103,203 @@ async def create_calculation_result(
     return new_result
 
 
-@router.get("/calculation_results/{result_id}", response_model=Dict[str, Any])
+@router.post(
+    "/calculation_results/batch",
+    response_model=CalculationResultBatchResponse,
+    dependencies=[Depends(rate_limit("results_batch"))]
+)
+async def create_calculation_results_batch(
+    batch: CalculationResultBatchCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """
+    Create up to 100 results in one request (offline outbox flush).
+    
+    Every item carries its own idempotency_key, so a retried batch never
+    duplicates results. Each item gets its own status: 201 created,
+    200 replayed, 409 key conflict or 422 invalid.
+    """
+    from app.services.external_integrations import analytics_service
+    from app.services.timeseries import series_cache
+    
+    responses: List[Optional[Dict[str, Any]]] = [None] * len(batch.items)
+    valid_items: List[CalculationResultBatchItem] = []
+    valid_positions: List[int] = []
+    for position, raw_item in enumerate(batch.items):
+        try:
+            item = CalculationResultBatchItem.model_validate(raw_item)
+        except ValidationError as e:
+            responses[position] = {
+                "idempotency_key": raw_item.get("idempotency_key"),
+                "status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "detail": e.errors(include_url=False, include_context=False, include_input=False),
+            }
+            continue
+        valid_items.append(item)
+        valid_positions.append(position)
+    
+    outcomes = await FirestoreCalculationResult.create_idempotent_many(
+        current_user['id'],
+        [(item.idempotency_key, item.model_dump(exclude={"idempotency_key"})) for item in valid_items]
+    )
+    
+    for position, item, (result, replayed, conflict) in zip(valid_positions, valid_items, outcomes):
+        if conflict is not None:
+            responses[position] = {
+                "idempotency_key": item.idempotency_key,
+                "status": status.HTTP_409_CONFLICT,
+                "detail": str(conflict),
+            }
+            continue
+        responses[position] = {
+            "idempotency_key": item.idempotency_key,
+            "status": status.HTTP_200_OK if replayed else status.HTTP_201_CREATED,
+            "result": result,
+        }
+        if not replayed:
+            series_cache.invalidate(current_user['id'], item.calculator_name)
+            usage_counters.record(item.calculator_name)
+            analytics_service.track_calculation(
+                calculator_name=item.calculator_name,
+                calculator_category="medical",
+                user_id=current_user['id']
+            )
+    
+    return {"results": responses}
+
+
+# Fixed paths (series, stream, exports) are registered before
+# /calculation_results/{result_id} so they aren't matched as a result id.
+
+@router.get(
+    "/calculation_results/series",
+    response_model=CalculationSeriesResponse,
+    dependencies=[Depends(rate_limit("results_series"))]
+)
+async def get_calculation_series(
+    calculator: str = Query(..., description="Calculator name"),
+    points: int = Query(500, ge=3, le=settings.SERIES_MAX_POINTS, description="Maximum points returned"),
+    rollup: Optional[Literal["day", "week"]] = Query(None, description="Return min/max/mean buckets instead of points"),
+    since: Optional[datetime] = Query(None, description="Performed at or after (UTC if no offset)"),
+    until: Optional[datetime] = Query(None, description="Performed before (UTC if no offset)"),
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """result_value trend for one calculator, LTTB-downsampled or rolled up by day/week"""
+    from app.services.timeseries import series_cache, lttb, rollup as rollup_points
+    
+    series = await series_cache.get(current_user['id'], calculator)
+    
+    if since is None and until is None:
+        times, values = series.times, series.values
+    else:
+        times, values = series.window(since, until)
+    
+    response = {"calculator_name": calculator, "total_points": len(times)}
+    if rollup:
+        response["rollup"] = rollup
+        if since is None and until is None:
+            response["rollups"] = series.rollup(rollup)
+        else:
+            response["rollups"] = rollup_points(times, values, rollup)
+        return response
+    
+    indices = lttb(times, values, points)
+    response["downsampled"] = len(indices) < len(times)
+    response["points"] = [
+        {"performed_at": datetime.fromtimestamp(times[i], tz=timezone.utc), "value": values[i]}
+        for i in indices
+    ]
+    return response
+
+
+@router.get(
+    "/calculation_results/stream",
+    dependencies=[Depends(rate_limit("results_stream"))]
+)
+async def stream_calculation_results(
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """
+    Server-Sent Events stream of the user's result changes.
+    
+    Events: "created" (the new result), "deleted" ({"id"}) and "resync"
+    (events were dropped - refetch the list). Comment lines are heartbeats.
+    """
+    try:
+        subscription = result_events.subscribe(current_user['id'])
+    except TooManyConnections as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except BrokerClosed as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"}
+        )
+    
+    async def event_frames():
+        try:
+            # Reconnect delay hint for EventSource clients; also flushes headers
+            yield "retry: 3000\n\n"
+            while True:
+                frame = await subscription.next_frame(settings.EVENT_HEARTBEAT_SECONDS)
+                yield frame if frame is not None else ": heartbeat\n\n"
+        except StreamClosed:
+            # Worker shutting down: ending the response lets the client reconnect elsewhere
+            pass
+        finally:
+            result_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/calculation_results/export.ndjson",
+    dependencies=[Depends(rate_limit("results_export"))]
+)
+async def export_calculation_results_ndjson(
+    calculator: Optional[str] = Query(None, description="Only results of this calculator"),
+    since: Optional[datetime] = Query(None, description="Performed at or after (UTC if no offset)"),
+    until: Optional[datetime] = Query(None, description="Performed before (UTC if no offset)"),
+    flatten: bool = Query(True, description="Flatten input_data into input_<name> keys"),
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """Stream calculation history as newline-delimited JSON, oldest first"""
+    from app.services.history_export import stream_ndjson
+    
+    return StreamingResponse(
+        stream_ndjson(current_user['id'], flatten=flatten, calculator_name=calculator, since=since, until=until),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="calculation_results.ndjson"'}
+    )
+
+
+@router.get(
+    "/calculation_results/export.csv",
+    dependencies=[Depends(rate_limit("results_export"))]
+)
+async def export_calculation_results_csv(
+    calculator: Optional[str] = Query(None, description="Only results of this calculator"),
+    since: Optional[datetime] = Query(None, description="Performed at or after (UTC if no offset)"),
+    until: Optional[datetime] = Query(None, description="Performed before (UTC if no offset)"),
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """Stream calculation history as CSV with one column per input field, oldest first"""
+    from app.services.history_export import stream_csv
+    
+    return StreamingResponse(
+        stream_csv(current_user['id'], calculator_name=calculator, since=since, until=until),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="calculation_results.csv"'}
+    )
+
+
+@router.get(
+    "/calculation_results/{result_id}",
+    response_model=Dict[str, Any],
+    dependencies=[Depends(rate_limit("results_read"))]
+)
 async def get_calculation_result(
     result_id: str,
     current_user: Dict[str, Any] = Depends(get_current_user_firebase)
@@ -63,28 +313,40 @@ async def get_calculation_result(
     return calc_result
 
 
-@router.get("/calculation_results/{result_id}/export")
+@router.get(
+    "/calculation_results/{result_id}/export",
+    dependencies=[Depends(rate_limit("pdf_export"))]
+)
 async def export_calculation_result_pdf(
     result_id: str,
     current_user: Dict[str, Any] = Depends(get_current_user_firebase)
 ):
     """Export calculation result as PDF"""
+    from app.services.pdf_export import RESULT_PDF_CACHE, get_pdf_exporter
+    from app.services.external_integrations import analytics_service
+    
     # Get calculation result from Firestore
     calc_result = await FirestoreCalculationResult.get_by_id(result_id, current_user['id'])
     
     if not calc_result:
         raise HTTPException(status_code=404, detail="Calculation result not found")
     
-    # Generate PDF
-    pdf_buffer = pdf_exporter.generate_result_pdf(
-        calculator_name=calc_result['calculator_name'],
-        calculator_category="medical",
-        input_data=calc_result['input_data'],
-        result_value=calc_result['result_value'],
-        interpretation=calc_result.get('interpretation'),
-        performed_at=calc_result['performed_at'],
-        user_name=current_user.get('name', 'User')
-    )
+    user_name = current_user.get('name', 'User')
+    
+    def render_pdf() -> bytes:
+        with timed("pdf"):
+            return get_pdf_exporter().generate_result_pdf(
+                calculator_name=calc_result['calculator_name'],
+                calculator_category="medical",
+                input_data=calc_result['input_data'],
+                result_value=calc_result['result_value'],
+                interpretation=calc_result.get('interpretation'),
+                performed_at=calc_result['performed_at'],
+                user_name=user_name
+            ).getvalue()
+    
+    # Generate PDF (rendered once per result and name, then shared by all workers)
+    pdf_bytes = await shared_cache.get_or_load(RESULT_PDF_CACHE, hashed_key(result_id, user_name), render_pdf)
     
     # Track analytics event
     analytics_service.track_event(
@@ -98,7 +360,7 @@ async def export_calculation_result_pdf(
     
     # Return PDF as streaming response
     return StreamingResponse(
-        pdf_buffer,
+        BytesIO(pdf_bytes),
         media_type="application/pdf",
         headers={
             "Content-Disposition": f'attachment; filename="medical_calc_result_{result_id}.pdf"'
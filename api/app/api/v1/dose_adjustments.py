@@ -0,0 +1,90 @@
+"""
+Dose adjustment API endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.firebase_auth import get_current_user_firebase
+from app.core.firestore import FirestoreCalculationResult
+from app.core.rate_limit import rate_limit
+from app.core.metrics import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+# Saved results of this calculator carry CrCl (mL/min) as result_value
+CRCL_CALCULATOR_NAME = "Cockcroft-Gault Creatinine Clearance"
+
+
+class DoseAdjustmentRequest(BaseModel):
+    crcl: Optional[float] = Field(None, ge=0, le=500, description="Creatinine clearance, mL/min")
+    result_id: Optional[str] = Field(None, description="Saved Cockcroft-Gault result to take CrCl from")
+    medications: List[str] = Field(..., min_length=1, max_length=200)
+
+    @model_validator(mode="after")
+    def check_crcl_source(self):
+        if (self.crcl is None) == (self.result_id is None):
+            raise ValueError("Provide exactly one of crcl or result_id")
+        return self
+
+
+class DoseAdjustment(BaseModel):
+    medication: str
+    drug: Optional[str] = None
+    found: bool
+    indication: Optional[str] = None
+    crcl_min: Optional[float] = None
+    crcl_max: Optional[float] = None
+    action: Optional[str] = None
+    recommendation: Optional[str] = None
+
+
+class DoseAdjustmentResponse(BaseModel):
+    crcl: float
+    result_id: Optional[str] = None
+    adjustments: List[DoseAdjustment]
+
+
+@router.post(
+    "/dose_adjustments",
+    response_model=DoseAdjustmentResponse,
+    dependencies=[Depends(rate_limit("dose_adjustments"))]
+)
+async def get_dose_adjustments(
+    request: DoseAdjustmentRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """Renal dose adjustments for a medication list at one CrCl value"""
+    from app.services.dose_adjustment import get_dosing_index
+    
+    crcl = request.crcl
+    if request.result_id is not None:
+        calc_result = await FirestoreCalculationResult.get_by_id(request.result_id, current_user['id'])
+        if not calc_result:
+            raise HTTPException(status_code=404, detail="Calculation result not found")
+        if calc_result.get('calculator_name') != CRCL_CALCULATOR_NAME:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Result is not a {CRCL_CALCULATOR_NAME} calculation"
+            )
+        crcl = calc_result['result_value']
+    
+    return {
+        "crcl": crcl,
+        "result_id": request.result_id,
+        "adjustments": get_dosing_index().lookup_many(request.medications, crcl)
+    }
+
+
+@router.get(
+    "/dose_adjustments/drugs",
+    response_model=List[str],
+    dependencies=[Depends(rate_limit("dose_adjustments"))]
+)
+async def list_dose_adjustment_drugs(
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+):
+    """Drugs covered by the renal dosing table"""
+    from app.services.dose_adjustment import get_dosing_index
+    
+    return get_dosing_index().drugs
@@ -3,8 +3,9 @@ Health check endpoint
 """
 from fastapi import APIRouter
 from app.schemas import HealthResponse
+from app.core.metrics import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.get("/health", response_model=HealthResponse)
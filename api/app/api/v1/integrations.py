@@ -6,9 +6,10 @@ from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 
 from app.core.firebase_auth import get_current_user_firebase
-from app.services.external_integrations import medical_data_service
+from app.core.rate_limit import rate_limit
+from app.core.metrics import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 class ReferenceRangeQuery(BaseModel):
@@ -22,13 +23,19 @@ class ICD10SearchResponse(BaseModel):
     description: str
 
 
-@router.post("/integrations/reference-ranges")
+@router.post(
+    "/integrations/reference-ranges",
+    dependencies=[Depends(rate_limit("reference_ranges"))]
+)
 async def get_reference_ranges(
     query: ReferenceRangeQuery,
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user_firebase)
 ):
     """Get medical reference ranges"""
-    result = medical_data_service.get_reference_ranges(
+    # Imported on first use to keep the integration stack out of startup
+    from app.services.external_integrations import medical_data_service
+    
+    result = await medical_data_service.get_reference_ranges_cached(
         test_name=query.test_name,
         age=query.age,
         gender=query.gender
@@ -40,14 +47,20 @@ async def get_reference_ranges(
     return result
 
 
-@router.get("/integrations/icd10/search", response_model=List[ICD10SearchResponse])
+@router.get(
+    "/integrations/icd10/search",
+    response_model=List[ICD10SearchResponse],
+    dependencies=[Depends(rate_limit("icd10_search"))]
+)
 async def search_icd10(
     q: str,
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user_firebase)
 ):
     """Search ICD-10 diagnostic codes"""
+    from app.services.external_integrations import medical_data_service
+    
     if not q or len(q) < 2:
         raise HTTPException(status_code=400, detail="Query must be at least 2 characters")
     
-    results = medical_data_service.search_icd10_codes(q)
+    results = await medical_data_service.search_icd10_codes_cached(q)
     return results
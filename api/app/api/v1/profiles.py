@@ -4,20 +4,29 @@ Profile API endpoints
 from fastapi import APIRouter, Depends
 from typing import Dict, Any
 
-from app.core.firebase_auth import get_current_user_firebase
-from app.core.firestore import get_firestore_client
+from app.core.cache import shared_cache
+from app.core.firebase_auth import USERS_BY_EMAIL_CACHE, get_current_user_firebase
+from app.core.rate_limit import rate_limit
+from app.core.firestore import get_firestore_client, user_loader
 from app.schemas import ProfileUpdate
+from app.core.metrics import TimedRoute, timed
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-@router.get("/profiles/me")
+@router.get(
+    "/profiles/me",
+    dependencies=[Depends(rate_limit("profile"))]
+)
 async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user_firebase)):
     """Get current user profile"""
     return current_user
 
 
-@router.patch("/profiles/me")
+@router.patch(
+    "/profiles/me",
+    dependencies=[Depends(rate_limit("profile"))]
+)
 async def update_profile(
     profile_data: ProfileUpdate,
     current_user: Dict[str, Any] = Depends(get_current_user_firebase)
@@ -37,10 +46,16 @@ async def update_profile(
     
     # Update Firestore document
     if update_data:
-        user_doc_ref.update(update_data)
-        
-        # Get updated user data
-        updated_doc = user_doc_ref.get()
+        with timed("firestore"):
+            user_doc_ref.update(update_data)
+            user_loader.clear(current_user['id'])
+            
+            # Get updated user data
+            updated_doc = user_doc_ref.get()
+        # Drop the cached user so the change is seen by every worker
+        await shared_cache.delete(USERS_BY_EMAIL_CACHE, current_user.get('email'))
+        if profile_data.email is not None:
+            await shared_cache.delete(USERS_BY_EMAIL_CACHE, profile_data.email)
         if updated_doc.exists:
             return updated_doc.to_dict()
     
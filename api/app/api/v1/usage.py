@@ -0,0 +1,71 @@
+"""
+Usage statistics API endpoints
+"""
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional, Dict, Any
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.counters import usage_counters
+from app.core.firebase_auth import require_usage_admin
+from app.core.rate_limit import rate_limit
+from app.core.metrics import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+class DailyUsage(BaseModel):
+    day: date
+    total: int
+    calculators: Dict[str, int]
+
+
+class UsageCountsResponse(BaseModel):
+    since: date
+    until: date
+    total: int
+    calculators: Dict[str, int]
+    days: List[DailyUsage]
+
+
+@router.get(
+    "/usage/calculations",
+    response_model=UsageCountsResponse,
+    dependencies=[Depends(rate_limit("usage_counts"))]
+)
+async def get_calculation_counts(
+    since: Optional[date] = Query(None, description="First UTC day (default: until)"),
+    until: Optional[date] = Query(None, description="Last UTC day (default: today)"),
+    current_user: Dict[str, Any] = Depends(require_usage_admin)
+):
+    """
+    Calculations per calculator per UTC day, across all users (up to a few
+    seconds behind). Only for USAGE_ADMIN_EMAILS accounts.
+    """
+    until = until or datetime.now(timezone.utc).date()
+    since = since or until
+    if since > until:
+        raise HTTPException(status_code=400, detail="since must not be after until")
+    if (until - since).days >= settings.COUNTER_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {settings.COUNTER_MAX_DAYS} days")
+    
+    counts = await usage_counters.daily_counts(since, until)
+    
+    days = []
+    totals: Dict[str, int] = {}
+    day = since
+    while day <= until:
+        by_calculator = counts.get(day.isoformat(), {})
+        for name, count in by_calculator.items():
+            totals[name] = totals.get(name, 0) + count
+        days.append({"day": day, "total": sum(by_calculator.values()), "calculators": by_calculator})
+        day += timedelta(days=1)
+    
+    return {
+        "since": since,
+        "until": until,
+        "total": sum(totals.values()),
+        "calculators": totals,
+        "days": days,
+    }
@@ -0,0 +1,238 @@
+"""
+Calculation result archive
+Cold storage for old results. app/services/archive.py compacts results
+older than ARCHIVE_AFTER_DAYS into gzipped JSON blobs per user and month
+and removes them from calculation_results. A month is split into parts of
+at most ARCHIVE_PART_MAX_RESULTS results, so that each part's manifest
+document (result_archives), which records the blob and the ids it holds,
+stays far below Firestore's 1 MiB document limit. users/{id}.has_archive
+tells read paths whether to look here at all.
+
+Blobs are never rewritten in place: re-archiving a month writes a new
+generation of parts and repoints the manifests in one batch, so a blob can
+be cached by its key and readers never see two generations mixed.
+
+ARCHIVE_BACKEND: "local" (files under ARCHIVE_LOCAL_DIR - the object
+storage stand-in for development and tests) or "firebase" (the
+FIREBASE_STORAGE_BUCKET Cloud Storage bucket).
+"""
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.cache import CacheNamespace, shared_cache
+from app.core.config import settings
+from app.core.firestore import RESULT_ARCHIVES_COLLECTION, get_firestore_client
+
+# Decoded month blobs; keys change whenever a month is re-archived
+ARCHIVE_MONTHS_CACHE = CacheNamespace("archive_months", ttl_seconds=3600)
+
+# Result fields stored as ISO strings in the blob and restored on read
+DATETIME_FIELDS = ("performed_at", "created_at")
+
+
+class LocalObjectStore:
+    """Object storage stand-in: one file per key under a root directory"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split("/")))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Object key escapes the archive directory: {key}")
+        return path
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temporary name first so readers never see a partial blob
+        temp_path = f"{path}.tmp-{os.getpid()}"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class FirebaseObjectStore:
+    """Cloud Storage bucket of the Firebase project"""
+
+    def __init__(self, bucket_name: str):
+        from firebase_admin import storage
+        from app.core.firebase_auth import ensure_firebase
+        ensure_firebase()
+        self._bucket = storage.bucket(bucket_name or None)
+
+    def put(self, key: str, data: bytes):
+        self._bucket.blob(key).upload_from_string(data, content_type="application/gzip")
+
+    def get(self, key: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._bucket.blob(key).download_as_bytes()
+        except NotFound:
+            return None
+
+    def delete(self, key: str):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._bucket.blob(key).delete()
+        except NotFound:
+            pass
+
+
+def archive_object_key(user_id: str, month: str, generation: int, part: int) -> str:
+    return f"calculation_results/{user_id}/{month}/{generation}-{part}.json.gz"
+
+
+def manifest_document_id(user_id: str, month: str, part: int) -> str:
+    return f"{user_id}_{month}_{part}"
+
+
+def month_of(performed_at: datetime) -> str:
+    return performed_at.strftime("%Y-%m")
+
+
+def encode_month(results: List[Dict[str, Any]]) -> bytes:
+    """Gzipped JSON of (a part of) a month's results, each with its 'id'"""
+    payload = json.dumps(
+        {"results": results},
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value),
+    )
+    return gzip.compress(payload.encode("utf-8"), compresslevel=6)
+
+
+def decode_month(blob: bytes) -> List[Dict[str, Any]]:
+    results = json.loads(gzip.decompress(blob))["results"]
+    for result in results:
+        for field in DATETIME_FIELDS:
+            if isinstance(result.get(field), str):
+                result[field] = datetime.fromisoformat(result[field])
+    return results
+
+
+class ResultArchive:
+    """Read access to archived results"""
+
+    def __init__(self):
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            if settings.ARCHIVE_BACKEND == "firebase":
+                self._store = FirebaseObjectStore(settings.FIREBASE_STORAGE_BUCKET)
+            else:
+                self._store = LocalObjectStore(settings.ARCHIVE_LOCAL_DIR)
+        return self._store
+
+    def manifests(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's part manifests, oldest first"""
+        db = get_firestore_client()
+        query = db.collection(RESULT_ARCHIVES_COLLECTION).where("user_id", "==", user_id)
+        return sorted(
+            (doc.to_dict() for doc in query.stream()),
+            key=lambda manifest: (manifest["month"], manifest["part"])
+        )
+
+    def month_manifests(self, user_id: str, month: str) -> List[Dict[str, Any]]:
+        """Part manifests of one user-month, in order"""
+        db = get_firestore_client()
+        query = (
+            db.collection(RESULT_ARCHIVES_COLLECTION)
+            .where("user_id", "==", user_id)
+            .where("month", "==", month)
+        )
+        return sorted((doc.to_dict() for doc in query.stream()), key=lambda manifest: manifest["part"])
+
+    def load_month(self, manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Results of one archived part, oldest first"""
+        blob = self.store.get(manifest["object_key"])
+        if blob is None:
+            raise RuntimeError(f"Archived month is missing from storage: {manifest['object_key']}")
+        return decode_month(blob)
+
+    async def load_month_cached(self, manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await shared_cache.get_or_load(
+            ARCHIVE_MONTHS_CACHE, manifest["object_key"], lambda: self.load_month(manifest)
+        )
+
+    async def find(self, user_id: str, result_id: str) -> Optional[Dict[str, Any]]:
+        """An archived result, or None"""
+        def find_manifest() -> Optional[Dict[str, Any]]:
+            db = get_firestore_client()
+            query = (
+                db.collection(RESULT_ARCHIVES_COLLECTION)
+                .where("user_id", "==", user_id)
+                .where("ids", "array_contains", result_id)
+                .limit(1)
+            )
+            for doc in query.stream():
+                return doc.to_dict()
+            return None
+
+        manifest = await asyncio.to_thread(find_manifest)
+        if manifest is None:
+            return None
+        for result in await self.load_month_cached(manifest):
+            if result["id"] == result_id:
+                return dict(result)
+        return None
+
+    async def recent(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` archived results, newest first"""
+        manifests = await asyncio.to_thread(self.manifests, user_id)
+        results: List[Dict[str, Any]] = []
+        for manifest in reversed(manifests):
+            if len(results) >= limit:
+                break
+            month = await self.load_month_cached(manifest)
+            results.extend(dict(result) for result in reversed(month[-(limit - len(results)):]))
+        return results
+
+    def iter_pages(
+        self,
+        user_id: str,
+        calculator_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """Pages of (id, data), one per archived part, oldest first (sync, for exports)"""
+        for manifest in self.manifests(user_id):
+            if since is not None and manifest["newest"] < since:
+                continue
+            if until is not None and manifest["oldest"] >= until:
+                continue
+            page = []
+            for result in self.load_month(manifest):
+                performed_at = result.get("performed_at")
+                if calculator_name and result.get("calculator_name") != calculator_name:
+                    continue
+                if since is not None and performed_at < since:
+                    continue
+                if until is not None and performed_at >= until:
+                    continue
+                data = dict(result)
+                page.append((data.pop("id"), data))
+            if page:
+                yield page
+
+
+result_archive = ResultArchive()
@@ -0,0 +1,391 @@
+"""
+Shared cache
+Two tiers: a per-worker LRU in front of a backend shared by all workers,
+so a value computed by one worker (a verified token, a rendered PDF) is
+reused by the others instead of being recomputed per process.
+
+CACHE_BACKEND selects the shared tier: "local" (none - the per-worker LRU
+only), "sqlite" (a file shared by the workers on one host, also the
+stand-in for tests) or "redis" (requires the redis package). Values are
+pickled, so the shared backend must only be writable by this service; the
+SQLite file is refused unless only this user can write to it.
+
+Concurrent misses for a key share one load within a worker, and a short
+lock in the shared tier makes other workers wait for that load instead of
+repeating it.
+"""
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+cache_requests_total = registry.counter(
+    "cache_requests_total", "Cache lookups by namespace and the tier that answered", ("namespace", "tier")
+)
+cache_errors_total = registry.counter(
+    "cache_backend_errors_total", "Shared cache backend errors (treated as misses)"
+)
+
+Loader = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class CacheNamespace:
+    """A group of keys with a shared TTL; bump version to orphan old entries"""
+
+    def __init__(self, name: str, ttl_seconds: float, version: int = 1):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+
+    def key(self, key: str) -> str:
+        return f"{settings.CACHE_KEY_PREFIX}:{self.name}:v{self.version}:{key}"
+
+
+def hashed_key(*parts: Any) -> str:
+    """Fixed-length key for long or sensitive parts (tokens, free-text queries)"""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class LocalLRU:
+    """Per-worker tier, bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        # key -> (expires at (monotonic), encoded value)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size_bytes += len(value)
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+
+def _check_private(st: os.stat_result, path: str, owners: Tuple[int, ...]):
+    if st.st_uid not in owners:
+        raise RuntimeError(f"Refusing cache path owned by another user: {path}")
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(f"Refusing cache path writable by other users: {path}")
+
+
+def private_sqlite_path(path: str) -> str:
+    """
+    Prepare the SQLite cache file (default: under a 0700 directory of our own
+    in the temp directory). Anyone who can write the file can run code in the
+    API through pickle, so paths other users own or can write are refused
+    (even our own file, if it was ever writable by others). The file is
+    created as, or restricted to, 0600.
+    """
+    if not hasattr(os, "getuid"):
+        return path
+    uid = os.getuid()
+    if not path:
+        directory = os.path.join(tempfile.gettempdir(), f"medcalc-cache-{uid}")
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        path = os.path.join(directory, "cache.sqlite3")
+
+    directory_stat = os.lstat(os.path.dirname(os.path.abspath(path)))
+    if stat.S_ISLNK(directory_stat.st_mode):
+        raise RuntimeError(f"Refusing cache directory that is a symlink: {path}")
+    _check_private(directory_stat, os.path.dirname(os.path.abspath(path)), (uid, 0))
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    try:
+        _check_private(os.fstat(fd), path, (uid,))
+        os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+    return path
+
+
+class SQLiteCacheBackend:
+    """Shared tier in a SQLite file; workers on the same host see each other's entries"""
+
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = private_sqlite_path(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        # Opened on first use in each process: the app is imported in the
+        # gunicorn master, and SQLite connections must not cross fork()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        # Connections inherited from a parent process; never used or closed here
+        self._inherited = []
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection (call with self._lock held)"""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        if self._conn is not None:
+            self._inherited.append(self._conn)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn, self._pid = conn, os.getpid()
+        return conn
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._connection().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def _add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE cache.expires_at <= ?",
+                (key, value, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set only if absent (or expired); True if this call set it"""
+        return await asyncio.to_thread(self._add, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class RedisCacheBackend:
+    """Shared tier in Redis (requires the redis package)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(await self._client.set(key, value, px=max(1, int(ttl * 1000)), nx=True))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class TwoTierCache:
+    """Per-worker LRU in front of an optional shared backend"""
+
+    # Polling interval while another worker holds the load lock
+    LOCK_POLL_SECONDS = 0.05
+
+    def __init__(self, backend=None):
+        self.local = LocalLRU(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_MAX_BYTES)
+        self.backend = backend
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _local_ttl(self, ttl: float) -> float:
+        # With a shared tier, a worker's copy is only kept briefly so that
+        # deletes made by other workers take effect within CACHE_LOCAL_TTL_SECONDS
+        if self.backend is None:
+            return ttl
+        return min(ttl, settings.CACHE_LOCAL_TTL_SECONDS)
+
+    async def _backend_call(self, method: str, *args) -> Any:
+        """Call the shared backend; errors are logged and treated as misses"""
+        try:
+            return await getattr(self.backend, method)(*args)
+        except Exception as e:
+            cache_errors_total.inc()
+            logger.error(f"Cache backend {method} failed: {e}")
+            return None
+
+    async def get(self, namespace: CacheNamespace, key: str) -> Optional[Any]:
+        """Cached value, or None on a miss"""
+        full_key = namespace.key(key)
+        encoded = self.local.get(full_key)
+        if encoded is not None:
+            cache_requests_total.inc(namespace.name, "local")
+            return pickle.loads(encoded)
+
+        if self.backend is not None:
+            encoded = await self._backend_call("get", full_key)
+            if encoded is not None:
+                cache_requests_total.inc(namespace.name, "shared")
+                self.local.set(full_key, encoded, self._local_ttl(namespace.ttl_seconds))
+                return pickle.loads(encoded)
+
+        cache_requests_total.inc(namespace.name, "miss")
+        return None
+
+    async def set(self, namespace: CacheNamespace, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value (None is never cached); ttl defaults to the namespace TTL"""
+        if value is None:
+            return
+        ttl = namespace.ttl_seconds if ttl is None else ttl
+        if ttl <= 0:
+            return
+        full_key = namespace.key(key)
+        encoded = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.local.set(full_key, encoded, self._local_ttl(ttl))
+        if self.backend is not None:
+            await self._backend_call("set", full_key, encoded, ttl)
+
+    async def delete(self, namespace: CacheNamespace, key: str):
+        """Drop a key from this worker and the shared tier"""
+        full_key = namespace.key(key)
+        self.local.delete(full_key)
+        if self.backend is not None:
+            await self._backend_call("delete", full_key)
+
+    async def get_or_load(
+        self,
+        namespace: CacheNamespace,
+        key: str,
+        loader: Loader,
+        ttl: Optional[float] = None
+    ) -> Any:
+        """
+        Cached value, or the loader's result which is then cached. Async
+        loaders are awaited; sync ones run in a worker thread.
+
+        Concurrent callers in this worker share one load; with a shared tier,
+        other workers wait up to CACHE_LOCK_WAIT_SECONDS for it too.
+        """
+        value = await self.get(namespace, key)
+        if value is not None:
+            return value
+
+        full_key = namespace.key(key)
+        in_flight = self._in_flight.get(full_key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[full_key] = future
+        try:
+            value = await self._load(namespace, key, loader, ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting on this future - don't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(full_key, None)
+
+    async def _load(self, namespace: CacheNamespace, key: str, loader: Loader, ttl: Optional[float]) -> Any:
+        lock_key = f"{namespace.key(key)}:lock"
+        locked = False
+        if self.backend is not None:
+            lock_ttl = settings.CACHE_LOCK_WAIT_SECONDS
+            # None means the backend failed; load without waiting then
+            acquired = await self._backend_call("add", lock_key, b"1", lock_ttl)
+            locked = acquired is True
+            if acquired is False:
+                # Another worker is loading this key; use its result if it arrives in time
+                deadline = time.monotonic() + lock_ttl
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.LOCK_POLL_SECONDS)
+                    encoded = await self._backend_call("get", namespace.key(key))
+                    if encoded is not None:
+                        cache_requests_total.inc(namespace.name, "shared")
+                        self.local.set(namespace.key(key), encoded, self._local_ttl(namespace.ttl_seconds))
+                        return pickle.loads(encoded)
+
+        try:
+            if inspect.iscoroutinefunction(loader):
+                value = await loader()
+            else:
+                # Sync loaders (PDF rendering, Firestore reads) block; keep them off the event loop
+                value = await asyncio.to_thread(loader)
+                if inspect.isawaitable(value):
+                    value = await value
+            await self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            if locked:
+                await self._backend_call("delete", lock_key)
+
+    async def close(self):
+        if self.backend is not None:
+            await self._backend_call("close")
+
+
+def _create_backend():
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.REDIS_URL)
+    if settings.CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(settings.CACHE_SQLITE_PATH)
+    return None
+
+
+shared_cache = TwoTierCache(_create_backend())
@@ -0,0 +1,30 @@
+"""
+Calculator definitions
+Metadata and input fields of the frontend calculators (lib/calculators),
+exported to app/data/calculators.json by `npm run gen calculators`.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Optional, List, Dict, Any
+
+DEFINITIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "calculators.json")
+
+
+@lru_cache(maxsize=None)
+def load_calculator_definitions() -> Dict[str, Dict[str, Any]]:
+    """Calculator definitions keyed by calculator name"""
+    with open(DEFINITIONS_PATH, encoding="utf-8") as f:
+        calculators = json.load(f)["calculators"]
+    return {calc["name"]: calc for calc in calculators}
+
+
+def get_calculator_definition(name: str) -> Optional[Dict[str, Any]]:
+    """Get definition for a calculator name, or None if unknown"""
+    return load_calculator_definitions().get(name)
+
+
+def get_input_fields(name: str) -> List[Dict[str, Any]]:
+    """Input field definitions for a calculator (empty if unknown)"""
+    definition = get_calculator_definition(name)
+    return definition["inputFields"] if definition else []
@@ -36,6 +36,89 @@ class Settings(BaseSettings):
     FIREBASE_STORAGE_BUCKET: str = ""
     FIREBASE_MESSAGING_SENDER_ID: str = ""
     FIREBASE_APP_ID: str = ""
+    FIREBASE_LAZY_INIT: bool = False  # initialize on first request instead of at startup (serverless)
+    
+    # Local stand-ins (for development and load testing without Firebase)
+    FIRESTORE_BACKEND: str = "firebase"  # "firebase" or "memory"
+    AUTH_BACKEND: str = "firebase"  # "firebase" or "fake" (accepts "fake:<uid>" tokens)
+    
+    # Group commit for POST /calculation_results without an Idempotency-Key
+    WRITE_BUFFER_ENABLED: bool = False
+    WRITE_BUFFER_MAX_BATCH: int = 100  # writes per commit (Firestore allows 500)
+    WRITE_BUFFER_MAX_DELAY_MS: float = 5  # longest a write waits for others to join its batch
+    
+    # Idempotency-Key handling for POST /calculation_results
+    IDEMPOTENCY_TTL_HOURS: int = 24  # how long a worker answers replays from memory
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # keys remembered per worker
+    
+    # Offline saves (POST /calculation_results/batch) keep the device's performed_at
+    OFFLINE_MAX_AGE_DAYS: int = 30  # older queued results are rejected (422)
+    OFFLINE_MAX_CLOCK_SKEW_SECONDS: int = 300  # device clocks this far ahead are clamped to now
+    
+    # Request size limits (input_data is also checked against app/data/calculators.json)
+    MAX_REQUEST_BODY_BYTES: int = 1_000_000  # 413 above this; a full 100-item batch fits
+    MAX_INPUT_FIELDS: int = 32  # keys per input_data
+    MAX_INPUT_KEY_LENGTH: int = 64
+    MAX_INPUT_TEXT_LENGTH: int = 500  # per string value
+    
+    # Shared cache (app/core/cache.py): per-worker LRU in front of a shared tier
+    CACHE_BACKEND: str = "local"  # "local" (per worker only), "sqlite" (workers on one host) or "redis"
+    CACHE_SQLITE_PATH: str = ""  # default: a private (0700) medcalc-cache-<uid> directory under the temp directory
+    CACHE_KEY_PREFIX: str = "medcalc"
+    CACHE_LOCAL_MAX_ENTRIES: int = 10000
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_LOCAL_TTL_SECONDS: float = 30  # bounds how long a worker serves an entry deleted elsewhere
+    CACHE_LOCK_WAIT_SECONDS: float = 2  # how long a miss waits for another worker loading the same key
+    
+    # Trend series for GET /calculation_results/series (cached per worker)
+    SERIES_CACHE_SIZE: int = 1000  # (user, calculator) series kept in memory
+    SERIES_CACHE_TTL_SECONDS: int = 300  # bounds staleness from writes on other workers
+    SERIES_MAX_POINTS: int = 2000
+    
+    # Cold storage for old results (app/core/archive.py, app/services/archive.py)
+    ARCHIVE_BACKEND: str = "local"  # "local" (files under ARCHIVE_LOCAL_DIR) or "firebase" (Cloud Storage)
+    ARCHIVE_LOCAL_DIR: str = "archive"
+    ARCHIVE_AFTER_DAYS: int = 365  # whole months older than this are archived
+    ARCHIVE_PART_MAX_RESULTS: int = 5000  # results per blob and manifest (its ids must fit in one document)
+    
+    # Global usage counters (app/core/counters.py)
+    COUNTER_SHARDS: int = 10  # shard documents per calculator per day
+    COUNTER_FLUSH_SECONDS: float = 5  # how often each worker writes its accumulated counts
+    COUNTER_CACHE_TTL_SECONDS: float = 30
+    COUNTER_MAX_DAYS: int = 92  # longest range GET /usage/calculations returns
+    USAGE_ADMIN_EMAILS: List[str] = []  # accounts allowed to read the counts (usage across all users)
+    
+    # Live result events (GET /calculation_results/stream)
+    EVENTS_BACKEND: str = "local"  # "local" (single worker) or "redis" (fan out across workers)
+    EVENT_QUEUE_SIZE: int = 100  # queued events per connection before it is asked to resync
+    EVENT_MAX_CONNECTIONS_PER_USER: int = 10
+    EVENT_MAX_CONNECTIONS: int = 10000  # per worker
+    EVENT_HEARTBEAT_SECONDS: float = 15
+    
+    # Admission control
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "local"  # "local" (per worker) or "redis" (shared)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_USER_BURST: float = 120  # tokens; see ROUTE_COSTS in rate_limit.py
+    RATE_LIMIT_USER_PER_SECOND: float = 2
+    RATE_LIMIT_ROUTE_BURST: float = 60
+    RATE_LIMIT_ROUTE_PER_SECOND: float = 1
+    MAX_CONCURRENT_REQUESTS: int = 256  # per worker, 0 disables load shedding
+    
+    # Production server (python main.py --prod)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 = one worker per CPU
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30  # seconds to drain in-flight requests
+    READINESS_DRAIN_SECONDS: float = 5  # after SIGTERM, /ready answers 503 this long before a worker stops accepting
+    METRICS_SHARED_DIR: str = ""  # set by the launcher for several workers: /metrics sums their snapshots there
+    METRICS_SNAPSHOT_SECONDS: float = 1  # how often each worker writes its snapshot
+    WORKER_TIMEOUT: int = 60
+    
+    # Slow-request profiling (0 disables; folded-stack profiles written to PROFILE_OUTPUT_DIR)
+    PROFILE_SLOW_REQUEST_MS: float = 0
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+    PROFILE_OUTPUT_DIR: str = "profiles"
     
     class Config:
         # Look for .env in project root (parent of api directory)
@@ -0,0 +1,140 @@
+"""
+Global usage counters
+Calculations per calculator per UTC day, kept in sharded Firestore
+documents. A single counter document would cap writes at about one per
+second, so each (day, calculator) is spread over COUNTER_SHARDS documents
+and readers sum them.
+
+Creates only bump an in-process accumulator; every COUNTER_FLUSH_SECONDS
+the accumulated counts are written as Increment transforms to a random
+shard, in one batch per flush. Counts are therefore eventually consistent
+(up to one flush interval per worker behind). Only calculators listed in
+app/data/calculators.json are counted, since the names come from clients.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.cache import CacheNamespace, shared_cache
+from app.core.calculators import get_calculator_definition
+from app.core.config import settings
+from app.core.firestore import USAGE_COUNTERS_COLLECTION, get_firestore_client, increment, server_timestamp
+from app.core.metrics import registry
+from app.core.write_buffer import FIRESTORE_MAX_BATCH
+
+logger = logging.getLogger(__name__)
+
+counter_flush_failures_total = registry.counter(
+    "usage_counter_flush_failures_total", "Usage counter flushes that failed (retried on the next flush)"
+)
+
+USAGE_COUNTS_CACHE = CacheNamespace("usage_counts", ttl_seconds=settings.COUNTER_CACHE_TTL_SECONDS)
+
+
+def shard_document_id(day: str, calculator_name: str, shard: int) -> str:
+    """Document id of one shard (calculator names may contain '/', so they are hashed)"""
+    name_hash = hashlib.sha1(calculator_name.encode()).hexdigest()[:16]
+    return f"{day}_{name_hash}_{shard}"
+
+
+def read_daily_counts(since: date, until: date) -> Dict[str, Dict[str, int]]:
+    """Sum shards into {day: {calculator_name: count}} for since..until inclusive"""
+    db = get_firestore_client()
+    query = (
+        db.collection(USAGE_COUNTERS_COLLECTION)
+        .where("day", ">=", since.isoformat())
+        .where("day", "<=", until.isoformat())
+    )
+    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for doc in query.stream():
+        data = doc.to_dict()
+        counts[data["day"]][data["calculator_name"]] += int(data.get("count") or 0)
+    return {day: dict(by_calculator) for day, by_calculator in counts.items()}
+
+
+class UsageCounters:
+    """Per-worker accumulator of calculation counts, flushed periodically"""
+
+    def __init__(self, shards: int, flush_seconds: float):
+        self.shards = max(1, shards)
+        self.flush_seconds = flush_seconds
+        # (day, calculator_name) -> count not yet written
+        self._pending: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, calculator_name: str, amount: int = 1):
+        """Count calculations of a known calculator (no I/O; written on the next flush)"""
+        # Names are client-supplied; unknown ones would each add shard documents
+        if get_calculator_definition(calculator_name) is None:
+            return
+        day = datetime.now(timezone.utc).date().isoformat()
+        self._pending[(day, calculator_name)] += amount
+
+    async def flush(self):
+        """Write accumulated counts; on failure they are kept for the next flush"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, defaultdict(int)
+            try:
+                await asyncio.to_thread(self._write, pending)
+            except Exception as e:
+                counter_flush_failures_total.inc()
+                logger.error(f"Usage counter flush failed, retrying later: {e}")
+                for key, count in pending.items():
+                    self._pending[key] += count
+
+    def _write(self, pending: Dict[Tuple[str, str], int]):
+        db = get_firestore_client()
+        collection_ref = db.collection(USAGE_COUNTERS_COLLECTION)
+        items = list(pending.items())
+        for start in range(0, len(items), FIRESTORE_MAX_BATCH):
+            batch = db.batch()
+            for (day, calculator_name), count in items[start:start + FIRESTORE_MAX_BATCH]:
+                shard = random.randrange(self.shards)
+                batch.set(
+                    collection_ref.document(shard_document_id(day, calculator_name, shard)),
+                    {
+                        "day": day,
+                        "calculator_name": calculator_name,
+                        "shard": shard,
+                        "count": increment(count),
+                        "updated_at": server_timestamp(),
+                    },
+                    merge=True,
+                )
+            batch.commit()
+            # Committed chunks must not be retried if a later chunk fails
+            for key, _ in items[start:start + FIRESTORE_MAX_BATCH]:
+                del pending[key]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def daily_counts(self, since: date, until: date) -> Dict[str, Dict[str, int]]:
+        """Stored counts for since..until, cached for COUNTER_CACHE_TTL_SECONDS"""
+        key = f"{since.isoformat()}:{until.isoformat()}"
+        return await shared_cache.get_or_load(
+            USAGE_COUNTS_CACHE, key, lambda: read_daily_counts(since, until)
+        )
+
+
+usage_counters = UsageCounters(settings.COUNTER_SHARDS, settings.COUNTER_FLUSH_SECONDS)
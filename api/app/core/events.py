@@ -0,0 +1,235 @@
+"""
+Calculation result events
+In-process pub/sub feeding GET /calculation_results/stream. Writes publish
+created/deleted events; every open stream of the same user receives them.
+
+Each connection has a bounded queue. A connection that falls behind is not
+allowed to grow memory or slow the writer: its queue is dropped and it gets a
+single "resync" event telling the client to refetch.
+
+With several workers set EVENTS_BACKEND=redis so events published on one
+worker reach streams held by the others (requires the redis package).
+
+Streams never end on their own, so the broker is closed when the worker
+shuts down: open streams end (clients reconnect, to another worker) and
+new ones are refused.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, Set
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = "calculation_results:events"
+
+# Sent instead of queued events once a connection has fallen behind
+RESYNC_FRAME = "event: resync\ndata: {}\n\n"
+
+# Queued (never sent) to wake a stream that has to end
+_CLOSE_FRAME = ""
+
+events_published_total = registry.counter(
+    "result_events_published_total", "Calculation result events published", ("event",)
+)
+events_dropped_total = registry.counter(
+    "result_events_dropped_total", "Stream connections that overflowed and were asked to resync"
+)
+
+
+class TooManyConnections(Exception):
+    """Connection limit for the user or the worker reached"""
+
+
+class BrokerClosed(Exception):
+    """The worker is shutting down; no new streams"""
+
+
+class StreamClosed(Exception):
+    """The stream has to end (worker shutting down)"""
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_event(event: str, data: Dict[str, Any]) -> str:
+    """Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    """One open stream: a bounded queue of encoded SSE frames"""
+
+    def __init__(self, user_id: str, max_queued: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queued)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, frame: str):
+        if self.overflowed or self.closed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client refetches instead
+            self.overflowed = True
+            events_dropped_total.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME)
+
+    def close(self):
+        """End the stream; a waiting next_frame() raises StreamClosed"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSE_FRAME)
+
+    async def next_frame(self, timeout: float) -> Optional[str]:
+        """
+        Next frame, or None if nothing arrived within timeout (send a heartbeat).
+        Raises StreamClosed once the stream has been closed.
+        """
+        if self.closed:
+            raise StreamClosed()
+        try:
+            frame = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if frame is _CLOSE_FRAME:
+            raise StreamClosed()
+        if frame is RESYNC_FRAME:
+            self.overflowed = False
+        return frame
+
+
+class ResultEventBroker:
+    """Fans result events out to the open streams of each user"""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._relay: Optional["RedisEventRelay"] = None
+        self._closed = False
+
+    @property
+    def connections(self) -> int:
+        return self._count
+
+    def subscribe(self, user_id: str) -> Subscription:
+        if self._closed:
+            raise BrokerClosed("Server is shutting down")
+        user_subscriptions = self._subscriptions.get(user_id, set())
+        if len(user_subscriptions) >= settings.EVENT_MAX_CONNECTIONS_PER_USER:
+            raise TooManyConnections("Too many open streams for this user")
+        if self._count >= settings.EVENT_MAX_CONNECTIONS:
+            raise TooManyConnections("Too many open streams")
+
+        subscription = Subscription(user_id, settings.EVENT_QUEUE_SIZE)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        user_subscriptions = self._subscriptions.get(subscription.user_id)
+        if user_subscriptions is None or subscription not in user_subscriptions:
+            return
+        user_subscriptions.discard(subscription)
+        self._count -= 1
+        if not user_subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: str, event: str, data: Dict[str, Any]):
+        """Publish an event to every stream of user_id (never blocks)"""
+        events_published_total.inc(event)
+        frame = encode_event(event, data)
+        if self._relay is not None:
+            self._relay.publish(user_id, frame)
+        else:
+            self.deliver(user_id, frame)
+
+    def deliver(self, user_id: str, frame: str):
+        # Encoded once, shared by all of the user's connections
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            subscription.offer(frame)
+
+    def close(self):
+        """End every open stream and refuse new ones (shutdown)"""
+        self._closed = True
+        for user_subscriptions in list(self._subscriptions.values()):
+            for subscription in list(user_subscriptions):
+                subscription.close()
+
+    async def start(self):
+        self._closed = False
+        if settings.EVENTS_BACKEND == "redis" and self._relay is None:
+            self._relay = RedisEventRelay(self, settings.REDIS_URL)
+            await self._relay.start()
+
+    async def stop(self):
+        self.close()
+        if self._relay is not None:
+            await self._relay.stop()
+            self._relay = None
+
+
+class RedisEventRelay:
+    """Relays events between workers through Redis pub/sub (requires the redis package)"""
+
+    def __init__(self, broker: ResultEventBroker, url: str):
+        import redis.asyncio as redis
+        self._broker = broker
+        self._client = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._client.aclose()
+
+    def publish(self, user_id: str, frame: str):
+        message = json.dumps({"user_id": user_id, "frame": frame})
+        task = asyncio.create_task(self._publish(message, user_id, frame))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _publish(self, message: str, user_id: str, frame: str):
+        try:
+            await self._client.publish(REDIS_CHANNEL, message)
+        except Exception as e:
+            # Still reach this worker's streams if Redis is down
+            logger.error(f"Event relay publish failed: {e}")
+            self._broker.deliver(user_id, frame)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(REDIS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    self._broker.deliver(payload["user_id"], payload["frame"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event relay subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+
+result_events = ResultEventBroker()
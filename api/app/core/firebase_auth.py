@@ -2,22 +2,52 @@
 Firebase Authentication for Backend
 Verifies Firebase ID tokens from frontend using Firebase Admin SDK
 """
+import logging
 import os
-from typing import Optional
+import time
+from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
 
-from app.core.firestore import FirestoreUser
+from app.core.cache import CacheNamespace, hashed_key, shared_cache
+from app.core.config import settings
+from app.core.firestore import FirestoreUser, user_loader
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
 
 # HTTP Bearer token
 security = HTTPBearer()
 
+# Verified tokens (keyed by token hash) and the users they resolve to, shared
+# by all workers so each token is verified and looked up once, not per worker
+VERIFIED_TOKENS_CACHE = CacheNamespace("verified_tokens", ttl_seconds=300)
+USERS_BY_EMAIL_CACHE = CacheNamespace("users_by_email", ttl_seconds=60)
+
+# Firebase initialization state (reported by the readiness probe)
+firebase_status: Dict[str, Any] = {"initialized": False, "credentials": None, "error": None}
+
+# Set once initialize_firebase() has run (successfully or not)
+_initialization_attempted = False
+
 # Initialize Firebase Admin SDK
 def initialize_firebase():
     """Initialize Firebase Admin SDK with service account credentials"""
-    if not firebase_admin._apps:
+    global _initialization_attempted
+    _initialization_attempted = True
+    
+    if settings.FIRESTORE_BACKEND == "memory" and settings.AUTH_BACKEND == "fake":
+        print(f"⚙️ Using local Firestore and auth stand-ins - Firebase Admin SDK not initialized")
+        firebase_status.update(initialized=True, credentials="local", error=None)
+        return
+    
+    # Imported here so cold start doesn't pay for the Firebase/gRPC stack
+    import firebase_admin
+    from firebase_admin import credentials
+    
+    if firebase_admin._apps:
+        firebase_status.update(initialized=True, error=None)
+    else:
         # Try to load from JSON file first (for local development)
         cred_path = os.path.join(
             os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
@@ -28,18 +58,49 @@ def initialize_firebase():
         if os.path.exists(cred_path):
             cred = credentials.Certificate(cred_path)
             firebase_admin.initialize_app(cred)
+            firebase_status.update(initialized=True, credentials="service_account", error=None)
             print(f"✅ Firebase Admin SDK initialized with service account file")
         else:
             # Fall back to default credentials (uses GOOGLE_APPLICATION_CREDENTIALS env var or Application Default Credentials)
             try:
                 firebase_admin.initialize_app()
+                firebase_status.update(initialized=True, credentials="default", error=None)
                 print(f"✅ Firebase Admin SDK initialized with default credentials")
             except Exception as e:
+                firebase_status.update(initialized=False, error=f"{type(e).__name__}: {e}")
                 print(f"⚠️ Warning: Firebase Admin SDK initialization failed: {e}")
                 print(f"⚠️ Firebase authentication will not work. Please provide service account credentials.")
                 # Don't raise - allow app to start for development without Firebase auth
 
 
+def ensure_firebase():
+    """Initialize Firebase on first use (no-op once initialization was attempted)"""
+    if not _initialization_attempted:
+        initialize_firebase()
+
+
+def verify_id_token(token: str) -> Dict[str, Any]:
+    """Verify ID token with the configured auth backend"""
+    if settings.AUTH_BACKEND == "fake":
+        # Local stand-in: "fake:<uid>" is accepted as a token for <uid>
+        prefix, _, uid = token.partition(":")
+        if prefix != "fake" or not uid:
+            raise ValueError("Fake auth backend expects tokens of the form 'fake:<uid>'")
+        return {"uid": uid, "email": f"{uid}@example.com"}
+    
+    from firebase_admin import auth as firebase_auth
+    ensure_firebase()
+    return firebase_auth.verify_id_token(token)
+
+
+def _token_cache_ttl(decoded_token: Dict[str, Any]) -> float:
+    """Cache a verified token no longer than it stays valid"""
+    expires_at = decoded_token.get("exp")
+    if expires_at is None:
+        return VERIFIED_TOKENS_CACHE.ttl_seconds
+    return min(VERIFIED_TOKENS_CACHE.ttl_seconds, expires_at - time.time())
+
+
 async def get_current_user_firebase(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
@@ -52,26 +113,36 @@ async def get_current_user_firebase(
     
     try:
         token = credentials.credentials
-        print(f"🔑 Received token (first 20 chars): {token[:20]}...")
         
-        # Verify Firebase ID token using Admin SDK
-        decoded_token = firebase_auth.verify_id_token(token)
+        # Verify Firebase ID token using Admin SDK (once per token across workers)
+        token_key = hashed_key(token)
+        decoded_token = await shared_cache.get(VERIFIED_TOKENS_CACHE, token_key)
+        if decoded_token is None:
+            with timed("auth"):
+                decoded_token = verify_id_token(token)
+            await shared_cache.set(VERIFIED_TOKENS_CACHE, token_key, decoded_token, ttl=_token_cache_ttl(decoded_token))
         firebase_uid = decoded_token['uid']
         email = decoded_token.get('email')
         
-        print(f"✅ Token verified - UID: {firebase_uid}, Email: {email}")
-        
         if not firebase_uid:
-            print("❌ No Firebase UID in token")
+            logger.warning("No Firebase UID in token")
             raise credentials_exception
             
     except Exception as e:
-        print(f"❌ Firebase token verification failed: {type(e).__name__}: {e}")
+        logger.warning(f"Firebase token verification failed: {type(e).__name__}")
         raise credentials_exception
     
     # Get or create user in Firestore
+    user = await shared_cache.get(USERS_BY_EMAIL_CACHE, email) if email else None
+    if user is not None:
+        user_loader.prime(user['id'], user)
+        return user
+    
     user = await FirestoreUser.get_by_email(email)
     
+    if user is not None and email:
+        await shared_cache.set(USERS_BY_EMAIL_CACHE, email, user)
+    
     if user is None:
         # Auto-create user from Firebase
         user = await FirestoreUser.create(
@@ -79,8 +150,15 @@ async def get_current_user_firebase(
             name=email.split('@')[0],  # Use email prefix as default name
             firebase_uid=firebase_uid
         )
-        print(f"✅ Auto-created user in Firestore: {email}")
-    else:
-        print(f"👤 Found existing user: {email}")
+        logger.info(f"Auto-created user in Firestore: {user['id']}")
     
     return user
+
+
+async def require_usage_admin(
+    current_user: Dict[str, Any] = Depends(get_current_user_firebase)
+) -> Dict[str, Any]:
+    """Current user, if listed in USAGE_ADMIN_EMAILS (service-wide usage is not per-user data)"""
+    if current_user.get("email") not in settings.USAGE_ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to read usage statistics")
+    return current_user
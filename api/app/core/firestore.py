@@ -2,25 +2,185 @@
 Firestore Database Client
 Replaces PostgreSQL with Firestore for data storage
 """
-from typing import Optional, List, Dict, Any
-from datetime import datetime
-from firebase_admin import firestore
+import asyncio
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Set, Tuple
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core import local_firestore
+from app.core.idempotency import (
+    IdempotencyKeyConflict,
+    idempotency_document_id,
+    idempotency_index,
+    request_fingerprint,
+)
+from app.core.events import result_events
+from app.core.metrics import track_phase
+from app.core.write_buffer import WriteBuffer
 
 
 def get_firestore_client():
-    """Get Firestore client (call after Firebase Admin SDK is initialized)"""
+    """Get Firestore client (initializes Firebase on first use when FIREBASE_LAZY_INIT is set)"""
+    if settings.FIRESTORE_BACKEND == "memory":
+        return local_firestore.get_client()
+    
+    # Imported lazily: the google-cloud-firestore stack is slow to import
+    from firebase_admin import firestore
+    from app.core.firebase_auth import ensure_firebase
+    ensure_firebase()
     return firestore.client()
 
 
+def server_timestamp():
+    """SERVER_TIMESTAMP sentinel for the configured backend"""
+    if settings.FIRESTORE_BACKEND == "memory":
+        return local_firestore.SERVER_TIMESTAMP
+    
+    from firebase_admin import firestore
+    return firestore.SERVER_TIMESTAMP
+
+
+def increment(value: float):
+    """Increment transform for the configured backend"""
+    if settings.FIRESTORE_BACKEND == "memory":
+        return local_firestore.Increment(value)
+    
+    from firebase_admin import firestore
+    return firestore.Increment(value)
+
+
 # Collections
 USERS_COLLECTION = "users"
 CALCULATION_RESULTS_COLLECTION = "calculation_results"
+USAGE_COUNTERS_COLLECTION = "usage_counters"
+RESULT_ARCHIVES_COLLECTION = "result_archives"
+
+# Group commit for result creates (used when WRITE_BUFFER_ENABLED is set)
+result_write_buffer = WriteBuffer(
+    get_firestore_client, settings.WRITE_BUFFER_MAX_BATCH, settings.WRITE_BUFFER_MAX_DELAY_MS
+)
+
+
+# Per-request document cache: (collection, doc_id) -> document dict or None.
+# Stays None outside of a request scope, which disables caching.
+_request_cache: ContextVar[Optional[Dict[Tuple[str, str], Optional[Dict[str, Any]]]]] = ContextVar(
+    "firestore_request_cache", default=None
+)
+
+
+class DocumentLoader:
+    """
+    Dataloader-style batching for document lookups in one collection.
+    
+    All ids requested within the same event-loop tick (from any request)
+    are fetched with a single ``get_all`` call, made in a worker thread.
+    Results are cached for the duration of the current request scope.
+    """
+    
+    def __init__(self, collection: str):
+        self.collection = collection
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._fetches: Set[asyncio.Task] = set()
+    
+    async def load(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Load document by ID (returns a copy with 'id' set, or None)"""
+        cache = _request_cache.get()
+        key = (self.collection, doc_id)
+        if cache is not None and key in cache:
+            return _copy_document(cache[key])
+        
+        future = self._pending.get(doc_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = loop.create_future()
+            self._pending[doc_id] = future
+        
+        # Shield so one cancelled caller doesn't cancel the shared lookup
+        data = await asyncio.shield(future)
+        if cache is not None:
+            cache[key] = data
+        return _copy_document(data)
+    
+    def prime(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Store an already-fetched document in the request cache"""
+        cache = _request_cache.get()
+        if cache is not None:
+            cache[(self.collection, doc_id)] = _copy_document(data)
+    
+    def clear(self, doc_id: str):
+        """Drop a document from the request cache (call after writes)"""
+        cache = _request_cache.get()
+        if cache is not None:
+            cache.pop((self.collection, doc_id), None)
+    
+    def _dispatch(self):
+        """Start fetching every pending id with one get_all round-trip"""
+        pending, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._fetch(pending))
+        self._fetches.add(task)
+        task.add_done_callback(self._fetches.discard)
+    
+    async def _fetch(self, pending: Dict[str, asyncio.Future]):
+        try:
+            found = await asyncio.to_thread(self._get_all, list(pending))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for doc_id, future in pending.items():
+            if not future.done():
+                future.set_result(found.get(doc_id))
+    
+    def _get_all(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Blocking get_all of doc_ids (runs in a worker thread)"""
+        db = get_firestore_client()
+        collection_ref = db.collection(self.collection)
+        found = {}
+        for doc in db.get_all([collection_ref.document(doc_id) for doc_id in doc_ids]):
+            if doc.exists:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                found[doc.id] = data
+        return found
+
+
+def _copy_document(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Shallow copy so callers can't mutate cached documents"""
+    return dict(data) if data is not None else None
+
+
+user_loader = DocumentLoader(USERS_COLLECTION)
+calculation_result_loader = DocumentLoader(CALCULATION_RESULTS_COLLECTION)
+
+
+class RequestCacheMiddleware:
+    """ASGI middleware that opens a fresh document cache for each request"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        token = _request_cache.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_cache.reset(token)
 
 
 class FirestoreUser:
     """User operations in Firestore"""
     
     @staticmethod
+    @track_phase("firestore")
     async def get_by_email(email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         db = get_firestore_client()
@@ -31,25 +191,19 @@ class FirestoreUser:
         for doc in docs:
             user_data = doc.to_dict()
             user_data['id'] = doc.id
+            user_loader.prime(doc.id, user_data)
             return user_data
         
         return None
     
     @staticmethod
+    @track_phase("firestore")
     async def get_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
-        db = get_firestore_client()
-        doc_ref = db.collection(USERS_COLLECTION).document(user_id)
-        doc = doc_ref.get()
-        
-        if doc.exists:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            return user_data
-        
-        return None
+        return await user_loader.load(user_id)
     
     @staticmethod
+    @track_phase("firestore")
     async def create(email: str, name: str, firebase_uid: str) -> Dict[str, Any]:
         """Create new user"""
         db = get_firestore_client()
@@ -57,7 +211,7 @@ class FirestoreUser:
             "email": email,
             "name": name,
             "firebase_uid": firebase_uid,
-            "created_at": firestore.SERVER_TIMESTAMP
+            "created_at": server_timestamp()
         }
         
         # Add user to Firestore
@@ -69,10 +223,34 @@ class FirestoreUser:
         return user_data
 
 
+def _check_idempotent_replay(result_data: Dict[str, Any], user_id: str, fingerprint: str):
+    """Verify an existing idempotent write matches the retry (however old it is)"""
+    idempotency = result_data.get("idempotency") or {}
+    if result_data.get("user_id") != user_id or idempotency.get("fingerprint") != fingerprint:
+        raise IdempotencyKeyConflict("Idempotency-Key was already used with a different request")
+
+
+def _index_expiry() -> datetime:
+    """How long the in-process index remembers a key (replays after that read Firestore)"""
+    return datetime.utcnow() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+
+
+def _payload_fingerprint(fields: Dict[str, Any]) -> str:
+    """Fingerprint of what was calculated; performed_at (offline saves) is left out"""
+    return request_fingerprint({key: value for key, value in fields.items() if key != "performed_at"})
+
+
+async def _has_archive(user_id: str) -> bool:
+    """Whether some of the user's results were archived (user doc is usually request-cached)"""
+    user = await user_loader.load(user_id)
+    return bool(user and user.get('has_archive'))
+
+
 class FirestoreCalculationResult:
     """Calculation result operations in Firestore"""
     
     @staticmethod
+    @track_phase("firestore")
     async def create(
         user_id: str,
         calculator_name: str,
@@ -90,19 +268,248 @@ class FirestoreCalculationResult:
             "input_data": input_data,
             "result_value": result_value,
             "interpretation": interpretation,
-            "performed_at": firestore.SERVER_TIMESTAMP
+            "performed_at": server_timestamp(),
+            "created_at": server_timestamp()
         }
         
-        # Add to Firestore
+        # Add to Firestore (batched with concurrent creates when the write buffer is on)
         doc_ref = db.collection(CALCULATION_RESULTS_COLLECTION).document()
-        doc_ref.set(result_data)
+        if settings.WRITE_BUFFER_ENABLED:
+            await result_write_buffer.set(doc_ref, result_data)
+        else:
+            doc_ref.set(result_data)
         
         # Return created result with ID
         result_data['id'] = doc_ref.id
-        result_data['performed_at'] = datetime.utcnow()
+        result_data['performed_at'] = result_data['created_at'] = datetime.utcnow()
+        result_events.publish(user_id, "created", result_data)
         return result_data
     
     @staticmethod
+    @track_phase("firestore")
+    async def create_idempotent(
+        user_id: str,
+        idempotency_key: str,
+        calculator_name: str,
+        calculator_name_ru: Optional[str],
+        input_data: Dict[str, Any],
+        result_value: float,
+        interpretation: Optional[str],
+        performed_at: Optional[datetime] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Create calculation result at most once per Idempotency-Key.
+        
+        The document id is derived from the key, so the write is a Firestore
+        create() that fails if a previous attempt already succeeded.
+        performed_at defaults to the server time of the write, which is
+        always stored as created_at (what the cohort export follows).
+        Returns (result, replayed); raises IdempotencyKeyConflict if the key
+        was used for a different payload.
+        """
+        return await FirestoreCalculationResult._create_idempotent(
+            user_id, idempotency_key, calculator_name, calculator_name_ru,
+            input_data, result_value, interpretation, performed_at
+        )
+    
+    @staticmethod
+    async def _create_idempotent(
+        user_id: str,
+        idempotency_key: str,
+        calculator_name: str,
+        calculator_name_ru: Optional[str],
+        input_data: Dict[str, Any],
+        result_value: float,
+        interpretation: Optional[str],
+        performed_at: Optional[datetime] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """create_idempotent() without phase timing, for callers already timed"""
+        from google.api_core.exceptions import AlreadyExists
+        
+        payload = {
+            "calculator_name": calculator_name,
+            "calculator_name_ru": calculator_name_ru,
+            "input_data": input_data,
+            "result_value": result_value,
+            "interpretation": interpretation
+        }
+        doc_id = idempotency_document_id(user_id, idempotency_key)
+        fingerprint = _payload_fingerprint(payload)
+        
+        while True:
+            # Fast path: replay of a key this worker completed recently
+            cached = idempotency_index.get(doc_id)
+            if cached is not None:
+                cached_fingerprint, _, result = cached
+                if cached_fingerprint != fingerprint:
+                    raise IdempotencyKeyConflict("Idempotency-Key was already used with a different request")
+                return result, True
+            
+            # A concurrent duplicate in this worker is writing - wait for it
+            in_flight = idempotency_index.in_flight(doc_id)
+            if in_flight is None:
+                break
+            try:
+                await asyncio.shield(in_flight)
+            except Exception:
+                pass
+        
+        future = idempotency_index.begin(doc_id)
+        try:
+            result_data = dict(payload)
+            result_data["user_id"] = user_id
+            result_data["performed_at"] = performed_at or server_timestamp()
+            result_data["created_at"] = server_timestamp()
+            result_data["idempotency"] = {"fingerprint": fingerprint}
+            
+            db = get_firestore_client()
+            doc_ref = db.collection(CALCULATION_RESULTS_COLLECTION).document(doc_id)
+            try:
+                doc_ref.create(result_data)
+                replayed = False
+                result_data["created_at"] = datetime.utcnow()
+                result_data["performed_at"] = performed_at or result_data["created_at"]
+            except AlreadyExists:
+                # Another worker (or an earlier attempt) already wrote it
+                existing = doc_ref.get()
+                result_data = existing.to_dict() or {}
+                _check_idempotent_replay(result_data, user_id, fingerprint)
+                replayed = True
+            
+            result_data.pop("idempotency", None)
+            result_data["id"] = doc_id
+            idempotency_index.put(doc_id, fingerprint, _index_expiry(), result_data)
+            if not replayed:
+                result_events.publish(user_id, "created", dict(result_data, idempotency_key=idempotency_key))
+            future.set_result(None)
+            return result_data, replayed
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting on this future - don't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            idempotency_index.end(doc_id)
+    
+    @staticmethod
+    @track_phase("firestore")
+    async def create_idempotent_many(
+        user_id: str,
+        items: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Tuple[Optional[Dict[str, Any]], bool, Optional[IdempotencyKeyConflict]]]:
+        """
+        Create several calculation results, each at most once per Idempotency-Key.
+        
+        items are (idempotency_key, fields) pairs, fields being the
+        create_idempotent() arguments other than user_id and the key. Keys this worker completed recently are
+        answered from the index; the rest cost one get_all() plus one batched
+        create() for the whole list (at most 500 items - Firestore's batch limit).
+        Returns (result, replayed, conflict) for each item, in order.
+        """
+        from google.api_core.exceptions import AlreadyExists
+        
+        outcomes: List[Any] = [None] * len(items)
+        # doc id -> (key, fingerprint, fields, item positions)
+        pending: Dict[str, Tuple[str, str, Dict[str, Any], List[int]]] = {}
+        for position, (idempotency_key, fields) in enumerate(items):
+            doc_id = idempotency_document_id(user_id, idempotency_key)
+            fingerprint = _payload_fingerprint(fields)
+            if doc_id in pending:
+                # Same key twice in one batch: resolved together with the first
+                pending[doc_id][3].append(position)
+                continue
+            cached = idempotency_index.get(doc_id)
+            if cached is not None:
+                cached_fingerprint, _, result = cached
+                if cached_fingerprint != fingerprint:
+                    outcomes[position] = (None, False, IdempotencyKeyConflict(
+                        "Idempotency-Key was already used with a different request"
+                    ))
+                else:
+                    outcomes[position] = (result, True, None)
+                continue
+            pending[doc_id] = (idempotency_key, fingerprint, fields, [position])
+        
+        if not pending:
+            return outcomes
+        
+        db = get_firestore_client()
+        collection = db.collection(CALCULATION_RESULTS_COLLECTION)
+        references = {doc_id: collection.document(doc_id) for doc_id in pending}
+        existing = {
+            snapshot.id: snapshot.to_dict()
+            for snapshot in db.get_all(list(references.values()))
+            if snapshot.exists
+        }
+        
+        expires_at = _index_expiry()
+        resolved: Dict[str, Tuple[Optional[Dict[str, Any]], bool, Optional[IdempotencyKeyConflict]]] = {}
+        created: Dict[str, Dict[str, Any]] = {}
+        batch = db.batch()
+        for doc_id, (idempotency_key, fingerprint, fields, _) in pending.items():
+            if doc_id in existing:
+                result_data = existing[doc_id]
+                try:
+                    _check_idempotent_replay(result_data, user_id, fingerprint)
+                except IdempotencyKeyConflict as e:
+                    resolved[doc_id] = (None, False, e)
+                    continue
+                result_data.pop("idempotency", None)
+                result_data["id"] = doc_id
+                idempotency_index.put(doc_id, fingerprint, expires_at, result_data)
+                resolved[doc_id] = (result_data, True, None)
+                continue
+            
+            result_data = dict(fields)
+            result_data["user_id"] = user_id
+            result_data["performed_at"] = fields.get("performed_at") or server_timestamp()
+            result_data["created_at"] = server_timestamp()
+            result_data["idempotency"] = {"fingerprint": fingerprint}
+            batch.create(references[doc_id], result_data)
+            created[doc_id] = result_data
+        
+        if created:
+            try:
+                batch.commit()
+            except AlreadyExists:
+                # Raced with a concurrent write of one of the keys; resolve one by one
+                for doc_id in created:
+                    idempotency_key, _, fields, _ = pending[doc_id]
+                    try:
+                        result, replayed = await FirestoreCalculationResult._create_idempotent(
+                            user_id=user_id, idempotency_key=idempotency_key, **fields
+                        )
+                        resolved[doc_id] = (result, replayed, None)
+                    except IdempotencyKeyConflict as e:
+                        resolved[doc_id] = (None, False, e)
+                created = {}
+        
+        now = datetime.utcnow()
+        for doc_id, result_data in created.items():
+            idempotency_key, fingerprint, fields, _ = pending[doc_id]
+            result_data.pop("idempotency", None)
+            result_data["id"] = doc_id
+            result_data["performed_at"] = fields.get("performed_at") or now
+            result_data["created_at"] = now
+            idempotency_index.put(doc_id, fingerprint, expires_at, result_data)
+            result_events.publish(user_id, "created", dict(result_data, idempotency_key=idempotency_key))
+            resolved[doc_id] = (result_data, False, None)
+        
+        for doc_id, (_, fingerprint, fields, positions) in pending.items():
+            result, replayed, conflict = resolved[doc_id]
+            outcomes[positions[0]] = (result, replayed, conflict)
+            for position in positions[1:]:
+                # Later duplicates replay the first, unless their payload differs
+                if conflict is None and _payload_fingerprint(items[position][1]) == fingerprint:
+                    outcomes[position] = (result, True, None)
+                else:
+                    outcomes[position] = (None, False, conflict or IdempotencyKeyConflict(
+                        "Idempotency-Key was already used with a different request"
+                    ))
+        return outcomes
+    
+    @staticmethod
+    @track_phase("firestore")
     async def get_by_user(user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all calculation results for user"""
         db = get_firestore_client()
@@ -115,6 +522,7 @@ class FirestoreCalculationResult:
         for doc in docs:
             result_data = doc.to_dict()
             result_data['id'] = doc.id
+            result_data.pop('idempotency', None)
             # Convert Firestore timestamp to ISO string if present
             if 'performed_at' in result_data and result_data['performed_at']:
                 try:
@@ -123,42 +531,51 @@ class FirestoreCalculationResult:
                     pass
             results.append(result_data)
         
+        # Older history was moved to the archive (see app/core/archive.py)
+        if len(results) < limit and await _has_archive(user_id):
+            from app.core.archive import result_archive
+            hot_ids = {result['id'] for result in results}
+            for result_data in await result_archive.recent(user_id, limit - len(results)):
+                if result_data['id'] in hot_ids:
+                    continue
+                result_data['performed_at'] = result_data['performed_at'].isoformat()
+                results.append(result_data)
+        
         # Sort in Python after fetching (avoid Firestore composite index)
         results.sort(key=lambda x: x.get('performed_at', ''), reverse=True)
         
         return results
     
     @staticmethod
+    @track_phase("firestore")
     async def get_by_id(result_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific calculation result"""
-        db = get_firestore_client()
-        doc_ref = db.collection(CALCULATION_RESULTS_COLLECTION).document(result_id)
-        doc = doc_ref.get()
+        """Get specific calculation result (from the archive if it was moved there)"""
+        result_data = await calculation_result_loader.load(result_id)
         
-        if doc.exists:
-            result_data = doc.to_dict()
-            result_data['id'] = doc.id
-            
-            # Verify ownership
-            if result_data.get('user_id') == user_id:
-                return result_data
+        if result_data is None and await _has_archive(user_id):
+            from app.core.archive import result_archive
+            return await result_archive.find(user_id, result_id)
+        
+        # Verify ownership
+        if result_data is not None and result_data.get('user_id') == user_id:
+            result_data.pop('idempotency', None)
+            return result_data
         
         return None
     
     @staticmethod
+    @track_phase("firestore")
     async def delete(result_id: str, user_id: str) -> bool:
         """Delete calculation result"""
-        db = get_firestore_client()
-        doc_ref = db.collection(CALCULATION_RESULTS_COLLECTION).document(result_id)
-        doc = doc_ref.get()
+        result_data = await calculation_result_loader.load(result_id)
         
-        if doc.exists:
-            result_data = doc.to_dict()
-            
-            # Verify ownership
-            if result_data.get('user_id') == user_id:
-                doc_ref.delete()
-                return True
+        # Verify ownership
+        if result_data is not None and result_data.get('user_id') == user_id:
+            db = get_firestore_client()
+            db.collection(CALCULATION_RESULTS_COLLECTION).document(result_id).delete()
+            calculation_result_loader.clear(result_id)
+            result_events.publish(user_id, "deleted", {"id": result_id})
+            return True
         
         return False
 
@@ -0,0 +1,76 @@
+"""
+Idempotency-Key support for calculation result writes
+Keys map to deterministic document ids, so a retried POST resolves to the
+document written by the first attempt instead of creating a duplicate, for
+as long as that document is in calculation_results.
+"""
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from app.core.config import settings
+
+
+class IdempotencyKeyConflict(Exception):
+    """Key was reused with a different payload"""
+
+
+def idempotency_document_id(user_id: str, key: str) -> str:
+    """Deterministic document id for a user's idempotency key"""
+    return hashlib.sha256(f"{user_id}:{key}".encode()).hexdigest()[:32]
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """Stable hash of a request payload, used to detect key reuse"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyIndex:
+    """
+    Bounded in-process index of recently completed keys.
+
+    Replays that hit this index are answered without a Firestore round-trip.
+    It also tracks in-flight writes so concurrent duplicates within a worker
+    wait for the first attempt instead of racing it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # document id -> (fingerprint, expires_at, result)
+        self._entries: "OrderedDict[str, Tuple[str, datetime, Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, datetime, Dict[str, Any]]]:
+        entry = self._entries.get(doc_id)
+        if entry is None:
+            return None
+        if entry[1] <= datetime.utcnow():
+            del self._entries[doc_id]
+            return None
+        self._entries.move_to_end(doc_id)
+        fingerprint, expires_at, result = entry
+        return fingerprint, expires_at, dict(result)
+
+    def put(self, doc_id: str, fingerprint: str, expires_at: datetime, result: Dict[str, Any]):
+        self._entries[doc_id] = (fingerprint, expires_at, dict(result))
+        self._entries.move_to_end(doc_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def in_flight(self, doc_id: str) -> Optional[asyncio.Future]:
+        return self._in_flight.get(doc_id)
+
+    def begin(self, doc_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[doc_id] = future
+        return future
+
+    def end(self, doc_id: str):
+        self._in_flight.pop(doc_id, None)
+
+
+idempotency_index = IdempotencyIndex(settings.IDEMPOTENCY_CACHE_SIZE)
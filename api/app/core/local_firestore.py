@@ -0,0 +1,369 @@
+"""
+Local Firestore stand-in
+In-memory implementation of the subset of the Firestore client API used by
+the backend, so the API can run (and be load-tested) without a Firebase project.
+Select it with FIRESTORE_BACKEND=memory.
+"""
+import copy
+import threading
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
+import uuid
+
+
+class _ServerTimestamp:
+    """Sentinel replaced with the current time on write"""
+
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class Increment:
+    """Numeric increment transform (mirrors firestore.Increment)"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+def _resolve(current: Any, value: Any) -> Any:
+    """Resolve a sentinel or transform against the current field value"""
+    if isinstance(value, _ServerTimestamp):
+        return datetime.now(timezone.utc)
+    if isinstance(value, Increment):
+        return (current or 0) + value.value
+    if isinstance(value, dict):
+        current = current if isinstance(current, dict) else {}
+        return {key: _resolve(current.get(key), item) for key, item in value.items()}
+    return copy.deepcopy(value)
+
+
+def _merge(current: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """set(merge=True): nested maps are merged, other values replaced"""
+    merged = dict(current)
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = _resolve(merged.get(key), value)
+    return merged
+
+
+def _update(current: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """update(): keys are field paths ('a.b' updates b inside map a)"""
+    updated = copy.deepcopy(current)
+    for field_path, value in data.items():
+        *parents, name = field_path.split(".")
+        target = updated
+        for parent in parents:
+            if not isinstance(target.get(parent), dict):
+                target[parent] = {}
+            target = target[parent]
+        target[name] = _resolve(target.get(name), value)
+    return updated
+
+
+def _field_value(data: Dict[str, Any], field_path: str) -> Any:
+    """Value at a field path ('a.b' reads b inside map a), None if absent"""
+    value: Any = data
+    for name in field_path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    return value
+
+
+class DocumentSnapshot:
+    """Point-in-time copy of a document"""
+
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return _field_value(self._data or {}, field)
+
+
+class DocumentReference:
+    """Reference to a single document"""
+
+    def __init__(self, client: "MemoryFirestoreClient", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self) -> DocumentSnapshot:
+        with self._client._lock:
+            data = self._client._documents.get(self.path)
+            return DocumentSnapshot(self, copy.deepcopy(data))
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        with self._client._lock:
+            self._client._write(self.path, data, merge=merge)
+
+    def create(self, data: Dict[str, Any]):
+        with self._client._lock:
+            if self.path in self._client._documents:
+                from google.api_core.exceptions import AlreadyExists
+                raise AlreadyExists(f"Document already exists: {self.path}")
+            self._client._write(self.path, data)
+
+    def update(self, data: Dict[str, Any]):
+        with self._client._lock:
+            if self.path not in self._client._documents:
+                from google.api_core.exceptions import NotFound
+                raise NotFound(f"No document to update: {self.path}")
+            self._client._write(self.path, data, update=True)
+
+    def delete(self):
+        with self._client._lock:
+            self._client._documents.pop(self.path, None)
+
+
+class Query:
+    """Filtered, ordered and limited view over a collection"""
+
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client: "MemoryFirestoreClient", path: str):
+        self._client = client
+        self._path = path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._start_after: Optional[Dict[str, Any]] = None
+
+    def _copy(self) -> "Query":
+        query = Query(self._client, self._path)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        query._limit = self._limit
+        query._start_after = self._start_after
+        return query
+
+    def where(self, field: str, op: str, value: Any) -> "Query":
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        query = self._copy()
+        query._filters.append((field, op, value))
+        return query
+
+    def order_by(self, field: str, direction: str = ASCENDING) -> "Query":
+        query = self._copy()
+        query._orders.append((field, direction))
+        return query
+
+    def limit(self, count: int) -> "Query":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def start_after(self, document: Any) -> "Query":
+        query = self._copy()
+        if isinstance(document, DocumentSnapshot):
+            values = document.to_dict() or {}
+            values["__name__"] = document.id
+        else:
+            values = dict(document)
+        query._start_after = values
+        return query
+
+    def stream(self):
+        with self._client._lock:
+            prefix = self._path + "/"
+            depth = self._path.count("/") + 1
+            items = [
+                (path.rsplit("/", 1)[-1], copy.deepcopy(data))
+                for path, data in self._client._documents.items()
+                if path.startswith(prefix) and path.count("/") == depth
+            ]
+
+        items = [
+            item for item in items
+            if all(_OPERATORS[op](_field_value(item[1], field), value) for field, op, value in self._filters)
+        ]
+
+        # Stable multi-key sort, applied from the least significant key
+        items.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            items.sort(
+                key=lambda item: _Orderable(_field_value(item[1], field) if field != "__name__" else item[0]),
+                reverse=direction == self.DESCENDING
+            )
+
+        if self._start_after is not None and self._orders:
+            cursor = self._start_after
+            items = [item for item in items if self._is_after(item, cursor)]
+
+        if self._limit is not None:
+            items = items[:self._limit]
+
+        for doc_id, data in items:
+            yield DocumentSnapshot(DocumentReference(self._client, f"{self._path}/{doc_id}"), data)
+
+    def _is_after(self, item: Tuple[str, Dict[str, Any]], cursor: Dict[str, Any]) -> bool:
+        """Whether item sorts strictly after the cursor values"""
+        doc_id, data = item
+        for field, direction in self._orders + [("__name__", Query.ASCENDING)]:
+            value = doc_id if field == "__name__" else _field_value(data, field)
+            cursor_value = cursor.get("__name__") if field == "__name__" else _field_value(cursor, field)
+            if value == cursor_value:
+                continue
+            greater = _Orderable(value) > _Orderable(cursor_value)
+            return greater if direction == self.ASCENDING else not greater
+        return False
+
+    def get(self) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+
+class _Orderable:
+    """Sort wrapper placing None first and comparing mixed types safely"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def _key(self):
+        if self.value is None:
+            return (0, 0)
+        if isinstance(self.value, (int, float)):
+            return (1, self.value)
+        if isinstance(self.value, datetime):
+            return (2, self.value.timestamp())
+        return (3, str(self.value))
+
+    def __lt__(self, other: "_Orderable") -> bool:
+        return self._key() < other._key()
+
+    def __gt__(self, other: "_Orderable") -> bool:
+        return self._key() > other._key()
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Orderable) and self._key() == other._key()
+
+
+class CollectionReference(Query):
+    """Reference to a collection"""
+
+    def __init__(self, client: "MemoryFirestoreClient", path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        document_id = document_id or uuid.uuid4().hex[:20]
+        return DocumentReference(self._client, f"{self._path}/{document_id}")
+
+
+class WriteBatch:
+    """Atomic group of writes, applied on commit"""
+
+    def __init__(self, client: "MemoryFirestoreClient"):
+        self._client = client
+        # (kind, reference, data, merge)
+        self._writes: List[Tuple[str, DocumentReference, Optional[Dict[str, Any]], bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference: DocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, data, merge))
+
+    def create(self, reference: DocumentReference, data: Dict[str, Any]):
+        self._writes.append(("create", reference, data, False))
+
+    def update(self, reference: DocumentReference, data: Dict[str, Any]):
+        self._writes.append(("update", reference, data, False))
+
+    def delete(self, reference: DocumentReference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        with self._client._lock:
+            documents = self._client._documents
+            for kind, reference, _, _ in self._writes:
+                if kind == "create" and reference.path in documents:
+                    from google.api_core.exceptions import AlreadyExists
+                    raise AlreadyExists(f"Document already exists: {reference.path}")
+                if kind == "update" and reference.path not in documents:
+                    from google.api_core.exceptions import NotFound
+                    raise NotFound(f"No document to update: {reference.path}")
+
+            for kind, reference, data, merge in self._writes:
+                if kind == "delete":
+                    documents.pop(reference.path, None)
+                else:
+                    self._client._write(reference.path, data, merge=merge, update=kind == "update")
+        self._writes = []
+
+
+class MemoryFirestoreClient:
+    """Thread-safe in-memory Firestore client"""
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def _write(self, path: str, data: Dict[str, Any], merge: bool = False, update: bool = False):
+        """Apply a set (merged or not) or an update (caller holds the lock)"""
+        current = self._documents.get(path) or {}
+        if update:
+            self._documents[path] = _update(current, data)
+        elif merge:
+            self._documents[path] = _merge(current, data)
+        else:
+            self._documents[path] = _resolve({}, data)
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def document(self, path: str) -> DocumentReference:
+        return DocumentReference(self, path)
+
+    def get_all(self, references: List[DocumentReference]):
+        for reference in references:
+            yield reference.get()
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def reset(self):
+        """Drop all documents"""
+        with self._lock:
+            self._documents.clear()
+
+
+_client: Optional[MemoryFirestoreClient] = None
+
+
+def get_client() -> MemoryFirestoreClient:
+    """Get process-wide in-memory client"""
+    global _client
+    if _client is None:
+        _client = MemoryFirestoreClient()
+    return _client
@@ -0,0 +1,476 @@
+"""
+Request metrics and profiling
+Per-request phase timing (auth, Firestore, PDF, serialization), Prometheus
+text exposition for /metrics and an opt-in sampling profiler for slow requests.
+
+Metrics live in process memory. Under the multi-worker server
+(app/core/server.py) every worker also writes a snapshot of them to
+METRICS_SHARED_DIR each METRICS_SNAPSHOT_SECONDS, and /metrics sums the
+snapshots of all workers (including exited ones, so counters never go
+back). Other workers' numbers are therefore up to one interval old.
+"""
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds (Prometheus histogram "le" bounds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], float], values: Dict[Tuple[str, ...], float]):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0.0) + value
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        values = self.snapshot() if values is None else values
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with labels"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], List[float]], values: Dict[Tuple[str, ...], List[float]]):
+        for labels, series in values.items():
+            current = total.get(labels)
+            total[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        values = self.snapshot() if values is None else values
+        for labels, series in sorted(values.items()):
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (repr(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            inf_labels = _format_labels(self.labelnames + ("le",), labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{inf_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Dict[str, list]:
+        """This process's values, JSON-serializable: name -> [[labels, value], ...]"""
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in self._metrics
+        }
+
+    def render(self, snapshots: Optional[List[Dict[str, list]]] = None) -> str:
+        """This process's metrics, or the sum of the given snapshots"""
+        lines = []
+        for metric in self._metrics:
+            if snapshots is None:
+                lines.extend(metric.render())
+                continue
+            total: Dict[Tuple[str, ...], Any] = {}
+            for snapshot in snapshots:
+                metric.merge(total, {tuple(labels): value for labels, value in snapshot.get(metric.name, [])})
+            lines.extend(metric.render(total))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class SharedMetrics:
+    """
+    Snapshots of every worker's metrics in one directory (METRICS_SHARED_DIR),
+    so any worker can answer /metrics for the whole server.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.METRICS_SHARED_DIR)
+
+    def write(self):
+        """Replace this worker's snapshot file"""
+        path = os.path.join(settings.METRICS_SHARED_DIR, f"worker-{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def read(self) -> List[Dict[str, list]]:
+        snapshots = []
+        for path in glob.glob(os.path.join(settings.METRICS_SHARED_DIR, "worker-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics snapshot {path}: {e}")
+        return snapshots
+
+    def render(self) -> str:
+        self.write()
+        return self.registry.render(self.read())
+
+    def _run(self):
+        while not self._stop.wait(settings.METRICS_SNAPSHOT_SECONDS):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Writing the metrics snapshot failed: {e}")
+
+    def start(self):
+        """Write snapshots periodically in this worker (call after fork)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop and write the final snapshot, which keeps counting after exit"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+
+
+shared_metrics = SharedMetrics(registry)
+
+requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "End-to-end request latency", ("method", "route")
+)
+phase_duration = registry.histogram(
+    "http_request_phase_duration_seconds",
+    "Time spent per request in auth, firestore, pdf and serialization",
+    ("route", "phase")
+)
+
+
+# Phase name -> accumulated seconds for the current request (None outside requests)
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the wall time of the block to the current request's phase total"""
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
+
+def track_phase(phase: str) -> Callable:
+    """Decorator form of timed() for sync and async functions"""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(phase):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedRoute(APIRoute):
+    """
+    Route class that separates response serialization from endpoint time.
+
+    The endpoint records when it returns; everything the route handler does
+    after that (response model validation, JSON encoding) counts as
+    serialization.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _mark_endpoint_done(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _request_timings.get()
+            if timings is not None and "_endpoint_done" in timings:
+                timings["serialization"] = time.perf_counter() - timings.pop("_endpoint_done")
+            return response
+
+        return timed_handler
+
+
+def _mark_endpoint_done(endpoint: Callable) -> Callable:
+    # Routes are re-created on include_router, don't wrap twice
+    if getattr(endpoint, "_marks_endpoint_done", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _record_endpoint_done()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _record_endpoint_done()
+
+    wrapper._marks_endpoint_done = True
+    return wrapper
+
+
+def _record_endpoint_done():
+    timings = _request_timings.get()
+    if timings is not None:
+        timings["_endpoint_done"] = time.perf_counter()
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler for slow requests.
+
+    A background thread samples the event-loop thread's stack while requests
+    are in flight. Requests slower than the threshold have their samples
+    written as folded stacks (flamegraph.pl / speedscope format). Samples are
+    attributed to every request in flight, so profiles are sharpest at low
+    concurrency.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float, output_dir: str):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self._active: Dict[int, StackCounter] = {}
+        self._lock = threading.Lock()
+        self._target_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._next_id = 0
+
+    def start(self) -> int:
+        """Begin sampling for a request, returns a handle for finish()"""
+        with self._lock:
+            self._next_id += 1
+            handle = self._next_id
+            self._active[handle] = StackCounter()
+            if self._thread is None:
+                self._target_thread = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        return handle
+
+    def finish(self, handle: int, route: str, duration: float):
+        """Stop sampling and write the profile if the request was slow"""
+        with self._lock:
+            samples = self._active.pop(handle, None)
+        if not samples or duration < self.threshold:
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            safe_route = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+            path = os.path.join(self.output_dir, f"{int(time.time() * 1000)}_{safe_route}.folded")
+            with open(path, "w") as f:
+                for stack, sample_count in samples.most_common():
+                    f.write(f"{stack} {sample_count}\n")
+            logger.warning(f"Slow request {route} took {duration * 1000:.0f}ms, profile written to {path}")
+        except OSError as e:
+            logger.error(f"Failed to write request profile: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frame = sys._current_frames().get(self._target_thread)
+                if frame is None:
+                    continue
+                stack = _fold_stack(frame)
+                for samples in self._active.values():
+                    samples[stack] += 1
+
+
+def _fold_stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+profiler: Optional[SlowRequestProfiler] = None
+if settings.PROFILE_SLOW_REQUEST_MS > 0:
+    profiler = SlowRequestProfiler(
+        settings.PROFILE_SLOW_REQUEST_MS,
+        settings.PROFILE_SAMPLE_INTERVAL_MS,
+        settings.PROFILE_OUTPUT_DIR
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and phase breakdown"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        handle = profiler.start() if profiler else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _request_timings.reset(token)
+
+            # Label by route template to keep cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+
+            requests_total.inc(method, route_path, str(status_code))
+            request_duration.observe(duration, method, route_path)
+            timings.pop("_endpoint_done", None)
+            for phase, seconds in timings.items():
+                phase_duration.observe(seconds, route_path, phase)
+
+            if handle is not None:
+                profiler.finish(handle, f"{method} {route_path}", duration)
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of all registered metrics (all workers' when shared)"""
+    if shared_metrics.enabled:
+        return shared_metrics.render()
+    return registry.render()
@@ -0,0 +1,203 @@
+"""
+Admission control
+Per-user token-bucket rate limiting with per-route cost weights, and a
+global concurrency cap that sheds load once the worker is saturated.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+from fastapi import Depends, HTTPException, status
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.firebase_auth import get_current_user_firebase
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Tokens consumed per request. Expensive routes (ReportLab rendering) cost far
+# more than cheap reads; unlisted routes cost 1.
+ROUTE_COSTS: Dict[str, float] = {
+    "results_read": 1.0,
+    "results_write": 2.0,
+    "results_batch": 10.0,
+    "results_export": 5.0,
+    "results_series": 2.0,
+    "results_stream": 5.0,
+    "profile": 1.0,
+    "reference_ranges": 2.0,
+    "icd10_search": 2.0,
+    "dose_adjustments": 1.0,
+    "usage_counts": 1.0,
+    "pdf_export": 20.0,
+}
+
+# Paths that must keep answering under load (probes and scraping)
+SHED_EXEMPT_PATHS = {"/", "/health", "/ready", "/metrics", "/api/v1/health"}
+
+# Long-lived streams would pin concurrency slots; they have their own
+# connection limits (see app/core/events.py)
+STREAMING_PATHS = {"/api/v1/calculation_results/stream"}
+
+rate_limited_total = registry.counter(
+    "rate_limited_requests_total", "Requests rejected by per-user rate limits", ("route",)
+)
+shed_total = registry.counter(
+    "shed_requests_total", "Requests rejected by the global concurrency cap"
+)
+
+# (key, capacity, refill per second)
+Bucket = Tuple[str, float, float]
+
+
+class LocalBucketStore:
+    """Process-local token buckets, bounded to the most recently used keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill time)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def consume(self, buckets: List[Bucket], cost: float) -> float:
+        """Take `cost` from every bucket, or none; returns seconds to wait (0 if allowed)"""
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, capacity, rate in buckets:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens if wait else tokens - cost, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+# Atomically refill and consume several buckets; returns the wait time as a string
+_REDIS_CONSUME_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[1 + 2 * i])
+  local rate = tonumber(ARGV[2 + 2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  levels[i] = tokens
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / rate)
+  end
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[1 + 2 * i])
+  local rate = tonumber(ARGV[2 + 2 * i])
+  local tokens = levels[i]
+  if wait == 0 then
+    tokens = tokens - cost
+  end
+  redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers through Redis (requires the redis package)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_CONSUME_SCRIPT)
+
+    async def consume(self, buckets: List[Bucket], cost: float) -> float:
+        args: List[Any] = [time.time(), cost]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        try:
+            wait = await self._script(keys=[f"ratelimit:{key}" for key, _, _ in buckets], args=args)
+            return float(wait)
+        except Exception as e:
+            # Fail open: a cache outage shouldn't take the API down
+            logger.error(f"Rate limit backend error, allowing request: {e}")
+            return 0.0
+
+
+def _create_store():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBucketStore(settings.REDIS_URL)
+    return LocalBucketStore()
+
+
+bucket_store = _create_store()
+
+
+def rate_limit(route: str):
+    """
+    Dependency enforcing the per-user and per-user-per-route token buckets.
+
+    Usage: @router.get(..., dependencies=[Depends(rate_limit("pdf_export"))])
+    """
+    cost = ROUTE_COSTS.get(route, 1.0)
+
+    async def check_rate_limit(current_user: Dict[str, Any] = Depends(get_current_user_firebase)):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        user_id = current_user['id']
+        wait = await bucket_store.consume([
+            (f"user:{user_id}", settings.RATE_LIMIT_USER_BURST, settings.RATE_LIMIT_USER_PER_SECOND),
+            (f"user:{user_id}:{route}", settings.RATE_LIMIT_ROUTE_BURST, settings.RATE_LIMIT_ROUTE_PER_SECOND),
+        ], cost)
+
+        if wait > 0:
+            rate_limited_total.inc(route)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+    return check_rate_limit
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware returning 503 once MAX_CONCURRENT_REQUESTS are in flight"""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        limit = settings.MAX_CONCURRENT_REQUESTS
+        path = scope.get("path")
+        if scope["type"] != "http" or limit <= 0 or path in SHED_EXEMPT_PATHS or path in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= limit:
+            shed_total.inc()
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server is overloaded, please retry"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
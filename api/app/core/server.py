@@ -0,0 +1,213 @@
+"""
+Production server launcher
+Runs the API with multiple workers. Uses gunicorn (pre-fork, heavy modules
+preloaded in the master so workers share them copy-on-write) when available,
+and falls back to uvicorn's own multi-process mode otherwise.
+"""
+import glob
+import importlib
+import importlib.util
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional, Dict, Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modules that are expensive to import; loaded once in the master process
+HEAVY_MODULES = [
+    "reportlab.platypus",
+    "reportlab.lib.styles",
+    "firebase_admin",
+    "firebase_admin.auth",
+    "firebase_admin.firestore",
+    "app.services.pdf_export",
+    "app.services.external_integrations",
+]
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+EVENT_LOOP = "uvloop" if _available("uvloop") else "asyncio"
+HTTP_PROTOCOL = "httptools" if _available("httptools") else "h11"
+
+# Time left after connections are closed for lifespan shutdown (flushing
+# buffered writes and usage counters) before gunicorn kills the worker
+SHUTDOWN_MARGIN_SECONDS = 10
+
+
+if _available("gunicorn"):
+    import sys
+
+    from gunicorn.arbiter import Arbiter
+    from uvicorn.server import Server
+    from uvicorn.workers import UvicornWorker
+
+    class DrainingServer(Server):
+        """
+        Uvicorn server that keeps serving for READINESS_DRAIN_SECONDS after
+        SIGTERM with app.state.draining set (so /ready answers 503 and load
+        balancers stop routing here), then shuts down as usual. A second
+        signal stops it at once.
+        """
+
+        def __init__(self, config, app):
+            super().__init__(config=config)
+            self.app = app
+            self._exit_signal = None
+            self._exit_at = 0.0
+
+        def handle_exit(self, sig, frame):
+            if self._exit_signal is not None or settings.READINESS_DRAIN_SECONDS <= 0:
+                self.app.state.draining = True
+                super().handle_exit(sig, frame)
+                return
+            # Runs in a signal handler: only record the request, on_tick acts on it
+            self.app.state.draining = True
+            self._exit_signal = sig
+            self._exit_at = time.monotonic() + settings.READINESS_DRAIN_SECONDS
+
+        async def on_tick(self, counter: int) -> bool:
+            if self._exit_signal is not None and not self.should_exit and time.monotonic() >= self._exit_at:
+                super().handle_exit(self._exit_signal, None)
+            return await super().on_tick(counter)
+
+        async def shutdown(self, sockets=None):
+            # Event streams never end on their own and lifespan shutdown only
+            # runs once connections are closed, so end them first
+            from app.core.events import result_events
+            result_events.close()
+            await super().shutdown(sockets=sockets)
+
+    class ProductionUvicornWorker(UvicornWorker):
+        """Gunicorn worker running uvicorn with the fastest available loop and parser"""
+
+        CONFIG_KWARGS = {
+            "loop": EVENT_LOOP,
+            "http": HTTP_PROTOCOL,
+            "lifespan": "on",
+            # Without this uvicorn waits for open connections (event streams) forever
+            "timeout_graceful_shutdown": settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        }
+
+        async def _serve(self) -> None:
+            # UvicornWorker._serve with DrainingServer in place of Server
+            self.config.app = self.wsgi
+            server = DrainingServer(config=self.config, app=self.wsgi)
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+
+def default_worker_count() -> int:
+    """Worker count from settings, defaulting to the number of CPUs"""
+    if settings.SERVER_WORKERS > 0:
+        return settings.SERVER_WORKERS
+    return os.cpu_count() or 1
+
+
+def preload_heavy_modules():
+    """Import heavy dependencies before workers are forked"""
+    for module in HEAVY_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Could not preload {module}: {e}")
+    
+    # Build the PDF style sheet once so workers inherit it
+    from app.services.pdf_export import get_pdf_exporter
+    get_pdf_exporter()
+
+
+def prepare_shared_metrics() -> Optional[str]:
+    """
+    Give the workers an empty METRICS_SHARED_DIR so /metrics covers all of
+    them; snapshots of a previous run are removed, or their counts would be
+    added in. Returns the directory if it is a temporary one created here.
+    """
+    directory = settings.METRICS_SHARED_DIR
+    created = None
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "worker-*.json*")):
+            os.remove(path)
+    else:
+        directory = created = tempfile.mkdtemp(prefix="medcalc-metrics-")
+    # Forked (gunicorn) workers inherit settings; spawned (uvicorn) ones read the environment
+    settings.METRICS_SHARED_DIR = os.environ["METRICS_SHARED_DIR"] = directory
+    return created
+
+
+def run_production(host: Optional[str] = None, port: Optional[int] = None, workers: Optional[int] = None):
+    """Start the API with multiple worker processes"""
+    host = host or settings.SERVER_HOST
+    port = port or settings.SERVER_PORT
+    workers = workers or default_worker_count()
+    metrics_dir = prepare_shared_metrics() if workers > 1 else None
+    try:
+        _run_workers(host, port, workers)
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def _run_workers(host: str, port: int, workers: int):
+    if _available("gunicorn"):
+        _run_gunicorn(host, port, workers)
+    else:
+        # Uvicorn spawns fresh interpreters, so nothing is shared between workers
+        print(f"⚠️ gunicorn not installed - starting {workers} uvicorn workers without preloading")
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            host=host,
+            port=port,
+            workers=workers,
+            loop=EVENT_LOOP,
+            http=HTTP_PROTOCOL,
+            timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        )
+
+
+def _run_gunicorn(host: str, port: int, workers: int):
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornApplication(BaseApplication):
+        def __init__(self, options: Dict[str, Any]):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    print(f"🚀 Starting {workers} workers on {host}:{port} (loop={EVENT_LOOP}, http={HTTP_PROTOCOL})")
+    preload_heavy_modules()
+
+    GunicornApplication({
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": "app.core.server.ProductionUvicornWorker",
+        # Import the app in the master so workers share loaded modules copy-on-write.
+        # Firebase is initialized per worker in the lifespan handler (gRPC is not fork-safe).
+        "preload_app": True,
+        # Let in-flight requests finish on SIGTERM before workers are killed;
+        # longer than the worker's own drain so lifespan shutdown still runs
+        "graceful_timeout": math.ceil(
+            settings.READINESS_DRAIN_SECONDS + settings.GRACEFUL_SHUTDOWN_TIMEOUT + SHUTDOWN_MARGIN_SECONDS
+        ),  # gunicorn only accepts whole seconds
+        "timeout": settings.WORKER_TIMEOUT,
+        "keepalive": 5,
+    }).run()
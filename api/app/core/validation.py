@@ -0,0 +1,195 @@
+"""
+Calculation input validation
+Each calculator's inputFields (app/data/calculators.json) are compiled once
+into per-field checks, so input_data is validated without walking the
+definition on every request. Unknown calculators and extra keys (such as
+derived values the client stores alongside the inputs) only get the
+generic checks: flat scalar values with bounded counts and lengths.
+"""
+import math
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.core.calculators import load_calculator_definitions
+from app.core.config import settings
+
+# Returns an error message, or None if the value is acceptable
+FieldCheck = Callable[[Any], Optional[str]]
+
+
+class InputValidationError(ValueError):
+    """input_data doesn't match the calculator definition"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def _is_number(value: Any) -> bool:
+    # bool is an int subclass, but True is not an age
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _check_scalar(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, bool) or _is_number(value):
+        return None
+    if isinstance(value, str):
+        if len(value) > settings.MAX_INPUT_TEXT_LENGTH:
+            return f"must be at most {settings.MAX_INPUT_TEXT_LENGTH} characters"
+        return None
+    if isinstance(value, float):
+        return "must be a finite number"
+    return "must be a number, string or boolean"
+
+
+def _compile_number(field: Dict[str, Any]) -> FieldCheck:
+    minimum = field.get("min")
+    maximum = field.get("max")
+
+    def check(value: Any) -> Optional[str]:
+        if not _is_number(value):
+            return "must be a number"
+        if minimum is not None and value < minimum:
+            return f"must be at least {minimum}"
+        if maximum is not None and value > maximum:
+            return f"must be at most {maximum}"
+        return None
+
+    return check
+
+
+def _compile_select(field: Dict[str, Any]) -> FieldCheck:
+    allowed = frozenset(str(option["value"]) for option in field.get("options", []))
+    choices = ", ".join(sorted(allowed))
+
+    def check(value: Any) -> Optional[str]:
+        if not isinstance(value, str) or value not in allowed:
+            return f"must be one of: {choices}"
+        return None
+
+    return check
+
+
+def _compile_text(field: Dict[str, Any]) -> FieldCheck:
+    def check(value: Any) -> Optional[str]:
+        if not isinstance(value, str):
+            return "must be a string"
+        return _check_scalar(value)
+
+    return check
+
+
+FIELD_COMPILERS: Dict[str, Callable[[Dict[str, Any]], FieldCheck]] = {
+    "number": _compile_number,
+    "select": _compile_select,
+    "text": _compile_text,
+}
+
+
+class InputValidator:
+    """Compiled checks for one calculator's input_data"""
+
+    __slots__ = ("fields", "required")
+
+    def __init__(self, input_fields: List[Dict[str, Any]]):
+        self.fields: Dict[str, FieldCheck] = {}
+        self.required: Tuple[str, ...] = tuple(
+            field["name"] for field in input_fields if field.get("required")
+        )
+        for field in input_fields:
+            compiler = FIELD_COMPILERS.get(field.get("type"), _compile_text)
+            self.fields[field["name"]] = compiler(field)
+
+    def errors(self, input_data: Dict[str, Any]) -> List[str]:
+        """Messages for every problem in input_data (empty if valid)"""
+        if len(input_data) > settings.MAX_INPUT_FIELDS:
+            return [f"input_data: at most {settings.MAX_INPUT_FIELDS} fields are allowed"]
+
+        errors = [f"{name}: field required" for name in self.required if input_data.get(name) is None]
+        for name, value in input_data.items():
+            if len(name) > settings.MAX_INPUT_KEY_LENGTH:
+                errors.append(f"{name[:settings.MAX_INPUT_KEY_LENGTH]}...: name is too long")
+                continue
+            check = self.fields.get(name)
+            if check is None or value is None:
+                # Extra keys and omitted optional fields
+                message = _check_scalar(value)
+            else:
+                message = check(value)
+            if message:
+                errors.append(f"{name}: {message}")
+        return errors
+
+
+@lru_cache(maxsize=None)
+def compiled_validators() -> Dict[str, InputValidator]:
+    """Validators for every known calculator, keyed by calculator name"""
+    return {
+        name: InputValidator(definition["inputFields"])
+        for name, definition in load_calculator_definitions().items()
+    }
+
+
+_GENERIC_VALIDATOR = InputValidator([])
+
+
+def get_input_validator(calculator_name: str) -> InputValidator:
+    """Validator for a calculator; unknown calculators get the generic checks"""
+    return compiled_validators().get(calculator_name, _GENERIC_VALIDATOR)
+
+
+def validate_input_data(calculator_name: str, input_data: Dict[str, Any]) -> None:
+    """Raise InputValidationError if input_data is invalid for the calculator"""
+    errors = get_input_validator(calculator_name).errors(input_data)
+    if errors:
+        raise InputValidationError(errors)
+
+
+def _too_large_detail() -> str:
+    return f"Request body is larger than {settings.MAX_REQUEST_BODY_BYTES} bytes"
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware returning 413 for bodies over MAX_REQUEST_BODY_BYTES"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = settings.MAX_REQUEST_BODY_BYTES
+        if scope["type"] != "http" or limit <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                if not value.isdigit() or int(value) > limit:
+                    response = JSONResponse(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        content={"detail": _too_large_detail()},
+                        headers={"Connection": "close"},
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        # Chunked bodies have no Content-Length; count bytes as they arrive.
+        # The route reads the body, so the 413 is raised there as HTTPException.
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=_too_large_detail(),
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,92 @@
+"""
+Group commit for document writes
+Writes submitted within WRITE_BUFFER_MAX_DELAY_MS of each other (from any
+request) are committed together as one Firestore batched write, so a burst
+of creates costs one round-trip instead of one each. A caller is only
+answered once its batch has committed, so nothing is acknowledged before
+it is durable.
+
+Commits run in a worker thread; callers publish events and build responses
+back on the event loop after their future resolves.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches of more than 500 writes
+FIRESTORE_MAX_BATCH = 500
+
+write_batch_size = registry.histogram(
+    "write_buffer_batch_size", "Writes committed per group commit",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+# (document reference, data, future resolved on commit)
+PendingWrite = Tuple[Any, Dict[str, Any], asyncio.Future]
+
+
+class WriteBuffer:
+    """Coalesces set() calls into batched commits bounded in size and delay"""
+
+    def __init__(self, client_factory: Callable[[], Any], max_batch: int, max_delay_ms: float):
+        self.client_factory = client_factory
+        self.max_batch = max(1, min(max_batch, FIRESTORE_MAX_BATCH))
+        self.max_delay = max_delay_ms / 1000
+        self._pending: List[PendingWrite] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._commits: Set[asyncio.Task] = set()
+
+    async def set(self, doc_ref: Any, data: Dict[str, Any]):
+        """Write data to doc_ref in the next batch; returns once it has committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc_ref, data, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        # Shielded: a cancelled request doesn't cancel its neighbours' commit
+        await asyncio.shield(future)
+
+    def _flush(self):
+        """Start committing everything pending, in batches of max_batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.get_running_loop().create_task(self._commit(batch))
+            self._commits.add(task)
+            task.add_done_callback(self._commits.discard)
+
+    async def _commit(self, pending: List[PendingWrite]):
+        write_batch_size.observe(len(pending))
+        try:
+            await asyncio.to_thread(self._commit_sync, pending)
+        except Exception as e:
+            # The batch is atomic: every write in it failed
+            logger.error(f"Group commit of {len(pending)} writes failed: {e}")
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+                    # The caller may have gone away - don't log "exception never retrieved"
+                    future.exception()
+            return
+        for _, _, future in pending:
+            if not future.done():
+                future.set_result(None)
+
+    def _commit_sync(self, pending: List[PendingWrite]):
+        batch = self.client_factory().batch()
+        for doc_ref, data, _ in pending:
+            batch.set(doc_ref, data)
+        batch.commit()
+
+    async def flush(self):
+        """Commit everything pending now and wait for in-flight commits (shutdown)"""
+        self._flush()
+        if self._commits:
+            await asyncio.gather(*self._commits, return_exceptions=True)
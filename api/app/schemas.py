@@ -1,9 +1,12 @@
 """
 Pydantic schemas for API request/response validation
 """
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.validation import validate_input_data
 
 
 # User schemas
@@ -38,11 +41,55 @@ class SessionResponse(BaseModel):
 
 # Calculation Result schemas
 class CalculationResultCreate(BaseModel):
-    calculator_name: str
-    calculator_name_ru: Optional[str] = None
+    calculator_name: str = Field(..., min_length=1, max_length=200)
+    calculator_name_ru: Optional[str] = Field(None, max_length=200)
     input_data: Dict[str, Any]
-    result_value: float
-    interpretation: Optional[str] = None
+    result_value: float = Field(..., allow_inf_nan=False)
+    interpretation: Optional[str] = Field(None, max_length=2000)
+    
+    @model_validator(mode="after")
+    def check_input_data(self):
+        # Checked against the calculator's inputFields (app/core/validation.py)
+        validate_input_data(self.calculator_name, self.input_data)
+        return self
+
+
+class CalculationResultBatchItem(CalculationResultCreate):
+    idempotency_key: str = Field(..., min_length=1, max_length=255)
+    # When the result was calculated on the device (it may be sent much later)
+    performed_at: Optional[datetime] = None
+    
+    @field_validator("performed_at")
+    @classmethod
+    def check_performed_at(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.astimezone(timezone.utc)
+        now = datetime.now(timezone.utc)
+        if value > now + timedelta(seconds=settings.OFFLINE_MAX_CLOCK_SKEW_SECONDS):
+            raise ValueError("performed_at is in the future")
+        if value < now - timedelta(days=settings.OFFLINE_MAX_AGE_DAYS):
+            raise ValueError(f"performed_at is more than {settings.OFFLINE_MAX_AGE_DAYS} days old")
+        # A device clock slightly ahead doesn't put results after later ones
+        return min(value, now)
+
+
+class CalculationResultBatchCreate(BaseModel):
+    # Items are validated one by one so a bad item doesn't reject the batch
+    items: List[Dict[str, Any]] = Field(..., min_length=1, max_length=100)
+
+
+class CalculationResultBatchItemResponse(BaseModel):
+    idempotency_key: Optional[str] = None
+    status: int
+    result: Optional[Dict[str, Any]] = None
+    detail: Optional[Any] = None
+
+
+class CalculationResultBatchResponse(BaseModel):
+    results: List[CalculationResultBatchItemResponse]
 
 
 class CalculationResultResponse(BaseModel):
@@ -59,6 +106,28 @@ class CalculationResultResponse(BaseModel):
         from_attributes = True
 
 
+class SeriesPoint(BaseModel):
+    performed_at: datetime
+    value: float
+
+
+class SeriesRollup(BaseModel):
+    start: datetime
+    count: int
+    min: float
+    max: float
+    mean: float
+
+
+class CalculationSeriesResponse(BaseModel):
+    calculator_name: str
+    total_points: int
+    downsampled: bool = False
+    points: List[SeriesPoint] = []
+    rollup: Optional[str] = None
+    rollups: List[SeriesRollup] = []
+
+
 # Profile schemas
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
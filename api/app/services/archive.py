@@ -0,0 +1,215 @@
+"""
+Archive old calculation results
+Moves each user's results from whole UTC months older than
+ARCHIVE_AFTER_DAYS out of calculation_results into per-user, per-month
+gzipped blobs (see app/core/archive.py), so the hot collection only holds
+recent history. Read paths fall back to the archive, so history stays
+complete for the user.
+
+Per month the order is: upload the new blobs, switch the part manifests
+to them in one batch, flag the user, delete the hot documents, then delete
+the previous generation's blobs. A run interrupted part-way leaves results
+in both places (reads de-duplicate them); the next run merges them into a
+new generation.
+
+Usage (from the api directory):
+    python -m app.services.archive
+    python -m app.services.archive --older-than-days 730 --user <user id>
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+from app.core.archive import (
+    archive_object_key,
+    encode_month,
+    manifest_document_id,
+    month_of,
+    result_archive,
+)
+from app.core.cache import shared_cache
+from app.core.config import settings
+from app.core.firestore import (
+    CALCULATION_RESULTS_COLLECTION,
+    RESULT_ARCHIVES_COLLECTION,
+    USERS_COLLECTION,
+    get_firestore_client,
+    server_timestamp,
+)
+from app.core.write_buffer import FIRESTORE_MAX_BATCH
+from app.services.history_export import iter_user_results
+
+USER_PAGE_SIZE = 500
+
+
+def archive_cutoff(older_than_days: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the month containing now - older_than_days, so only whole months are archived"""
+    point = (now or datetime.now(timezone.utc)) - timedelta(days=older_than_days)
+    return point.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def iter_user_ids() -> Iterator[str]:
+    """Every user id, one Firestore page at a time"""
+    db = get_firestore_client()
+    query = db.collection(USERS_COLLECTION).order_by("__name__")
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.limit(USER_PAGE_SIZE).stream())
+        for doc in docs:
+            yield doc.id
+        if len(docs) < USER_PAGE_SIZE:
+            return
+        last_doc = docs[-1]
+
+
+def flag_user_archived(user_id: str):
+    """Set users/{id}.has_archive so read paths start consulting the archive"""
+    db = get_firestore_client()
+    user_ref = db.collection(USERS_COLLECTION).document(user_id)
+    user = user_ref.get()
+    if user.exists and user.to_dict().get("has_archive"):
+        return
+    user_ref.set({"has_archive": True}, merge=True)
+    # Authenticated requests reuse the cached user doc; without this they would
+    # miss the archive until it expires. Only reaches workers via a shared tier.
+    from app.core.firebase_auth import USERS_BY_EMAIL_CACHE
+    email = user.to_dict().get("email") if user.exists else None
+    if email:
+        asyncio.run(shared_cache.delete(USERS_BY_EMAIL_CACHE, email))
+
+
+def archive_month(user_id: str, month: str, rows: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """Move one user-month of hot results into the archive; returns the compressed size"""
+    db = get_firestore_client()
+    store = result_archive.store
+    archives_ref = db.collection(RESULT_ARCHIVES_COLLECTION)
+
+    # Merge with what an earlier (possibly interrupted) run archived
+    records: Dict[str, Dict[str, Any]] = {}
+    previous = result_archive.month_manifests(user_id, month)
+    for manifest in previous:
+        for result in result_archive.load_month(manifest):
+            records[result["id"]] = result
+    for result_id, data in rows:
+        data = dict(data)
+        data.pop("idempotency", None)
+        data["id"] = result_id
+        records[result_id] = data
+
+    results = sorted(records.values(), key=lambda result: result["performed_at"])
+    generation = max((manifest["generation"] for manifest in previous), default=0) + 1
+    part_size = max(1, settings.ARCHIVE_PART_MAX_RESULTS)
+    parts = [results[start:start + part_size] for start in range(0, len(results), part_size)]
+    if len(parts) > FIRESTORE_MAX_BATCH:
+        raise RuntimeError(f"{user_id} {month}: {len(results)} results need more than {FIRESTORE_MAX_BATCH} parts")
+
+    # Upload the new generation, then switch every part manifest to it in one batch
+    compressed_bytes = 0
+    batch = db.batch()
+    for part, part_results in enumerate(parts):
+        object_key = archive_object_key(user_id, month, generation, part)
+        blob = encode_month(part_results)
+        store.put(object_key, blob)
+        compressed_bytes += len(blob)
+        batch.set(archives_ref.document(manifest_document_id(user_id, month, part)), {
+            "user_id": user_id,
+            "month": month,
+            "part": part,
+            "parts": len(parts),
+            "object_key": object_key,
+            "generation": generation,
+            "count": len(part_results),
+            "compressed_bytes": len(blob),
+            "ids": [result["id"] for result in part_results],
+            "oldest": part_results[0]["performed_at"],
+            "newest": part_results[-1]["performed_at"],
+            # When the newest of them reached the server (offline saves arrive late)
+            "newest_created_at": max(result.get("created_at") or result["performed_at"] for result in part_results),
+            "archived_at": server_timestamp(),
+        })
+    for manifest in previous:
+        if manifest["part"] >= len(parts):
+            batch.delete(archives_ref.document(manifest_document_id(user_id, month, manifest["part"])))
+    batch.commit()
+    flag_user_archived(user_id)
+
+    results_ref = db.collection(CALCULATION_RESULTS_COLLECTION)
+    for start in range(0, len(rows), FIRESTORE_MAX_BATCH):
+        batch = db.batch()
+        for result_id, _ in rows[start:start + FIRESTORE_MAX_BATCH]:
+            batch.delete(results_ref.document(result_id))
+        batch.commit()
+
+    for manifest in previous:
+        store.delete(manifest["object_key"])
+    return compressed_bytes
+
+
+def archive_user(user_id: str, cutoff: datetime) -> Dict[str, int]:
+    """Archive a user's results performed before cutoff, one month at a time"""
+    summary = {"results": 0, "months": 0, "compressed_bytes": 0}
+    month: Optional[str] = None
+    rows: List[Tuple[str, Dict[str, Any]]] = []
+
+    def flush():
+        compressed_bytes = archive_month(user_id, month, rows)
+        summary["results"] += len(rows)
+        summary["months"] += 1
+        summary["compressed_bytes"] += compressed_bytes
+
+    # Oldest first, so a month is complete once a later month shows up
+    for page in iter_user_results(user_id, until=cutoff, include_archive=False):
+        for result_id, data in page:
+            performed_at = data.get("performed_at")
+            if not isinstance(performed_at, datetime):
+                continue
+            result_month = month_of(performed_at)
+            if month is not None and result_month != month:
+                flush()
+                rows = []
+            month = result_month
+            rows.append((result_id, data))
+    if rows:
+        flush()
+    return summary
+
+
+def archive_results(older_than_days: int, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Archive every user's (or one user's) old results; returns totals"""
+    cutoff = archive_cutoff(older_than_days)
+    totals = {"cutoff": cutoff, "users": 0, "results": 0, "months": 0, "compressed_bytes": 0}
+    for current_user_id in ([user_id] if user_id else iter_user_ids()):
+        summary = archive_user(current_user_id, cutoff)
+        if summary["results"]:
+            totals["users"] += 1
+            for key in ("results", "months", "compressed_bytes"):
+                totals[key] += summary[key]
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                        help="archive whole months older than this (default: ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--user", help="only archive this user id")
+    args = parser.parse_args(argv)
+    if args.older_than_days <= settings.OFFLINE_MAX_AGE_DAYS:
+        # Keys replay only while their document is hot; queued saves are retried for this long
+        parser.error(f"--older-than-days must be more than OFFLINE_MAX_AGE_DAYS ({settings.OFFLINE_MAX_AGE_DAYS})")
+
+    from app.core.firebase_auth import initialize_firebase
+    initialize_firebase()
+
+    totals = archive_results(args.older_than_days, user_id=args.user)
+    print(
+        f"✅ Archived {totals['results']} results of {totals['users']} users "
+        f"({totals['months']} months, {totals['compressed_bytes']} bytes) before {totals['cutoff']:%Y-%m-%d}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
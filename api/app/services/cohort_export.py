@@ -0,0 +1,403 @@
+"""
+Cohort export of calculation results for analytics
+Streams calculation_results from Firestore page by page, flattens input_data
+into typed columns per calculator (from app/data/calculators.json) and writes
+compressed columnar files with bounded memory: Parquet when pyarrow is
+installed, NumPy .npz otherwise.
+
+Layout: <out>/<calculator>/part-<run>.parquet (or part-<run>-<chunk>.npz),
+plus <out>/_watermark.json recording how far previous runs got.
+
+The watermark follows created_at, when a result reached the server, not
+performed_at: offline saves keep the device's time and can arrive up to
+OFFLINE_MAX_AGE_DAYS later, behind a watermark on performed_at.
+
+A full export also reads the archived months (app/core/archive.py) first,
+keeping every archived id in memory (tens of bytes each) to skip results
+that are briefly in both places. It fails, removing its files, if the
+archive job changes the archive while it runs, so schedule the two apart.
+Later incremental runs only read the hot collection and fail if results
+newer than the watermark have already been archived.
+
+Usage (from the api directory):
+    python -m app.services.cohort_export --out exports/cohort
+    python -m app.services.cohort_export --out exports/cohort --incremental
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+from app.core.archive import result_archive
+from app.core.calculators import get_input_fields
+from app.core.firestore import (
+    CALCULATION_RESULTS_COLLECTION,
+    RESULT_ARCHIVES_COLLECTION,
+    get_firestore_client,
+)
+
+WATERMARK_FILE = "_watermark.json"
+
+# Columns present for every calculator: (name, type)
+BASE_COLUMNS = [
+    ("id", "string"),
+    ("user_id", "string"),
+    ("performed_at", "timestamp"),
+    ("result_value", "float"),
+    ("interpretation", "string"),
+]
+
+
+def calculator_slug(name: str) -> str:
+    """Directory-safe calculator name"""
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "unknown"
+
+
+def calculator_columns(calculator_name: str) -> List[Tuple[str, str]]:
+    """Typed columns for a calculator; unknown calculators keep input_data as JSON"""
+    fields = get_input_fields(calculator_name)
+    if not fields:
+        return BASE_COLUMNS + [("input_json", "string")]
+    return BASE_COLUMNS + [
+        (f"input_{field['name']}", "float" if field["type"] == "number" else "string")
+        for field in fields
+    ]
+
+
+def _to_utc(value: Any) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def flatten_result(doc_id: str, data: Dict[str, Any], columns: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Flatten one result document into a row matching `columns`"""
+    input_data = data.get("input_data") or {}
+    row = {
+        "id": doc_id,
+        "user_id": data.get("user_id"),
+        "performed_at": _to_utc(data.get("performed_at")),
+        "result_value": _to_float(data.get("result_value")),
+        "interpretation": data.get("interpretation"),
+    }
+    for name, column_type in columns[len(BASE_COLUMNS):]:
+        if name == "input_json":
+            row[name] = json.dumps(input_data, sort_keys=True, default=str)
+            continue
+        value = input_data.get(name[len("input_"):])
+        if column_type == "float":
+            row[name] = _to_float(value)
+        else:
+            row[name] = None if value is None else str(value)
+    return row
+
+
+class ParquetPartWriter:
+    """Writes one Parquet file, one row group per flushed chunk"""
+
+    extension = "parquet"
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        types = {"string": pa.string(), "float": pa.float64(), "timestamp": pa.timestamp("ms", tz="UTC")}
+        self._schema = pa.schema([(name, types[column_type]) for name, column_type in columns])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows: List[Dict[str, Any]]):
+        table = self._pa.Table.from_pylist(rows, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+class NpzPartWriter:
+    """Writes one compressed .npz file per flushed chunk (no pyarrow needed)"""
+
+    extension = "npz"
+
+    def __init__(self, path: str, columns: List[Tuple[str, str]]):
+        import numpy as np
+
+        self._np = np
+        self._base_path = path[:-len(".npz")]
+        self._columns = columns
+        self._chunk = 0
+
+    def write(self, rows: List[Dict[str, Any]]):
+        np = self._np
+        arrays = {}
+        for name, column_type in self._columns:
+            values = [row[name] for row in rows]
+            if column_type == "float":
+                arrays[name] = np.array(values, dtype=np.float64)
+            elif column_type == "timestamp":
+                arrays[name] = np.array(
+                    [v.replace(tzinfo=None) if v is not None else None for v in values],
+                    dtype="datetime64[ms]"
+                )
+            else:
+                arrays[name] = np.array(["" if v is None else v for v in values], dtype=str)
+        self._chunk += 1
+        np.savez_compressed(f"{self._base_path}-{self._chunk:04d}.npz", **arrays)
+
+    def close(self):
+        pass
+
+
+def resolve_writer_class(output_format: str):
+    """Pick the writer for 'parquet', 'npz' or 'auto' (parquet if pyarrow is installed)"""
+    if output_format in ("auto", "parquet"):
+        try:
+            import pyarrow  # noqa: F401
+            return ParquetPartWriter
+        except ImportError:
+            if output_format == "parquet":
+                raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+    try:
+        import numpy  # noqa: F401
+        return NpzPartWriter
+    except ImportError:
+        raise RuntimeError("Cohort export requires pyarrow or numpy: pip install pyarrow")
+
+
+def read_watermark(out_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def iter_results(page_size: int, since: Optional[datetime] = None) -> Iterator[Any]:
+    """
+    Stream result documents, one page per round-trip: all of them, or those
+    created at or after `since` in created_at order.
+
+    A full export goes by document id, since ordering by created_at would
+    skip results written before the field existed.
+    """
+    db = get_firestore_client()
+    collection = db.collection(CALCULATION_RESULTS_COLLECTION)
+    if since is None:
+        query = collection.order_by("__name__")
+    else:
+        query = collection.where("created_at", ">=", since).order_by("created_at")
+
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.limit(page_size).stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def iter_archive_manifests(page_size: int) -> Iterator[Dict[str, Any]]:
+    """Every archive part manifest, one page per round-trip"""
+    db = get_firestore_client()
+    query = db.collection(RESULT_ARCHIVES_COLLECTION).order_by("__name__")
+
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.limit(page_size).stream())
+        for doc in docs:
+            yield doc.to_dict()
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def archived_since(since: datetime) -> bool:
+    """Whether any archived result was created at or after `since`"""
+    db = get_firestore_client()
+    archives_ref = db.collection(RESULT_ARCHIVES_COLLECTION)
+    # Parts archived before newest_created_at existed: performed_at <= created_at there
+    for field in ("newest_created_at", "newest"):
+        if any(True for _ in archives_ref.where(field, ">=", since).limit(1).stream()):
+            return True
+    return False
+
+
+def _created_at(data: Dict[str, Any]) -> Optional[datetime]:
+    """When a result reached the server (performed_at for results older than the field)"""
+    return _to_utc(data.get("created_at") or data.get("performed_at"))
+
+
+def export_cohort(
+    out_dir: str,
+    incremental: bool = False,
+    overwrite: bool = False,
+    page_size: int = 500,
+    chunk_rows: int = 10_000,
+    output_format: str = "auto"
+) -> Dict[str, Any]:
+    """
+    Export calculation results to columnar files.
+
+    In incremental mode only results newer than the previous run's watermark
+    are written (as new part files). Memory is bounded by page_size documents
+    (or one archived part) plus chunk_rows buffered rows per calculator, and
+    in a full export the archived ids.
+    """
+    writer_class = resolve_writer_class(output_format)
+    os.makedirs(out_dir, exist_ok=True)
+    watermark = read_watermark(out_dir)
+
+    if watermark and not incremental:
+        if not overwrite:
+            raise RuntimeError(f"{out_dir} already has an export; use --incremental or --overwrite")
+        for path in glob.glob(os.path.join(out_dir, "*", "part-*")):
+            os.remove(path)
+        watermark = None
+
+    since = None
+    seen_at_watermark = set()
+    run = 1
+    if watermark:
+        # Exports from before the watermark moved to created_at stored performed_at
+        since = datetime.fromisoformat(watermark.get("created_at") or watermark["performed_at"])
+        seen_at_watermark = set(watermark["ids_at_watermark"])
+        run = watermark["runs"] + 1
+        if archived_since(since):
+            raise RuntimeError(
+                f"Results newer than the watermark ({since.isoformat()}) have been archived; "
+                "run a full export with --overwrite"
+            )
+
+    writers: Dict[str, Any] = {}
+    columns_by_calculator: Dict[str, List[Tuple[str, str]]] = {}
+    buffers: Dict[str, List[Dict[str, Any]]] = {}
+    rows_by_calculator: Dict[str, int] = {}
+    last_created_at = since
+    ids_at_last = set(seen_at_watermark)
+
+    def flush(calculator_name: str):
+        rows = buffers.pop(calculator_name, None)
+        if not rows:
+            return
+        if calculator_name not in writers:
+            directory = os.path.join(out_dir, calculator_slug(calculator_name))
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{run:05d}.{writer_class.extension}")
+            writers[calculator_name] = writer_class(path, columns_by_calculator[calculator_name])
+        writers[calculator_name].write(rows)
+
+    def add(doc_id: str, data: Dict[str, Any]):
+        nonlocal last_created_at, ids_at_last
+        created_at = _created_at(data)
+        if created_at is None:
+            return
+        # Results sharing the watermark timestamp may already be exported
+        if since is not None and created_at == since and doc_id in seen_at_watermark:
+            return
+
+        calculator_name = data.get("calculator_name") or "unknown"
+        columns = columns_by_calculator.get(calculator_name)
+        if columns is None:
+            columns = columns_by_calculator[calculator_name] = calculator_columns(calculator_name)
+        buffer = buffers.setdefault(calculator_name, [])
+        buffer.append(flatten_result(doc_id, data, columns))
+        rows_by_calculator[calculator_name] = rows_by_calculator.get(calculator_name, 0) + 1
+        if len(buffer) >= chunk_rows:
+            flush(calculator_name)
+
+        # A full export does not read results in created_at order
+        if last_created_at is None or created_at > last_created_at:
+            last_created_at = created_at
+            ids_at_last = {doc_id}
+        elif created_at == last_created_at:
+            ids_at_last.add(doc_id)
+
+    archive_changed = False
+    try:
+        archived_ids = set()
+        archive_keys = set()
+        if since is None:
+            for manifest in iter_archive_manifests(page_size):
+                archive_keys.add(manifest["object_key"])
+                for result in result_archive.load_month(manifest):
+                    archived_ids.add(result["id"])
+                    add(result["id"], result)
+
+        for doc in iter_results(page_size, since):
+            if doc.id not in archived_ids:
+                add(doc.id, doc.to_dict())
+
+        # Results archived after their month was read would be missing
+        if since is None:
+            current_keys = {manifest["object_key"] for manifest in iter_archive_manifests(page_size)}
+            archive_changed = current_keys != archive_keys
+
+        for calculator_name in list(buffers):
+            flush(calculator_name)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    if archive_changed:
+        for path in glob.glob(os.path.join(out_dir, "*", f"part-{run:05d}*")):
+            os.remove(path)
+        raise RuntimeError("The archive job changed the archive during the export; run the export again")
+
+    total_rows = sum(rows_by_calculator.values())
+    if last_created_at is not None and (total_rows or watermark is None):
+        with open(os.path.join(out_dir, WATERMARK_FILE), "w") as f:
+            json.dump({
+                "created_at": last_created_at.isoformat(),
+                "ids_at_watermark": sorted(ids_at_last),
+                "runs": run,
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }, f, indent=2)
+
+    return {"rows": total_rows, "rows_by_calculator": rows_by_calculator, "format": writer_class.extension}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--incremental", action="store_true", help="only export results newer than the watermark")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing full export")
+    parser.add_argument("--page-size", type=int, default=500, help="documents per Firestore round-trip")
+    parser.add_argument("--chunk-rows", type=int, default=10_000, help="rows buffered per calculator before writing")
+    parser.add_argument("--format", choices=["auto", "parquet", "npz"], default="auto")
+    args = parser.parse_args(argv)
+
+    from app.core.firebase_auth import initialize_firebase
+    initialize_firebase()
+
+    summary = export_cohort(
+        args.out,
+        incremental=args.incremental,
+        overwrite=args.overwrite,
+        page_size=args.page_size,
+        chunk_rows=args.chunk_rows,
+        output_format=args.format,
+    )
+    print(f"✅ Exported {summary['rows']} results as {summary['format']} to {args.out}")
+    for calculator_name, rows in sorted(summary["rows_by_calculator"].items()):
+        print(f"  {calculator_name}: {rows}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Renal dose adjustment service
+Looks up creatinine-clearance-based dose adjustments from the local table in
+app/data/renal_dosing.json. Each drug's CrCl bands are held as sorted lower
+bounds, so a lookup is one dict hit plus a bisect.
+"""
+import bisect
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Optional, List, Dict, Any
+
+DOSING_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "renal_dosing.json")
+
+
+def normalize_drug_name(name: str) -> str:
+    return re.sub(r"\s+", " ", name.strip().lower())
+
+
+class DrugBands:
+    """Non-overlapping [min, max) CrCl bands of one drug"""
+
+    def __init__(self, drug: str, bands: List[Dict[str, Any]], indication: Optional[str] = None):
+        self.drug = drug
+        self.indication = indication
+        self.bands = sorted(bands, key=lambda band: band["min"])
+        self.lower_bounds = [band["min"] for band in self.bands]
+
+        for previous, band in zip(self.bands, self.bands[1:]):
+            if previous["max"] is None or previous["max"] > band["min"]:
+                raise ValueError(f"Overlapping CrCl bands for {drug}")
+
+    def find(self, crcl: float) -> Optional[Dict[str, Any]]:
+        """Band containing crcl, or None if the table has a gap there"""
+        position = bisect.bisect_right(self.lower_bounds, crcl) - 1
+        if position < 0:
+            return None
+        band = self.bands[position]
+        if band["max"] is not None and crcl >= band["max"]:
+            return None
+        return band
+
+
+class RenalDosingIndex:
+    """Drug name (or alias) -> CrCl band index"""
+
+    def __init__(self, drugs: List[Dict[str, Any]]):
+        self._drugs: Dict[str, DrugBands] = {}
+        self._names: Dict[str, str] = {}
+        for entry in drugs:
+            drug = normalize_drug_name(entry["drug"])
+            self._drugs[drug] = DrugBands(drug, entry["bands"], entry.get("indication"))
+            for name in [drug] + entry.get("aliases", []):
+                self._names[normalize_drug_name(name)] = drug
+
+    @classmethod
+    def load(cls, path: str = DOSING_TABLE_PATH) -> "RenalDosingIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["drugs"])
+
+    @property
+    def drugs(self) -> List[str]:
+        return sorted(self._drugs)
+
+    def resolve(self, medication: str) -> Optional[str]:
+        """
+        Map a medication entry to a drug in the table.
+        Entries like "Metformin 500 mg tablets" fall back to their first word.
+        """
+        name = normalize_drug_name(medication)
+        drug = self._names.get(name)
+        if drug is None and " " in name:
+            drug = self._names.get(name.split(" ", 1)[0])
+        return drug
+
+    def lookup(self, medication: str, crcl: float) -> Dict[str, Any]:
+        """Adjustment for one medication at the given CrCl (mL/min)"""
+        drug = self.resolve(medication)
+        if drug is None:
+            return {"medication": medication, "drug": None, "found": False}
+
+        bands = self._drugs[drug]
+        band = bands.find(crcl)
+        if band is None:
+            return {"medication": medication, "drug": drug, "found": False, "indication": bands.indication}
+
+        return {
+            "medication": medication,
+            "drug": drug,
+            "found": True,
+            "indication": bands.indication,
+            "crcl_min": band["min"],
+            "crcl_max": band["max"],
+            "action": band["action"],
+            "recommendation": band["recommendation"],
+        }
+
+    def lookup_many(self, medications: List[str], crcl: float) -> List[Dict[str, Any]]:
+        """Adjustments for a medication list, in request order"""
+        return [self.lookup(medication, crcl) for medication in medications]
+
+
+@lru_cache(maxsize=None)
+def get_dosing_index() -> RenalDosingIndex:
+    """Renal dosing index, built on first use"""
+    return RenalDosingIndex.load()
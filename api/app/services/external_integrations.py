@@ -1,13 +1,18 @@
 """
 External API integration services for medical data
 """
-import requests
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import logging
 
+from app.core.cache import CacheNamespace, hashed_key, shared_cache
+
 logger = logging.getLogger(__name__)
 
+# Lookup results shared by all workers (the upstream APIs are slow and metered)
+REFERENCE_RANGES_CACHE = CacheNamespace("reference_ranges", ttl_seconds=3600)
+ICD10_SEARCH_CACHE = CacheNamespace("icd10_search", ttl_seconds=3600)
+
 
 class MedicalDataService:
     """
@@ -60,6 +65,13 @@ class MedicalDataService:
             logger.error(f"Error fetching reference ranges: {e}")
             return None
     
+    async def get_reference_ranges_cached(self, test_name: str, age: int, gender: str) -> Optional[Dict[str, Any]]:
+        """get_reference_ranges through the shared cache (misses aren't cached)"""
+        key = hashed_key(test_name.lower(), age, gender.lower())
+        return await shared_cache.get_or_load(
+            REFERENCE_RANGES_CACHE, key, lambda: self.get_reference_ranges(test_name, age, gender)
+        )
+    
     def search_icd10_codes(self, query: str) -> List[Dict[str, str]]:
         """
         Search ICD-10 diagnostic codes
@@ -88,6 +100,12 @@ class MedicalDataService:
         except Exception as e:
             logger.error(f"Error searching ICD-10 codes: {e}")
             return []
+    
+    async def search_icd10_codes_cached(self, query: str) -> List[Dict[str, str]]:
+        """search_icd10_codes through the shared cache"""
+        return await shared_cache.get_or_load(
+            ICD10_SEARCH_CACHE, hashed_key(query.lower()), lambda: self.search_icd10_codes(query)
+        )
 
 
 class AnalyticsService:
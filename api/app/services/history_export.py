@@ -0,0 +1,174 @@
+"""
+Calculation history export
+Streams a user's calculation results as NDJSON or CSV, one Firestore cursor
+page at a time, so memory stays constant however long the history is.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+from app.core.archive import result_archive
+from app.core.calculators import get_input_fields, load_calculator_definitions
+from app.core.firestore import get_firestore_client, CALCULATION_RESULTS_COLLECTION
+
+PAGE_SIZE = 500
+
+BASE_COLUMNS = [
+    "id",
+    "performed_at",
+    "calculator_name",
+    "calculator_name_ru",
+    "result_value",
+    "interpretation",
+]
+
+# Catch-all CSV column for input_data keys without a column of their own;
+# outside the input_ prefix, so no input name (not even "other") can collide with it
+OTHER_INPUTS_COLUMN = "other_inputs"
+
+# Cells starting with these are formulas to spreadsheet apps
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC (Firestore stores UTC timestamps)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _format_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value: Any) -> Any:
+    """CSV cell for a value: empty for None, text that could run as a formula prefixed with '"""
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_user_results(
+    user_id: str,
+    calculator_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    page_size: int = PAGE_SIZE,
+    include_archive: bool = True
+) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Yield pages of (id, data) for a user's results, oldest first.
+
+    Archived months (app/core/archive.py) come first, then the hot
+    collection via the (user_id, performed_at) composite index from
+    firestore.indexes.json (plus calculator_name when filtering by calculator).
+    """
+    # A result being archived can briefly be in both places
+    archived_ids = set()
+    if include_archive:
+        archive_pages = result_archive.iter_pages(
+            user_id,
+            calculator_name=calculator_name,
+            since=_as_utc(since) if since is not None else None,
+            until=_as_utc(until) if until is not None else None,
+        )
+        for page in archive_pages:
+            archived_ids.update(result_id for result_id, _ in page)
+            yield page
+
+    db = get_firestore_client()
+    query = db.collection(CALCULATION_RESULTS_COLLECTION).where("user_id", "==", user_id)
+    if calculator_name:
+        query = query.where("calculator_name", "==", calculator_name)
+    if since is not None:
+        query = query.where("performed_at", ">=", _as_utc(since))
+    if until is not None:
+        query = query.where("performed_at", "<", _as_utc(until))
+    query = query.order_by("performed_at")
+
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.limit(page_size).stream())
+        rows = [(doc.id, doc.to_dict()) for doc in docs if doc.id not in archived_ids]
+        if rows:
+            yield rows
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+
+def csv_columns(calculator_name: Optional[str] = None) -> List[str]:
+    """CSV header: base columns, one column per known input field, then other_inputs"""
+    if calculator_name:
+        fields = get_input_fields(calculator_name)
+    else:
+        fields = [
+            field
+            for definition in load_calculator_definitions().values()
+            for field in definition["inputFields"]
+        ]
+
+    input_columns = []
+    for field in fields:
+        column = f"input_{field['name']}"
+        if column not in input_columns:
+            input_columns.append(column)
+    return BASE_COLUMNS + input_columns + [OTHER_INPUTS_COLUMN]
+
+
+def flatten_row(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Result document with input_data flattened into input_<name> keys"""
+    row = {"id": doc_id}
+    for column in BASE_COLUMNS[1:]:
+        row[column] = _format_value(data.get(column))
+    for name, value in (data.get("input_data") or {}).items():
+        row[f"input_{name}"] = _format_value(value)
+    return row
+
+
+def stream_ndjson(user_id: str, flatten: bool = True, **filters) -> Iterator[str]:
+    """NDJSON lines, one result per line"""
+    for page in iter_user_results(user_id, **filters):
+        lines = []
+        for doc_id, data in page:
+            if flatten:
+                row = flatten_row(doc_id, data)
+            else:
+                row = {"id": doc_id}
+                for column in BASE_COLUMNS[1:] + ["input_data"]:
+                    row[column] = _format_value(data.get(column))
+            lines.append(json.dumps(row, ensure_ascii=False, default=str))
+        yield "\n".join(lines) + "\n"
+
+
+def stream_csv(user_id: str, **filters) -> Iterator[str]:
+    """CSV with a header row; starts with a BOM so spreadsheets detect UTF-8"""
+    columns = csv_columns(filters.get("calculator_name"))
+    known = set(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([_csv_cell(column) for column in columns])
+    yield "\ufeff" + buffer.getvalue()
+
+    for page in iter_user_results(user_id, **filters):
+        buffer.seek(0)
+        buffer.truncate()
+        for doc_id, data in page:
+            row = flatten_row(doc_id, data)
+            other = {
+                key[len("input_"):]: value
+                for key, value in row.items()
+                if key not in known
+            }
+            if other:
+                row[OTHER_INPUTS_COLUMN] = json.dumps(other, ensure_ascii=False, default=str)
+            writer.writerow([_csv_cell(row.get(column)) for column in columns])
+        yield buffer.getvalue()
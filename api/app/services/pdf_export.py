@@ -11,8 +11,14 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from io import BytesIO
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Any, Optional
 
+from app.core.cache import CacheNamespace
+
+# Rendered PDFs by (result id, user name); results don't change once saved
+RESULT_PDF_CACHE = CacheNamespace("result_pdfs", ttl_seconds=24 * 3600)
+
 
 class PDFExporter:
     """PDF export service for calculation results"""
@@ -180,5 +186,7 @@ class PDFExporter:
         return buffer
 
 
-# Initialize singleton
-pdf_exporter = PDFExporter()
+@lru_cache(maxsize=None)
+def get_pdf_exporter() -> PDFExporter:
+    """Get the shared exporter (style sheet is built on first use)"""
+    return PDFExporter()
@@ -0,0 +1,193 @@
+"""
+Calculation result time series
+Per-user, per-calculator result_value series for trend charts, downsampled
+with Largest-Triangle-Three-Buckets (LTTB) or rolled up into daily/weekly
+min/max/mean buckets. Series and rollups are cached per worker and dropped
+when the user saves a new result.
+"""
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
+
+from app.core.config import settings
+
+DAY_SECONDS = 86400
+WEEK_SECONDS = 7 * DAY_SECONDS
+# 1970-01-01 was a Thursday; weeks start on Monday 1970-01-05
+WEEK_OFFSET = 4 * DAY_SECONDS
+
+ROLLUP_BUCKETS = {"day": DAY_SECONDS, "week": WEEK_SECONDS}
+
+
+def lttb(times: List[float], values: List[float], threshold: int) -> List[int]:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Always keeps the first and last point; in between picks, per bucket, the
+    point forming the largest triangle with the previous pick and the next
+    bucket's average, which preserves peaks and troughs.
+    """
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(times[avg_start:avg_end]) / avg_count
+        avg_y = sum(values[avg_start:avg_end]) / avg_count
+
+        ax, ay = times[a], values[a]
+        max_area = -1.0
+        next_a = start = int(i * every) + 1
+        for j in range(start, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - times[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        selected.append(next_a)
+        a = next_a
+
+    selected.append(n - 1)
+    return selected
+
+
+def rollup(times: List[float], values: List[float], bucket: str) -> List[Dict[str, Any]]:
+    """Aggregate time-sorted points into daily or weekly (Monday, UTC) buckets"""
+    width = ROLLUP_BUCKETS[bucket]
+    offset = WEEK_OFFSET if bucket == "week" else 0
+    rollups: List[Dict[str, Any]] = []
+    current = None
+    for t, value in zip(times, values):
+        start = (t - offset) // width * width + offset
+        if current is None or current["_start"] != start:
+            current = {"_start": start, "count": 0, "min": value, "max": value, "sum": 0.0}
+            rollups.append(current)
+        current["count"] += 1
+        current["sum"] += value
+        if value < current["min"]:
+            current["min"] = value
+        if value > current["max"]:
+            current["max"] = value
+
+    return [
+        {
+            "start": datetime.fromtimestamp(item["_start"], tz=timezone.utc),
+            "count": item["count"],
+            "min": item["min"],
+            "max": item["max"],
+            "mean": item["sum"] / item["count"],
+        }
+        for item in rollups
+    ]
+
+
+class Series:
+    """Time-sorted points of one user's results for one calculator"""
+
+    def __init__(self, times: List[float], values: List[float]):
+        self.times = times
+        self.values = values
+        self._rollups: Dict[str, List[Dict[str, Any]]] = {}
+
+    def window(self, since: Optional[datetime], until: Optional[datetime]) -> Tuple[List[float], List[float]]:
+        lo = 0 if since is None else bisect.bisect_left(self.times, _timestamp(since))
+        hi = len(self.times) if until is None else bisect.bisect_left(self.times, _timestamp(until))
+        return self.times[lo:hi], self.values[lo:hi]
+
+    def rollup(self, bucket: str) -> List[Dict[str, Any]]:
+        """Rollups over the whole series, computed once per cached series"""
+        if bucket not in self._rollups:
+            self._rollups[bucket] = rollup(self.times, self.values, bucket)
+        return self._rollups[bucket]
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def load_series(user_id: str, calculator_name: str) -> Series:
+    """Read a user's results for one calculator from Firestore (blocking)"""
+    from app.services.history_export import iter_user_results
+
+    times: List[float] = []
+    values: List[float] = []
+    for page in iter_user_results(user_id, calculator_name=calculator_name):
+        for _, data in page:
+            performed_at = data.get("performed_at")
+            value = data.get("result_value")
+            if not isinstance(performed_at, datetime) or not isinstance(value, (int, float)):
+                continue
+            times.append(_timestamp(performed_at))
+            values.append(float(value))
+    return Series(times, values)
+
+
+class SeriesCache:
+    """
+    Bounded per-worker cache of Series keyed by (user_id, calculator_name).
+
+    Concurrent misses for the same key share one Firestore scan. Writes call
+    invalidate(); entries also expire after SERIES_CACHE_TTL_SECONDS so
+    writes handled by other workers show up eventually.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (loaded at, series)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Series]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Bumped on invalidate so a scan started before a write isn't cached
+        self._generations: Dict[Tuple[str, str], int] = {}
+
+    async def get(self, user_id: str, calculator_name: str) -> Series:
+        key = (user_id, calculator_name)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        generation = self._generations.get(key, 0)
+        try:
+            series = await asyncio.to_thread(load_series, user_id, calculator_name)
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic(), series)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            future.set_result(series)
+            return series
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting on this future - don't log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def invalidate(self, user_id: str, calculator_name: str):
+        key = (user_id, calculator_name)
+        self._entries.pop(key, None)
+        if key in self._generations or key in self._in_flight:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        while len(self._generations) > self.max_entries:
+            self._generations.pop(next(iter(self._generations)))
+
+
+series_cache = SeriesCache(settings.SERIES_CACHE_SIZE, settings.SERIES_CACHE_TTL_SECONDS)
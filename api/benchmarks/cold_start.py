@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark
+Starts fresh interpreters and measures import time, lifespan startup,
+time to first /health response and RSS at boot. Also reports which heavy
+modules (ReportLab, firebase_admin, requests, ...) were loaded by then.
+
+Usage (from the api directory):
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --assert-lazy   # exit 1 if heavy modules load at boot
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Dict, Any
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["reportlab", "firebase_admin", "google.cloud.firestore", "grpc", "requests"]
+
+# Runs in a fresh interpreter; prints one JSON line
+CHILD_SCRIPT = """
+import time
+started = time.perf_counter()
+
+import asyncio, json, sys
+import main
+imported = time.perf_counter()
+
+from benchmarks.load_test import ASGIClient, current_rss_mb
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        status_code, _ = await ASGIClient(main.app).request("GET", "/health")
+        first_response = time.perf_counter()
+        return ready, first_response, status_code
+
+ready, first_response, status_code = asyncio.run(boot())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_response_ms": (first_response - started) * 1000,
+    "status": status_code,
+    "rss_mb": current_rss_mb(),
+    "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+}))
+"""
+
+
+def run_once(env: Dict[str, str]) -> Dict[str, Any]:
+    script = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + CHILD_SCRIPT
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        cwd=API_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreter starts")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--assert-lazy", action="store_true",
+                        help="exit 1 if any heavy module is loaded before the first /health response")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("FIRESTORE_BACKEND", "memory")
+    env.setdefault("AUTH_BACKEND", "fake")
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    summary = {
+        key: statistics.median(r[key] for r in runs)
+        for key in ("import_ms", "startup_ms", "first_response_ms", "rss_mb")
+    }
+    heavy = sorted({m for r in runs for m in r["heavy_modules"]})
+
+    print(f"runs:               {args.runs}")
+    print(f"import:             {summary['import_ms']:.1f} ms (median)")
+    print(f"lifespan startup:   {summary['startup_ms']:.1f} ms")
+    print(f"first /health:      {summary['first_response_ms']:.1f} ms after interpreter start")
+    print(f"RSS at boot:        {summary['rss_mb']:.1f} MB")
+    print(f"heavy modules:      {', '.join(heavy) or 'none'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "heavy_modules": heavy, "runs": runs}, f, indent=2)
+
+    if any(r["status"] != 200 for r in runs):
+        print("❌ /health did not return 200")
+        return 1
+    if args.assert_lazy and heavy:
+        print("❌ Heavy modules were imported before the first response")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+End-to-end load test for the /api/v1 routes
+Runs the FastAPI app in-process against the local Firestore and auth
+stand-ins, drives every route at a configurable concurrency and reports
+RPS, p50/p95/p99 latency and memory. The event stream never ends, so its
+latency is the time to the first frame (subscribe plus headers), after
+which the client disconnects.
+
+Usage (from the api directory):
+    python -m benchmarks.load_test --concurrency 32 --requests 2000
+    python -m benchmarks.load_test --json results.json
+    python -m benchmarks.load_test --baseline results.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import sys
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+# Local stand-ins must be selected before the app (and its settings) is imported
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+os.environ.setdefault("AUTH_BACKEND", "fake")
+# Measure raw throughput; set RATE_LIMIT_ENABLED=true to include admission control
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# GET /usage/calculations is for usage admins only
+LOAD_TEST_ADMIN = "loadtest-user-0"
+os.environ.setdefault("USAGE_ADMIN_EMAILS", f'["{LOAD_TEST_ADMIN}@example.com"]')
+# Batches write many results: to a user of their own, so other users' histories keep their size
+LOAD_TEST_BATCH_USER = "loadtest-batch-user"
+
+from main import app  # noqa: E402
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client that calls the ASGI app directly"""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        token: Optional[str] = None,
+        json_body: Optional[Dict[str, Any]] = None,
+        first_chunk_only: bool = False
+    ) -> Tuple[int, bytes]:
+        path, _, query = path.partition("?")
+        headers = [(b"host", b"loadtest")]
+        body = b""
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers.append((b"content-type", b"application/json"))
+            headers.append((b"content-length", str(len(body)).encode()))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("loadtest", 80),
+        }
+
+        response_done = asyncio.Event()
+        request_sent = False
+        status_code = 500
+        chunks: List[bytes] = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                # Streams: disconnect once the first frame arrives
+                if not message.get("more_body", False) or (first_chunk_only and message.get("body")):
+                    response_done.set()
+
+        await self.app(scope, receive, send)
+        response_done.set()
+        return status_code, b"".join(chunks)
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Fall back to peak RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def seed(client: ASGIClient, users: int) -> Dict[str, List[str]]:
+    """Create one calculation result per virtual user and return their ids"""
+    result_ids = {}
+    for n in range(users):
+        token = f"fake:loadtest-user-{n}"
+        status_code, body = await client.request(
+            "POST", "/api/v1/calculation_results", token, SAMPLE_RESULT
+        )
+        if status_code != 201:
+            raise RuntimeError(f"Seeding failed with status {status_code}: {body[:200]!r}")
+        result_ids[token] = [json.loads(body)["id"]]
+    return result_ids
+
+
+SAMPLE_RESULT = {
+    "calculator_name": "Cockcroft-Gault Creatinine Clearance",
+    "calculator_name_ru": "Клиренс креатинина (Cockcroft-Gault)",
+    "input_data": {"age": 65, "weight": 72.5, "creatinine": 1.2, "sex": "male"},
+    "result_value": 62.09,
+    "interpretation": "Mild reduction in kidney function (CKD Stage 2)",
+}
+
+
+# Unique idempotency keys, so batches are created rather than replayed
+_batch_keys = itertools.count()
+
+
+def batch_body(size: int = 20) -> Dict[str, Any]:
+    """An outbox flush of `size` new results"""
+    return {"items": [dict(SAMPLE_RESULT, idempotency_key=f"load-{next(_batch_keys)}") for _ in range(size)]}
+
+
+def build_scenarios() -> List[Dict[str, Any]]:
+    """
+    One scenario per /api/v1 route: (name, method, path template, body or
+    make_body, optional fixed token, stream)
+    """
+    return [
+        {"name": "GET /health", "method": "GET", "path": "/api/v1/health"},
+        {"name": "GET /calculation_results", "method": "GET", "path": "/api/v1/calculation_results"},
+        {"name": "POST /calculation_results", "method": "POST", "path": "/api/v1/calculation_results",
+         "body": SAMPLE_RESULT},
+        {"name": "GET /calculation_results/stream", "method": "GET",
+         "path": "/api/v1/calculation_results/stream", "stream": True},
+        {"name": "GET /calculation_results/series", "method": "GET",
+         "path": "/api/v1/calculation_results/series?calculator=Cockcroft-Gault%20Creatinine%20Clearance"},
+        {"name": "GET /calculation_results/export.ndjson", "method": "GET",
+         "path": "/api/v1/calculation_results/export.ndjson"},
+        {"name": "GET /calculation_results/export.csv", "method": "GET",
+         "path": "/api/v1/calculation_results/export.csv"},
+        {"name": "GET /calculation_results/{id}", "method": "GET",
+         "path": "/api/v1/calculation_results/{result_id}"},
+        {"name": "GET /calculation_results/{id}/export", "method": "GET",
+         "path": "/api/v1/calculation_results/{result_id}/export"},
+        {"name": "GET /profiles/me", "method": "GET", "path": "/api/v1/profiles/me"},
+        {"name": "PATCH /profiles/me", "method": "PATCH", "path": "/api/v1/profiles/me",
+         "body": {"name": "Load Test"}},
+        {"name": "POST /integrations/reference-ranges", "method": "POST",
+         "path": "/api/v1/integrations/reference-ranges",
+         "body": {"test_name": "glucose", "age": 50, "gender": "female"}},
+        {"name": "GET /integrations/icd10/search", "method": "GET",
+         "path": "/api/v1/integrations/icd10/search?q=obesity"},
+        {"name": "POST /dose_adjustments", "method": "POST", "path": "/api/v1/dose_adjustments",
+         "body": {"crcl": 42, "medications": ["metformin", "Gabapentin 300 mg", "apixaban"] * 8}},
+        {"name": "GET /dose_adjustments/drugs", "method": "GET", "path": "/api/v1/dose_adjustments/drugs"},
+        {"name": "GET /usage/calculations", "method": "GET", "path": "/api/v1/usage/calculations",
+         "token": f"fake:{LOAD_TEST_ADMIN}"},
+        # Last: the local Firestore scans whole collections, so its thousands
+        # of writes would slow the queries of every route measured after it
+        {"name": "POST /calculation_results/batch", "method": "POST",
+         "path": "/api/v1/calculation_results/batch", "make_body": batch_body,
+         "token": f"fake:{LOAD_TEST_BATCH_USER}"},
+    ]
+
+
+async def run_scenario(
+    client: ASGIClient,
+    scenario: Dict[str, Any],
+    result_ids: Dict[str, List[str]],
+    concurrency: int,
+    total_requests: int
+) -> Dict[str, Any]:
+    """Drive one route with `concurrency` workers until `total_requests` complete"""
+    tokens = list(result_ids)
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    rss_before = current_rss_mb()
+
+    async def worker(worker_id: int):
+        nonlocal issued, errors
+        while issued < total_requests:
+            n = issued
+            issued += 1
+            token = scenario.get("token") or tokens[(worker_id + n) % len(tokens)]
+            path = scenario["path"].format(result_id=result_ids[token][0]) if token in result_ids else scenario["path"]
+            body = scenario["make_body"]() if "make_body" in scenario else scenario.get("body")
+            started = time.perf_counter()
+            status_code, _ = await client.request(
+                scenario["method"], path, token, body, first_chunk_only=scenario.get("stream", False)
+            )
+            latencies.append(time.perf_counter() - started)
+            if status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    rss_after = current_rss_mb()
+    return {
+        "route": scenario["name"],
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rss_mb": rss_after,
+        "rss_delta_mb": rss_after - rss_before,
+    }
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print results as an aligned table"""
+    header = f"{'route':<42} {'reqs':>6} {'err':>5} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['route']:<42} {r['requests']:>6} {r['errors']:>5} {r['rps']:>9.1f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rss_mb']:>8.1f}"
+        )
+
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline_path: str, max_regression: float) -> List[str]:
+    """Return a description of every route that regressed beyond the threshold"""
+    with open(baseline_path) as f:
+        baseline = {r["route"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        base = baseline.get(r["route"])
+        if base is None:
+            continue
+        if base["rps"] and r["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"{r['route']}: rps {base['rps']:.1f} -> {r['rps']:.1f}")
+        if base["p95_ms"] and r["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{r['route']}: p95 {base['p95_ms']:.2f}ms -> {r['p95_ms']:.2f}ms")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    client = ASGIClient(app)
+    scenarios = [
+        s for s in build_scenarios()
+        if not args.routes or any(pattern in s["name"] for pattern in args.routes)
+    ]
+
+    async with app.router.lifespan_context(app):
+        result_ids = await seed(client, args.users)
+
+        # Warm up caches, imports and the PDF stack before measuring
+        for scenario in scenarios:
+            await run_scenario(client, scenario, result_ids, 1, min(5, args.requests))
+
+        results = []
+        for scenario in scenarios:
+            results.append(await run_scenario(client, scenario, result_ids, args.concurrency, args.requests))
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "users": args.users,
+                "results": results,
+            }, f, indent=2)
+
+    if any(r["errors"] for r in results):
+        print("\n❌ Some requests failed")
+        return 1
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.max_regression:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.max_regression:.0%}")
+
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent in-flight requests per route")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--users", type=int, default=20, help="number of distinct virtual users")
+    parser.add_argument("--routes", nargs="*", help="only run routes whose name contains one of these strings")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against (exit 1 on regression)")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed fractional drop in RPS / rise in p95 (default 0.10)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -2,12 +2,22 @@
 FastAPI Medical Calculator Backend
 Main application entry point
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 
+from app.core.cache import shared_cache
 from app.core.config import settings
-from app.core.firebase_auth import initialize_firebase
+from app.core.counters import usage_counters
+from app.core.events import result_events
+from app.core.firebase_auth import initialize_firebase, firebase_status
+from app.core.firestore import RequestCacheMiddleware, result_write_buffer
+from app.core.metrics import MetricsMiddleware, render_metrics, shared_metrics
+from app.core.rate_limit import ConcurrencyLimitMiddleware
+from app.core.validation import BodySizeLimitMiddleware
 from app.api.v1 import api_router
 
 
@@ -15,9 +25,20 @@ from app.api.v1 import api_router
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
-    initialize_firebase()  # Initialize Firebase Admin SDK with service account
+    app.state.draining = False
+    if not settings.FIREBASE_LAZY_INIT:
+        initialize_firebase()  # Initialize Firebase Admin SDK with service account
+    await result_events.start()
+    await usage_counters.start()
+    shared_metrics.start()
     yield
-    # Shutdown - nothing to cleanup
+    # Shutdown (draining is set earlier, on SIGTERM - see app/core/server.py)
+    # Commit buffered writes before their callers' events are published
+    await result_write_buffer.flush()
+    await usage_counters.stop()
+    await result_events.stop()
+    await shared_cache.close()
+    shared_metrics.stop()
 
 
 app = FastAPI(
@@ -27,7 +48,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Configure CORS
+# Per-request Firestore document cache (see DocumentLoader)
+app.add_middleware(RequestCacheMiddleware)
+
+# Reject oversized request bodies before they are read into memory
+app.add_middleware(BodySizeLimitMiddleware)
+
+# Global concurrency cap: shed load with 503 + Retry-After
+app.add_middleware(ConcurrencyLimitMiddleware)
+
+# Configure CORS (outside the limits above, so their 413/503 responses carry
+# CORS headers and browsers can read them; preflights skip the limits)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS,
@@ -36,10 +67,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms and phase breakdown (outermost, times everything)
+app.add_middleware(MetricsMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """422 without echoing the rejected input back (it can be large, or NaN which JSON can't encode)"""
+    errors = [{key: value for key, value in error.items() if key != "input"} for error in exc.errors()]
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": jsonable_encoder(errors)}
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -52,11 +96,52 @@ async def health():
     return {"status": "healthy"}
 
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+@app.get("/ready")
+async def ready():
+    """Readiness probe: ready once Firebase is initialized and until SIGTERM (under gunicorn)"""
+    draining = getattr(app.state, "draining", True)
+    # With lazy init Firebase comes up on first use, so only a failed init blocks readiness
+    firebase_ok = firebase_status["initialized"] or (
+        settings.FIREBASE_LAZY_INIT and firebase_status["error"] is None
+    )
+    is_ready = firebase_ok and not draining
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "not_ready",
+            "draining": draining,
+            # Not the error text: this endpoint is unauthenticated
+            "firebase": "initialized" if firebase_status["initialized"] else (
+                "failed" if firebase_status["error"] else "pending"
+            ),
+        }
     )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics endpoint (all workers' metrics under the multi-worker server)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Medical Calculator API server")
+    parser.add_argument("--prod", action="store_true", help="multi-worker production server (no reload)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: SERVER_WORKERS or CPU count)")
+    parser.add_argument("--host", help="bind host (default: SERVER_HOST)")
+    parser.add_argument("--port", type=int, help="bind port (default: SERVER_PORT)")
+    args = parser.parse_args()
+    
+    if args.prod:
+        from app.core.server import run_production
+        run_production(host=args.host, port=args.port, workers=args.workers)
+    else:
+        import uvicorn
+        uvicorn.run(
+            "main:app",
+            host=args.host or "0.0.0.0",
+            port=args.port or 8000,
+            reload=True
+        )
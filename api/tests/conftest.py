@@ -0,0 +1,40 @@
+"""
+Test setup: the in-memory Firestore and fake auth stand-ins, selected before
+the app is imported (settings are read at import time).
+
+Run from the api directory: python -m pytest tests
+"""
+import os
+
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+os.environ.setdefault("AUTH_BACKEND", "fake")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("CACHE_BACKEND", "local")
+
+import pytest
+
+from app.core.cache import LocalLRU, shared_cache
+from app.core.config import settings
+from app.core.local_firestore import get_client
+
+
+@pytest.fixture(autouse=True)
+def memory_firestore(monkeypatch):
+    """A clean in-memory database (and per-worker cache) for every test"""
+    get_client().reset()
+    monkeypatch.setattr(shared_cache, "local", LocalLRU(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_MAX_BYTES))
+    yield get_client()
+    get_client().reset()
+
+
+@pytest.fixture
+def client():
+    """The API in-process (lifespan not run: no background tasks)"""
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+def auth(uid: str = "alice") -> dict:
+    """Headers for the fake auth backend ("fake:<uid>" tokens)"""
+    return {"Authorization": f"Bearer fake:{uid}"}
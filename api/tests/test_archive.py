@@ -0,0 +1,222 @@
+"""
+Archive job (app/services/archive.py), the archive fallbacks of the read
+paths and the cohort export, against the in-memory Firestore and
+LocalObjectStore.
+"""
+import asyncio
+import glob
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.archive import result_archive
+from app.core.config import settings
+from app.core.firestore import (
+    CALCULATION_RESULTS_COLLECTION,
+    RESULT_ARCHIVES_COLLECTION,
+    USERS_COLLECTION,
+    FirestoreCalculationResult,
+)
+from app.services import archive as archive_job
+from app.services import cohort_export
+from app.services.cohort_export import export_cohort
+from app.services.history_export import iter_user_results
+
+OLD_MONTH = datetime(2020, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setattr(result_archive, "_store", None)
+    return tmp_path
+
+
+@pytest.fixture
+def user_id(memory_firestore):
+    # Unique per test: decoded blobs are cached by object key
+    user_id = f"user-{uuid.uuid4().hex[:8]}"
+    memory_firestore.collection(USERS_COLLECTION).document(user_id).set({"email": f"{user_id}@example.com"})
+    return user_id
+
+
+def add_result(db, user_id, result_id, performed_at, value=1.0):
+    db.collection(CALCULATION_RESULTS_COLLECTION).document(result_id).set({
+        "user_id": user_id,
+        "calculator_name": "Cockcroft-Gault Creatinine Clearance",
+        "input_data": {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male"},
+        "result_value": value,
+        "interpretation": None,
+        "performed_at": performed_at,
+        "idempotency": {"fingerprint": "x"},
+    })
+
+
+def hot_ids(db, user_id):
+    query = db.collection(CALCULATION_RESULTS_COLLECTION).where("user_id", "==", user_id)
+    return {doc.id for doc in query.stream()}
+
+
+def exported_ids(user_id):
+    return [result_id for page in iter_user_results(user_id) for result_id, _ in page]
+
+
+def seed(db, user_id, old=6, recent=2):
+    """`old` results spread over two archivable months, `recent` ones from yesterday"""
+    for i in range(old):
+        add_result(db, user_id, f"old-{i}", OLD_MONTH + timedelta(days=20 * i // old * 2, hours=i), value=i)
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    for i in range(recent):
+        add_result(db, user_id, f"new-{i}", yesterday + timedelta(minutes=i), value=100 + i)
+
+
+def test_archives_old_months_and_reads_fall_back(memory_firestore, archive_dir, user_id):
+    seed(memory_firestore, user_id)
+
+    summary = archive_job.archive_results(365, user_id=user_id)
+
+    assert summary["results"] == 6 and summary["months"] == 2
+    assert hot_ids(memory_firestore, user_id) == {"new-0", "new-1"}
+    user = memory_firestore.collection(USERS_COLLECTION).document(user_id).get().to_dict()
+    assert user["has_archive"] is True
+
+    results = asyncio.run(FirestoreCalculationResult.get_by_user(user_id, limit=5))
+    assert [r["id"] for r in results] == ["new-1", "new-0", "old-5", "old-4", "old-3"]
+
+    archived = asyncio.run(FirestoreCalculationResult.get_by_id("old-2", user_id))
+    assert archived["result_value"] == 2 and "idempotency" not in archived
+    assert asyncio.run(FirestoreCalculationResult.get_by_id("old-2", "someone-else")) is None
+
+    assert exported_ids(user_id) == [f"old-{i}" for i in range(6)] + ["new-0", "new-1"]
+
+
+def test_rerun_merges_late_results_into_a_new_generation(memory_firestore, archive_dir, user_id):
+    seed(memory_firestore, user_id)
+    archive_job.archive_results(365, user_id=user_id)
+
+    assert archive_job.archive_results(365, user_id=user_id)["results"] == 0
+
+    # A result for an archived month that reached the hot collection late
+    add_result(memory_firestore, user_id, "late", OLD_MONTH + timedelta(days=1))
+    old_keys = {m["object_key"] for m in result_archive.month_manifests(user_id, "2020-03")}
+
+    assert archive_job.archive_results(365, user_id=user_id)["results"] == 1
+
+    manifests = result_archive.month_manifests(user_id, "2020-03")
+    assert {m["generation"] for m in manifests} == {2}
+    for key in old_keys:
+        assert result_archive.store.get(key) is None
+    ids = exported_ids(user_id)
+    assert "late" in ids and len(ids) == len(set(ids)) == 9
+    assert asyncio.run(FirestoreCalculationResult.get_by_id("late", user_id))["id"] == "late"
+
+
+def test_interrupted_run_is_deduplicated_and_resumed(memory_firestore, archive_dir, user_id, monkeypatch):
+    seed(memory_firestore, user_id)
+
+    # Manifests committed, hot documents not yet deleted
+    def interrupt(user_id):
+        raise RuntimeError("interrupted")
+    with monkeypatch.context() as patch:
+        patch.setattr(archive_job, "flag_user_archived", interrupt)
+        with pytest.raises(RuntimeError):
+            archive_job.archive_results(365, user_id=user_id)
+    memory_firestore.collection(USERS_COLLECTION).document(user_id).set({"has_archive": True}, merge=True)
+    assert "old-0" in hot_ids(memory_firestore, user_id)
+
+    results = asyncio.run(FirestoreCalculationResult.get_by_user(user_id, limit=100))
+    assert len(results) == len({r["id"] for r in results}) == 8
+    ids = exported_ids(user_id)
+    assert len(ids) == len(set(ids)) == 8
+
+    summary = archive_job.archive_results(365, user_id=user_id)
+
+    assert summary["results"] == 6
+    assert hot_ids(memory_firestore, user_id) == {"new-0", "new-1"}
+    assert exported_ids(user_id) == [f"old-{i}" for i in range(6)] + ["new-0", "new-1"]
+    # The first attempt's blobs were replaced and removed
+    blobs = [name for _, _, names in os.walk(archive_dir) for name in names]
+    assert len(blobs) == len(result_archive.manifests(user_id))
+
+
+def test_large_months_are_split_into_parts(memory_firestore, archive_dir, user_id, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_PART_MAX_RESULTS", 3)
+    for i in range(10):
+        add_result(memory_firestore, user_id, f"r-{i:02d}", OLD_MONTH + timedelta(hours=i), value=i)
+
+    archive_job.archive_results(365, user_id=user_id)
+
+    manifests = result_archive.month_manifests(user_id, "2020-03")
+    assert [m["part"] for m in manifests] == [0, 1, 2, 3]
+    assert [len(m["ids"]) for m in manifests] == [3, 3, 3, 1]
+    assert asyncio.run(FirestoreCalculationResult.get_by_id("r-07", user_id))["result_value"] == 7
+    results = asyncio.run(FirestoreCalculationResult.get_by_user(user_id, limit=4))
+    assert [r["id"] for r in results] == ["r-09", "r-08", "r-07", "r-06"]
+
+    # Fewer, larger parts on the next generation: stale part manifests go away
+    monkeypatch.setattr(settings, "ARCHIVE_PART_MAX_RESULTS", 6)
+    add_result(memory_firestore, user_id, "r-10", OLD_MONTH + timedelta(hours=10), value=10)
+    archive_job.archive_results(365, user_id=user_id)
+
+    manifests = result_archive.month_manifests(user_id, "2020-03")
+    assert [len(m["ids"]) for m in manifests] == [6, 5]
+    assert len(list(memory_firestore.collection(RESULT_ARCHIVES_COLLECTION).stream())) == 2
+    assert exported_ids(user_id) == [f"r-{i:02d}" for i in range(11)]
+
+
+def cohort_ids(out_dir):
+    pq = pytest.importorskip("pyarrow.parquet")
+    ids = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "*", "part-*.parquet"))):
+        ids.extend(pq.read_table(path).column("id").to_pylist())
+    return ids
+
+
+def test_full_cohort_export_includes_archived_results(memory_firestore, archive_dir, user_id, tmp_path, monkeypatch):
+    seed(memory_firestore, user_id)
+    with monkeypatch.context() as patch:
+        patch.setattr(archive_job, "flag_user_archived", lambda user_id: None)
+        archive_job.archive_results(365, user_id=user_id)
+    # Interrupted before the hot deletes of the second month
+    add_result(memory_firestore, user_id, "old-5", OLD_MONTH + timedelta(days=25))
+
+    out_dir = str(tmp_path / "cohort")
+    summary = export_cohort(out_dir, output_format="parquet")
+
+    ids = cohort_ids(out_dir)
+    assert summary["rows"] == len(ids) == len(set(ids)) == 8
+    assert set(ids) == {f"old-{i}" for i in range(6)} | {"new-0", "new-1"}
+    with open(os.path.join(out_dir, "_watermark.json")) as f:
+        assert json.load(f)["ids_at_watermark"] == ["new-1"]
+
+
+def test_cohort_export_fails_when_the_archive_changes(memory_firestore, archive_dir, user_id, tmp_path, monkeypatch):
+    seed(memory_firestore, user_id)
+    iter_results = cohort_export.iter_results
+
+    def archive_during_export(page_size, since=None):
+        archive_job.archive_results(365, user_id=user_id)
+        return iter_results(page_size, since)
+    monkeypatch.setattr(cohort_export, "iter_results", archive_during_export)
+
+    out_dir = str(tmp_path / "cohort")
+    with pytest.raises(RuntimeError, match="archive"):
+        export_cohort(out_dir, output_format="parquet")
+    assert cohort_ids(out_dir) == []
+
+
+def test_incremental_cohort_export_refuses_archived_results(memory_firestore, archive_dir, user_id, tmp_path):
+    seed(memory_firestore, user_id, recent=0)
+    out_dir = str(tmp_path / "cohort")
+    export_cohort(out_dir, output_format="parquet")
+
+    # Older than ARCHIVE_AFTER_DAYS but newer than the watermark
+    add_result(memory_firestore, user_id, "late", datetime(2021, 1, 1, tzinfo=timezone.utc))
+    archive_job.archive_results(365, user_id=user_id)
+
+    with pytest.raises(RuntimeError, match="full export"):
+        export_cohort(out_dir, incremental=True, output_format="parquet")
+    assert export_cohort(out_dir, overwrite=True, output_format="parquet")["rows"] == 7
@@ -0,0 +1,138 @@
+"""
+Two-tier cache (app/core/cache.py): LRU bounds, TTLs, shared loads and the
+SQLite file checks.
+"""
+import asyncio
+import os
+import stat
+import threading
+
+import pytest
+
+from app.core import cache
+from app.core.cache import CacheNamespace, LocalLRU, SQLiteCacheBackend, TwoTierCache, private_sqlite_path
+from app.core.config import settings
+
+NAMESPACE = CacheNamespace("test", ttl_seconds=60)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used_entries():
+    lru = LocalLRU(max_entries=2, max_bytes=1000)
+    lru.set("a", b"1", 60)
+    lru.set("b", b"2", 60)
+    lru.get("a")
+    lru.set("c", b"3", 60)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1" and lru.get("c") == b"3"
+
+
+def test_lru_is_bounded_by_bytes():
+    lru = LocalLRU(max_entries=100, max_bytes=10)
+    lru.set("a", b"x" * 4, 60)
+    lru.set("b", b"x" * 4, 60)
+    lru.set("c", b"x" * 4, 60)
+
+    assert lru.get("a") is None and lru.size_bytes == 8
+    # Replacing a key doesn't count it twice; larger than the whole tier is not kept
+    lru.set("c", b"x" * 2, 60)
+    assert lru.size_bytes == 6
+    lru.set("d", b"x" * 11, 60)
+    assert lru.get("d") is None and lru.size_bytes == 6
+
+
+def test_entries_expire(clock):
+    lru = LocalLRU(max_entries=10, max_bytes=1000)
+    lru.set("a", b"1", 5)
+
+    clock[0] += 4.9
+    assert lru.get("a") == b"1"
+    clock[0] += 0.1
+    assert lru.get("a") is None and lru.size_bytes == 0
+
+
+def test_concurrent_misses_share_one_load():
+    shared = TwoTierCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 1}
+
+    async def scenario():
+        values = await asyncio.gather(*(shared.get_or_load(NAMESPACE, "k", loader) for _ in range(10)))
+        return values, await shared.get_or_load(NAMESPACE, "k", loader)
+
+    values, cached = asyncio.run(scenario())
+
+    assert len(loads) == 1
+    assert values == [{"value": 1}] * 10 and cached == {"value": 1}
+
+
+def test_sync_loaders_run_off_the_event_loop():
+    shared = TwoTierCache()
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def render():
+        threads.append(threading.get_ident())
+        return b"%PDF"
+
+    assert asyncio.run(shared.get_or_load(NAMESPACE, "pdf", render)) == b"%PDF"
+    assert threads and threads[0] != loop_thread
+
+
+def test_other_workers_wait_for_the_shared_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_LOCK_WAIT_SECONDS", 5)
+    path = str(tmp_path / "cache.sqlite3")
+    # Two workers: separate per-worker tiers over one SQLite file
+    first, second = TwoTierCache(SQLiteCacheBackend(path)), TwoTierCache(SQLiteCacheBackend(path))
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.2)
+        return "loaded"
+
+    async def scenario():
+        loading = asyncio.ensure_future(first.get_or_load(NAMESPACE, "k", loader))
+        await asyncio.sleep(0.05)
+        waited = await second.get_or_load(NAMESPACE, "k", loader)
+        return await loading, waited
+
+    assert asyncio.run(scenario()) == ("loaded", "loaded")
+    assert len(loads) == 1
+
+
+def test_sqlite_file_is_created_private(tmp_path):
+    path = private_sqlite_path(str(tmp_path / "cache.sqlite3"))
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_sqlite_paths_others_can_write_are_refused(tmp_path):
+    shared_file = tmp_path / "shared.sqlite3"
+    shared_file.touch()
+    os.chmod(shared_file, 0o664)
+    with pytest.raises(RuntimeError, match="writable by other users"):
+        private_sqlite_path(str(shared_file))
+
+    shared_dir = tmp_path / "shared"
+    shared_dir.mkdir()
+    os.chmod(shared_dir, 0o777)
+    with pytest.raises(RuntimeError, match="writable by other users"):
+        private_sqlite_path(str(shared_dir / "cache.sqlite3"))
+
+    link = tmp_path / "link"
+    link.symlink_to(tmp_path / "elsewhere", target_is_directory=True)
+    (tmp_path / "elsewhere").mkdir()
+    with pytest.raises(RuntimeError, match="symlink"):
+        private_sqlite_path(str(link / "cache.sqlite3"))
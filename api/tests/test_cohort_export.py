@@ -0,0 +1,71 @@
+"""
+Incremental cohort export (app/services/cohort_export.py) with results that
+reach the server late, through the API.
+"""
+import glob
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.firestore import CALCULATION_RESULTS_COLLECTION
+from app.services.cohort_export import export_cohort
+from conftest import auth
+
+pytest.importorskip("pyarrow")
+
+RESULT = {
+    "calculator_name": "Cockcroft-Gault Creatinine Clearance",
+    "input_data": {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male"},
+    "result_value": 68.1,
+}
+
+
+def cohort_ids(out_dir):
+    import pyarrow.parquet as pq
+    ids = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "*", "part-*.parquet"))):
+        ids.extend(pq.read_table(path).column("id").to_pylist())
+    return ids
+
+
+def test_backdated_offline_save_reaches_the_next_incremental_export(client, memory_firestore, tmp_path):
+    out_dir = str(tmp_path / "cohort")
+    created = client.post("/api/v1/calculation_results", json=RESULT, headers=auth())
+    assert created.status_code == 201
+    assert export_cohort(out_dir, output_format="parquet")["rows"] == 1
+
+    # Calculated offline five days ago, long before the watermark, and synced now
+    performed_at = datetime.now(timezone.utc) - timedelta(days=5)
+    response = client.post(
+        "/api/v1/calculation_results/batch",
+        json={"items": [dict(RESULT, idempotency_key="offline-1", performed_at=performed_at.isoformat())]},
+        headers=auth(),
+    )
+    item = response.json()["results"][0]
+    assert item["status"] == 201
+
+    stored = memory_firestore.collection(CALCULATION_RESULTS_COLLECTION).document(item["result"]["id"]).get().to_dict()
+    assert stored["performed_at"] == performed_at
+    assert stored["created_at"] > performed_at + timedelta(days=4)
+
+    summary = export_cohort(out_dir, incremental=True, output_format="parquet")
+
+    assert summary["rows"] == 1
+    assert sorted(cohort_ids(out_dir)) == sorted([created.json()["id"], item["result"]["id"]])
+    with open(os.path.join(out_dir, "_watermark.json")) as f:
+        assert json.load(f)["ids_at_watermark"] == [item["result"]["id"]]
+    assert export_cohort(out_dir, incremental=True, output_format="parquet")["rows"] == 0
+
+
+def test_full_export_includes_results_without_created_at(memory_firestore, tmp_path):
+    # Written before created_at existed
+    memory_firestore.collection(CALCULATION_RESULTS_COLLECTION).document("legacy").set(
+        dict(RESULT, user_id="u", performed_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    )
+    out_dir = str(tmp_path / "cohort")
+
+    assert export_cohort(out_dir, output_format="parquet")["rows"] == 1
+    with open(os.path.join(out_dir, "_watermark.json")) as f:
+        assert json.load(f)["created_at"].startswith("2024-01-01")
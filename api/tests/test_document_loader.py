@@ -0,0 +1,81 @@
+"""
+Batched document lookups (DocumentLoader) and the per-request document
+cache opened by RequestCacheMiddleware.
+"""
+import asyncio
+
+import pytest
+
+from app.core.firestore import USERS_COLLECTION, RequestCacheMiddleware, user_loader
+
+
+@pytest.fixture
+def get_all_calls(memory_firestore, monkeypatch):
+    calls = []
+    get_all = memory_firestore.get_all
+
+    def counting_get_all(references):
+        calls.append(sorted(reference.id for reference in references))
+        return get_all(references)
+    monkeypatch.setattr(memory_firestore, "get_all", counting_get_all)
+    return calls
+
+
+def add_user(db, user_id, name):
+    db.collection(USERS_COLLECTION).document(user_id).set({"name": name})
+
+
+def request(app):
+    """Run app as one HTTP request inside RequestCacheMiddleware"""
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+    return RequestCacheMiddleware(app)({"type": "http"}, receive, send)
+
+
+def test_concurrent_loads_share_one_get_all(memory_firestore, get_all_calls):
+    add_user(memory_firestore, "alice", "Alice")
+    add_user(memory_firestore, "bob", "Bob")
+    loaded = []
+
+    async def app(scope, receive, send):
+        loaded.extend(await asyncio.gather(*(user_loader.load(uid) for uid in ["alice", "bob", "alice", "nobody"])))
+
+    asyncio.run(request(app))
+
+    assert get_all_calls == [["alice", "bob", "nobody"]]
+    assert [user and user["name"] for user in loaded] == ["Alice", "Bob", "Alice", None]
+    assert loaded[0]["id"] == "alice" and loaded[0] is not loaded[2]
+
+
+def test_request_cache_is_reset_between_requests(memory_firestore, get_all_calls):
+    add_user(memory_firestore, "alice", "Alice")
+    names = []
+
+    async def app(scope, receive, send):
+        for _ in range(3):
+            user = await user_loader.load("alice")
+            names.append(user["name"])
+            # Callers get copies; the cached document is unchanged
+            user["name"] = "changed"
+
+    asyncio.run(request(app))
+    add_user(memory_firestore, "alice", "Alice Updated")
+    asyncio.run(request(app))
+
+    assert names == ["Alice"] * 3 + ["Alice Updated"] * 3
+    assert get_all_calls == [["alice"], ["alice"]]
+
+
+def test_get_all_errors_reach_every_caller(memory_firestore, monkeypatch):
+    def unavailable(references):
+        raise RuntimeError("unavailable")
+    monkeypatch.setattr(memory_firestore, "get_all", unavailable)
+
+    async def scenario():
+        return await asyncio.gather(user_loader.load("alice"), user_loader.load("bob"), return_exceptions=True)
+
+    outcomes = asyncio.run(scenario())
+    assert [str(outcome) for outcome in outcomes] == ["unavailable", "unavailable"]
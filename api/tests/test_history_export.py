@@ -0,0 +1,47 @@
+"""
+CSV history export (app/services/history_export.py).
+"""
+import csv
+import io
+import json
+
+from conftest import auth
+
+CALCULATOR = "Cockcroft-Gault Creatinine Clearance"
+
+
+def export_rows(client):
+    response = client.get(f"/api/v1/calculation_results/export.csv?calculator={CALCULATOR}", headers=auth())
+    assert response.status_code == 200
+    return list(csv.DictReader(io.StringIO(response.text.lstrip("\ufeff"))))
+
+
+def test_unknown_inputs_go_to_the_overflow_column(client):
+    input_data = {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male", "other": "a", "note": "b"}
+    response = client.post("/api/v1/calculation_results", json={
+        "calculator_name": CALCULATOR, "input_data": input_data, "result_value": 68.1
+    }, headers=auth())
+    assert response.status_code == 201
+
+    [row] = export_rows(client)
+
+    assert row["input_age"] == "60" and row["input_sex"] == "male"
+    assert json.loads(row["other_inputs"]) == {"other": "a", "note": "b"}
+    assert "input_other" not in row
+
+
+def test_cells_that_look_like_formulas_are_escaped(client):
+    input_data = {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male", "n": "@SUM(A1)"}
+    response = client.post("/api/v1/calculation_results", json={
+        "calculator_name": CALCULATOR, "calculator_name_ru": "=HYPERLINK(\"http://evil\")",
+        "input_data": input_data, "result_value": -1.5, "interpretation": "-cmd|' /C calc'!A0",
+    }, headers=auth())
+    assert response.status_code == 201
+
+    [row] = export_rows(client)
+
+    assert row["calculator_name_ru"] == "'=HYPERLINK(\"http://evil\")"
+    assert row["interpretation"] == "'-cmd|' /C calc'!A0"
+    # Numbers are left alone; the overflow column holds JSON, which starts with {
+    assert row["result_value"] == "-1.5"
+    assert json.loads(row["other_inputs"]) == {"n": "@SUM(A1)"}
@@ -0,0 +1,120 @@
+"""
+Idempotency-Key handling of result writes (app/core/idempotency.py and
+FirestoreCalculationResult.create_idempotent*), single and batch.
+"""
+import asyncio
+
+import pytest
+
+from app.core import firestore
+from app.core.config import settings
+from app.core.firestore import CALCULATION_RESULTS_COLLECTION, FirestoreCalculationResult
+from app.core.idempotency import IdempotencyIndex, IdempotencyKeyConflict
+from conftest import auth
+
+RESULT = {
+    "calculator_name": "Cockcroft-Gault Creatinine Clearance",
+    "input_data": {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male"},
+    "result_value": 68.1,
+}
+FIELDS = dict(RESULT, calculator_name_ru=None, interpretation=None)
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    """A fresh per-worker index: keys completed by other tests are forgotten"""
+    index = IdempotencyIndex(settings.IDEMPOTENCY_CACHE_SIZE)
+    monkeypatch.setattr(firestore, "idempotency_index", index)
+    return index
+
+
+def stored_ids(db):
+    return [doc.id for doc in db.collection(CALCULATION_RESULTS_COLLECTION).stream()]
+
+
+def test_replay_returns_the_original(client, memory_firestore):
+    headers = dict(auth(), **{"Idempotency-Key": "key-1"})
+
+    first = client.post("/api/v1/calculation_results", json=RESULT, headers=headers)
+    replay = client.post("/api/v1/calculation_results", json=RESULT, headers=headers)
+
+    assert first.status_code == 201 and "Idempotent-Replayed" not in first.headers
+    # The original response again, marked as a replay
+    assert replay.status_code == 201 and replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json()["id"] == first.json()["id"]
+    assert stored_ids(memory_firestore) == [first.json()["id"]]
+
+
+def test_replay_from_another_worker_reads_the_stored_result(memory_firestore, monkeypatch):
+    first, _ = asyncio.run(FirestoreCalculationResult.create_idempotent("alice", "key-1", **FIELDS))
+    # Not in this worker's index: resolved through the existing document
+    monkeypatch.setattr(firestore, "idempotency_index", IdempotencyIndex(settings.IDEMPOTENCY_CACHE_SIZE))
+
+    result, replayed = asyncio.run(FirestoreCalculationResult.create_idempotent("alice", "key-1", **FIELDS))
+
+    assert replayed and result["id"] == first["id"] and result["result_value"] == 68.1
+    assert "idempotency" not in result
+
+
+def test_mismatched_payload_is_a_conflict(client, memory_firestore, monkeypatch):
+    headers = dict(auth(), **{"Idempotency-Key": "key-1"})
+    assert client.post("/api/v1/calculation_results", json=RESULT, headers=headers).status_code == 201
+
+    changed = dict(RESULT, result_value=70.0)
+    assert client.post("/api/v1/calculation_results", json=changed, headers=headers).status_code == 409
+
+    monkeypatch.setattr(firestore, "idempotency_index", IdempotencyIndex(settings.IDEMPOTENCY_CACHE_SIZE))
+    assert client.post("/api/v1/calculation_results", json=changed, headers=headers).status_code == 409
+    # The same key is a different document for another user
+    other = client.post("/api/v1/calculation_results", json=changed, headers=dict(auth("bob"), **{"Idempotency-Key": "key-1"}))
+    assert other.status_code == 201
+    assert len(stored_ids(memory_firestore)) == 2
+
+
+def test_concurrent_duplicates_write_once(memory_firestore):
+    async def duplicates():
+        return await asyncio.gather(*(
+            FirestoreCalculationResult.create_idempotent("alice", "key-1", **FIELDS) for _ in range(5)
+        ))
+
+    outcomes = asyncio.run(duplicates())
+
+    assert sorted(replayed for _, replayed in outcomes) == [False, True, True, True, True]
+    assert len({result["id"] for result, _ in outcomes}) == 1
+    assert len(stored_ids(memory_firestore)) == 1
+
+
+def test_concurrent_mismatched_duplicate_is_a_conflict(memory_firestore):
+    async def duplicates():
+        return await asyncio.gather(
+            FirestoreCalculationResult.create_idempotent("alice", "key-1", **FIELDS),
+            FirestoreCalculationResult.create_idempotent("alice", "key-1", **dict(FIELDS, result_value=1.0)),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(duplicates())
+
+    assert first[1] is False and isinstance(second, IdempotencyKeyConflict)
+    assert len(stored_ids(memory_firestore)) == 1
+
+
+def test_batch_items_replay_and_conflict_per_key(client, memory_firestore):
+    items = [
+        dict(RESULT, idempotency_key="a"),
+        dict(RESULT, idempotency_key="b"),
+        dict(RESULT, idempotency_key="a"),
+        dict(RESULT, idempotency_key="b", result_value=1.0),
+    ]
+
+    response = client.post("/api/v1/calculation_results/batch", json={"items": items}, headers=auth())
+
+    assert [r["status"] for r in response.json()["results"]] == [201, 201, 200, 409]
+    assert len(stored_ids(memory_firestore)) == 2
+
+    # A retried batch replays every created item, including with a cold index
+    client.post("/api/v1/calculation_results", json=RESULT, headers=dict(auth(), **{"Idempotency-Key": "c"}))
+    retry = [dict(RESULT, idempotency_key=key) for key in ("a", "b", "c")] + [dict(RESULT, idempotency_key="d")]
+    response = client.post("/api/v1/calculation_results/batch", json={"items": retry}, headers=auth())
+
+    assert [r["status"] for r in response.json()["results"]] == [200, 200, 200, 201]
+    assert len(stored_ids(memory_firestore)) == 4
@@ -0,0 +1,60 @@
+"""
+In-memory Firestore stand-in (app/core/local_firestore.py): write semantics
+that the rest of the suite relies on matching Firestore.
+"""
+import pytest
+from google.api_core.exceptions import NotFound
+
+from app.core.local_firestore import SERVER_TIMESTAMP, Increment, MemoryFirestoreClient
+
+
+@pytest.fixture
+def doc():
+    document = MemoryFirestoreClient().collection("things").document("a")
+    document.set({"profile": {"name": "A", "age": 40}, "count": 1})
+    return document
+
+
+def test_update_treats_dotted_keys_as_field_paths(doc):
+    doc.update({"profile.age": 41, "count": Increment(2), "stats.last.seen": SERVER_TIMESTAMP})
+
+    data = doc.get().to_dict()
+    assert data["profile"] == {"name": "A", "age": 41}
+    assert data["count"] == 3
+    assert data["stats"]["last"]["seen"] is not None
+    assert "profile.age" not in data
+    assert doc.get().get("profile.name") == "A"
+
+
+def test_update_replaces_a_whole_map_given_by_its_name(doc):
+    doc.update({"profile": {"name": "B"}})
+
+    assert doc.get().to_dict()["profile"] == {"name": "B"}
+
+
+def test_merge_set_merges_nested_maps(doc):
+    doc.set({"profile": {"city": "Kazan"}, "count": Increment(1)}, merge=True)
+
+    assert doc.get().to_dict() == {"profile": {"name": "A", "age": 40, "city": "Kazan"}, "count": 2}
+
+
+def test_batched_update_uses_field_paths(doc):
+    batch = doc._client.batch()
+    batch.update(doc, {"profile.age": Increment(1)})
+    batch.commit()
+
+    assert doc.get().to_dict()["profile"]["age"] == 41
+
+
+def test_update_of_a_missing_document_fails():
+    with pytest.raises(NotFound):
+        MemoryFirestoreClient().collection("things").document("missing").update({"a.b": 1})
+
+
+def test_queries_filter_and_order_by_nested_fields():
+    collection = MemoryFirestoreClient().collection("things")
+    for name, age in (("a", 30), ("b", 10), ("c", 20)):
+        collection.document(name).set({"profile": {"age": age}})
+
+    query = collection.where("profile.age", ">=", 20).order_by("profile.age")
+    assert [snapshot.id for snapshot in query.stream()] == ["c", "a"]
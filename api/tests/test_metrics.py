@@ -0,0 +1,47 @@
+"""
+/metrics across workers (app/core/metrics.py): snapshots written to
+METRICS_SHARED_DIR are summed.
+"""
+import json
+
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, SharedMetrics
+
+
+def worker_registry():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    return registry, requests, latency
+
+
+def test_snapshots_of_all_workers_are_summed(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_SHARED_DIR", str(tmp_path))
+    other, other_requests, other_latency = worker_registry()
+    other_requests.inc("/a", amount=3)
+    other_latency.observe(0.05, "/a")
+    # Another worker's (or an exited worker's) last snapshot
+    (tmp_path / "worker-1.json").write_text(json.dumps(other.snapshot()))
+
+    registry, requests, latency = worker_registry()
+    requests.inc("/a")
+    requests.inc("/b")
+    latency.observe(0.5, "/a")
+    latency.observe(5, "/a")
+
+    lines = SharedMetrics(registry).render().splitlines()
+
+    assert 'requests_total{route="/a"} 4.0' in lines
+    assert 'requests_total{route="/b"} 1.0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3.0' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+    assert len(list(tmp_path.glob("worker-*.json"))) == 2
+
+
+def test_without_a_shared_directory_only_this_process_is_rendered():
+    registry, requests, _ = worker_registry()
+    requests.inc("/a")
+
+    assert 'requests_total{route="/a"} 1.0' in registry.render().splitlines()
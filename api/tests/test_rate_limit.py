@@ -0,0 +1,128 @@
+"""
+Admission control (app/core/rate_limit.py): token buckets, route costs,
+429 responses and 503 load shedding.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import rate_limit
+from app.core.config import settings
+from app.core.firestore import FirestoreCalculationResult
+from app.core.rate_limit import LocalBucketStore, RedisBucketStore
+from conftest import auth
+
+ORIGIN = "http://localhost:3000"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Rate limiting on, with fresh local buckets"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 1000)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ROUTE_BURST", 60)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ROUTE_PER_SECOND", 1)
+    monkeypatch.setattr(rate_limit, "bucket_store", LocalBucketStore())
+
+
+def test_bucket_burst_then_refill(clock):
+    store = LocalBucketStore()
+    bucket = [("user:alice", 10, 2)]
+
+    assert asyncio.run(store.consume(bucket, 4)) == 0
+    assert asyncio.run(store.consume(bucket, 4)) == 0
+    # 2 tokens left: 2 more needed at 2 per second
+    assert asyncio.run(store.consume(bucket, 4)) == 1.0
+
+    clock.now += 1
+    assert asyncio.run(store.consume(bucket, 4)) == 0
+    # Refill is capped at the burst size
+    clock.now += 3600
+    assert asyncio.run(store.consume(bucket, 10)) == 0
+    assert asyncio.run(store.consume(bucket, 1)) == 0.5
+
+
+def test_a_rejected_request_takes_from_no_bucket(clock):
+    store = LocalBucketStore()
+    buckets = [("user:alice", 100, 1), ("user:alice:route", 5, 1)]
+
+    assert asyncio.run(store.consume(buckets, 5)) == 0
+    assert asyncio.run(store.consume(buckets, 5)) == 5.0
+
+    clock.now += 5
+    assert asyncio.run(store.consume(buckets, 5)) == 0
+    assert asyncio.run(store.consume([("user:alice", 100, 1)], 90)) == 0
+
+
+def test_expensive_routes_drain_faster_and_get_retry_after(client, limited):
+    # pdf_export costs 20 of the 60-token route burst; the limit applies before the lookup
+    statuses = [client.get("/api/v1/calculation_results/missing/export", headers=auth()).status_code for _ in range(4)]
+
+    assert statuses == [404, 404, 404, 429]
+    response = client.get("/api/v1/calculation_results/missing/export", headers=auth())
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "20"
+
+    reads = [client.get("/api/v1/calculation_results", headers=auth()).status_code for _ in range(60)]
+    assert reads == [200] * 60
+    # Buckets are per user
+    assert client.get("/api/v1/calculation_results/missing/export", headers=auth("bob")).status_code == 404
+
+
+def test_redis_errors_fail_open(monkeypatch):
+    store = RedisBucketStore.__new__(RedisBucketStore)
+
+    async def unavailable(keys, args):
+        raise ConnectionError("redis is down")
+    store._script = unavailable
+
+    assert asyncio.run(store.consume([("user:alice", 1, 1)], 1000)) == 0.0
+
+
+def test_saturated_worker_sheds_with_cors_headers(memory_firestore, monkeypatch):
+    from main import app
+    monkeypatch.setattr(settings, "MAX_CONCURRENT_REQUESTS", 1)
+    entered, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_get_by_user(*args, **kwargs):
+        entered.set()
+        await release.wait()
+        return []
+    monkeypatch.setattr(FirestoreCalculationResult, "get_by_user", slow_get_by_user)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            headers = dict(auth(), Origin=ORIGIN)
+            busy = asyncio.ensure_future(http.get("/api/v1/calculation_results", headers=headers))
+            await asyncio.wait_for(entered.wait(), 5)
+
+            shed = await http.get("/api/v1/calculation_results", headers=headers)
+            exempt = await http.get("/health", headers={"Origin": ORIGIN})
+
+            release.set()
+            return await busy, shed, exempt
+
+    busy, shed, exempt = asyncio.run(scenario())
+
+    assert busy.status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert shed.headers["access-control-allow-origin"] == ORIGIN
+    assert exempt.status_code == 200
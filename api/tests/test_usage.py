@@ -0,0 +1,47 @@
+"""
+Global usage counters (app/core/counters.py) and GET /usage/calculations.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.core.counters import read_daily_counts, usage_counters
+from conftest import auth
+
+CALCULATOR = "Cockcroft-Gault Creatinine Clearance"
+RESULT = {
+    "calculator_name": CALCULATOR,
+    "input_data": {"age": 60, "weight": 70, "creatinine": 1.0, "sex": "male"},
+    "result_value": 68.1,
+}
+
+
+@pytest.fixture(autouse=True)
+def no_pending_counts(monkeypatch):
+    # Other tests' creates are still in the per-worker accumulator
+    monkeypatch.setattr(usage_counters, "_pending", defaultdict(int))
+
+
+def today():
+    return datetime.now(timezone.utc).date()
+
+
+def test_only_known_calculators_are_counted(client):
+    for name in (CALCULATOR, "x" * 200, "Made Up Calculator"):
+        response = client.post("/api/v1/calculation_results", json=dict(RESULT, calculator_name=name), headers=auth())
+        assert response.status_code == 201
+    asyncio.run(usage_counters.flush())
+
+    assert read_daily_counts(today(), today()) == {today().isoformat(): {CALCULATOR: 1}}
+
+
+def test_usage_counts_are_for_usage_admins_only(client, monkeypatch):
+    monkeypatch.setattr(settings, "USAGE_ADMIN_EMAILS", ["admin@example.com"])
+
+    assert client.get("/api/v1/usage/calculations", headers=auth("alice")).status_code == 403
+    response = client.get("/api/v1/usage/calculations", headers=auth("admin"))
+    assert response.status_code == 200
+    assert response.json()["since"] == today().isoformat()
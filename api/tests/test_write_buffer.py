@@ -0,0 +1,109 @@
+"""
+Group commit (app/core/write_buffer.py) against the in-memory Firestore.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.core.local_firestore import WriteBatch
+from app.core.write_buffer import WriteBuffer
+
+
+class RecordingClient:
+    """The in-memory client, recording batch sizes; commits can be held or failed"""
+
+    def __init__(self, db):
+        self.db = db
+        self.batch_sizes = []
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def batch(self):
+        client = self
+
+        class Batch(WriteBatch):
+            def commit(self):
+                client.release.wait(5)
+                if client.error is not None:
+                    raise client.error
+                client.batch_sizes.append(len(self))
+                super().commit()
+
+        return Batch(self.db)
+
+
+@pytest.fixture
+def client(memory_firestore):
+    return RecordingClient(memory_firestore)
+
+
+def ref(db, doc_id):
+    return db.collection("buffered").document(doc_id)
+
+
+def stored(db):
+    return sorted(doc.id for doc in db.collection("buffered").stream())
+
+
+def test_writes_are_acknowledged_only_once_committed(client, memory_firestore):
+    buffer = WriteBuffer(lambda: client, max_batch=100, max_delay_ms=1)
+    client.release.clear()
+
+    async def scenario():
+        writes = [asyncio.ensure_future(buffer.set(ref(memory_firestore, f"d{i}"), {"i": i})) for i in range(3)]
+        await asyncio.sleep(0.05)
+        # Batch started, commit held
+        assert not any(write.done() for write in writes)
+        assert stored(memory_firestore) == []
+        client.release.set()
+        await asyncio.gather(*writes)
+
+    asyncio.run(scenario())
+
+    assert client.batch_sizes == [3]
+    assert stored(memory_firestore) == ["d0", "d1", "d2"]
+
+
+def test_a_failed_commit_fails_every_waiter(client, memory_firestore):
+    buffer = WriteBuffer(lambda: client, max_batch=100, max_delay_ms=1)
+    client.error = RuntimeError("unavailable")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(buffer.set(ref(memory_firestore, f"d{i}"), {"i": i}) for i in range(3)),
+            return_exceptions=True,
+        )
+
+    outcomes = asyncio.run(scenario())
+
+    assert all(outcome is client.error for outcome in outcomes)
+    assert stored(memory_firestore) == []
+
+
+def test_max_batch_splits_commits(client, memory_firestore):
+    buffer = WriteBuffer(lambda: client, max_batch=2, max_delay_ms=1)
+
+    async def scenario():
+        await asyncio.gather(*(buffer.set(ref(memory_firestore, f"d{i}"), {"i": i}) for i in range(5)))
+
+    asyncio.run(scenario())
+
+    assert sorted(client.batch_sizes) == [1, 2, 2]
+    assert len(stored(memory_firestore)) == 5
+
+
+def test_flush_commits_pending_writes_without_waiting_for_the_delay(client, memory_firestore):
+    buffer = WriteBuffer(lambda: client, max_batch=100, max_delay_ms=60_000)
+
+    async def scenario():
+        writes = [asyncio.ensure_future(buffer.set(ref(memory_firestore, f"d{i}"), {"i": i})) for i in range(2)]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(buffer.flush(), 5)
+        assert all(write.done() for write in writes)
+
+    asyncio.run(scenario())
+
+    assert client.batch_sizes == [2]
+    assert stored(memory_firestore) == ["d0", "d1"]
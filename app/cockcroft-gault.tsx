@@ -3,14 +3,16 @@ import { View, Text, TextInput, ScrollView, TouchableOpacity, ActivityIndicator
 import { router } from 'expo-router';
 import { useAuth } from '@/hooks/useAuth';
 import { useCalculationResultsStore } from '@/stores/calculationResultsStore';
-import { cockcroftGaultCalculator } from '@/lib/calculators/cockcroftGault';
-import type { InputField } from '@/lib/calculators/cockcroftGault';
+import { useCalculator } from '@/hooks/useCalculator';
+import type { InputField } from '@/lib/calculators';
+
+const CALCULATOR_NAME = 'Cockcroft-Gault Creatinine Clearance';
 
 export default function CockcroftGaultScreen() {
   const { isAuthenticated, isLoading } = useAuth();
   const { addItem: createResult, loading: calculating } = useCalculationResultsStore();
   
-  const calculator = cockcroftGaultCalculator;
+  const { calculator } = useCalculator(CALCULATOR_NAME);
   const [formData, setFormData] = useState<Record<string, any>>({});
   const [result, setResult] = useState<{ value: number; interpretation: string; severity?: string } | null>(null);
   const [errors, setErrors] = useState<Record<string, string>>({});
@@ -21,17 +23,25 @@ export default function CockcroftGaultScreen() {
       return;
     }
     
-    if (isAuthenticated) {
+    if (isAuthenticated && calculator) {
       // Initialize form
       initializeForm();
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [isAuthenticated, isLoading]);
+  }, [isAuthenticated, isLoading, calculator]);
 
   if (isLoading || !isAuthenticated) {
     return null;
   }
 
+  if (!calculator) {
+    return (
+      <View className="flex-1 bg-surface items-center justify-center">
+        <ActivityIndicator size="large" color="#6366f1" />
+      </View>
+    );
+  }
+
   const initializeForm = () => {
     const initialData: Record<string, any> = {};
     calculator.inputFields.forEach((field: InputField) => {
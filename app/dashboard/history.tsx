@@ -4,14 +4,18 @@
  */
 
 import React, { useEffect } from 'react';
-import { View, Text, ScrollView, Pressable, ActivityIndicator } from 'react-native';
+import { View, Text, ScrollView, Pressable, ActivityIndicator, Alert } from 'react-native';
 import { router } from 'expo-router';
+import * as Clipboard from 'expo-clipboard';
 import { useAuth } from '@/hooks/useAuth';
 import { useCalculationResultsStore } from '@/stores/calculationResultsStore';
+import { outbox } from '@/services/outbox';
 
 export default function DashboardHistoryScreen() {
   const { isAuthenticated, isLoading: authLoading } = useAuth();
-  const { items, loading, fetchAll } = useCalculationResultsStore();
+  const {
+    items, rejected, loading, fetchAll, startLiveUpdates, retryRejected, discardRejected
+  } = useCalculationResultsStore();
 
   // Load calculation history only when authenticated
   useEffect(() => {
@@ -22,6 +26,13 @@ export default function DashboardHistoryScreen() {
     }
   }, [isAuthenticated, authLoading, fetchAll]);
 
+  // Keep history current while the screen is open (pushed by the server)
+  useEffect(() => {
+    if (!authLoading && isAuthenticated) {
+      return startLiveUpdates();
+    }
+  }, [isAuthenticated, authLoading, startLiveUpdates]);
+
   const formatDate = (dateString: string) => {
     const date = new Date(dateString);
     const now = new Date();
@@ -44,6 +55,16 @@ export default function DashboardHistoryScreen() {
     }
   };
 
+  const rejectionReason = (status: number, detail: any) => {
+    if (typeof detail === 'string') return detail;
+    return status === 409 ? 'Конфликт с уже сохранённым расчётом' : 'Сервер не принял данные расчёта';
+  };
+
+  const exportRejected = async () => {
+    await Clipboard.setStringAsync(outbox.exportRejected());
+    Alert.alert('Скопировано', 'Несохранённые расчёты скопированы в буфер обмена (JSON)');
+  };
+
   return (
     <View className="flex-1 bg-surface">
       <ScrollView className="flex-1 px-6 py-8">
@@ -55,6 +76,54 @@ export default function DashboardHistoryScreen() {
           Все ваши расчёты
         </Text>
 
+        {/* Saves the server refused: kept on this device until retried or discarded */}
+        {rejected.length > 0 ? (
+          <View className="bg-danger-bg rounded-2xl p-5 border border-danger-border mb-6">
+            <View className="flex-row items-center justify-between mb-3">
+              <Text className="text-lg font-bold text-danger-text flex-1">
+                Не сохранено на сервере ({rejected.length})
+              </Text>
+              <Pressable onPress={exportRejected} className="px-3 py-1 active:opacity-80">
+                <Text className="text-sm font-semibold text-danger-text">Экспорт</Text>
+              </Pressable>
+            </View>
+            <View className="gap-3">
+              {rejected.map((entry) => (
+                <View key={entry.key} className="bg-surface-elevated rounded-xl p-3 border border-border">
+                  <View className="flex-row justify-between mb-1">
+                    <Text className="text-sm font-semibold text-text-primary flex-1">
+                      {entry.payload.calculatorName || 'Калькулятор'}
+                    </Text>
+                    <Text className="text-sm font-semibold text-text-primary">
+                      {entry.payload.resultValue}
+                    </Text>
+                  </View>
+                  <Text className="text-xs text-text-secondary mb-1">
+                    {formatDate(new Date(entry.queuedAt).toISOString())}
+                  </Text>
+                  <Text className="text-xs text-danger-text mb-2">
+                    {rejectionReason(entry.status, entry.detail)}
+                  </Text>
+                  <View className="flex-row gap-2">
+                    <Pressable
+                      onPress={() => retryRejected(entry.key)}
+                      className="bg-primary px-4 py-2 rounded-lg active:opacity-80"
+                    >
+                      <Text className="text-sm font-semibold text-text-inverse">Повторить</Text>
+                    </Pressable>
+                    <Pressable
+                      onPress={() => discardRejected(entry.key)}
+                      className="border border-border px-4 py-2 rounded-lg active:opacity-80"
+                    >
+                      <Text className="text-sm font-semibold text-text-secondary">Удалить</Text>
+                    </Pressable>
+                  </View>
+                </View>
+              ))}
+            </View>
+          </View>
+        ) : null}
+
         {/* Loading State */}
         {loading && items.length === 0 ? (
           <View className="items-center justify-center py-12">
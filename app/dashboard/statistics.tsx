@@ -11,7 +11,7 @@ import { useCalculationResultsStore } from '@/stores/calculationResultsStore';
 
 export default function DashboardStatisticsScreen() {
   const { isAuthenticated, isLoading } = useAuth();
-  const { items: results, loading, fetchAll } = useCalculationResultsStore();
+  const { items: results, loading, fetchAll, startLiveUpdates } = useCalculationResultsStore();
   const [totalCalculations, setTotalCalculations] = useState(0);
   const [recentCalculations, setRecentCalculations] = useState(0);
   const [calculatorStats, setCalculatorStats] = useState<Record<string, number>>({});
@@ -30,6 +30,13 @@ export default function DashboardStatisticsScreen() {
     }
   }, [isAuthenticated, fetchAll]);
 
+  // Keep results current while the screen is open (pushed by the server)
+  useEffect(() => {
+    if (isAuthenticated) {
+      return startLiveUpdates();
+    }
+  }, [isAuthenticated, startLiveUpdates]);
+
   // Calculate statistics
   useEffect(() => {
     if (results.length > 0) {
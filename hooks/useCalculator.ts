@@ -0,0 +1,32 @@
+/**
+ * useCalculator Hook
+ * A calculator from the registry, loaded on first use
+ */
+
+import { useEffect, useState } from 'react';
+import { getLoadedCalculator, loadCalculator, type Calculator } from '@/lib/calculators';
+
+export function useCalculator(name: string) {
+  const [calculator, setCalculator] = useState<Calculator | undefined>(() => getLoadedCalculator(name));
+  const [error, setError] = useState<Error | null>(null);
+
+  useEffect(() => {
+    if (calculator?.name === name) return;
+
+    let active = true;
+    loadCalculator(name).then(
+      (loaded) => {
+        if (active) setCalculator(loaded);
+      },
+      (loadError: Error) => {
+        if (active) setError(loadError);
+      }
+    );
+
+    return () => {
+      active = false;
+    };
+  }, [name, calculator]);
+
+  return { calculator: calculator?.name === name ? calculator : undefined, error };
+}
@@ -3,45 +3,9 @@
  * Formula: ((140 - age) * weight * sex_factor) / (72 * creatinine)
  */
 
-export interface InputField {
-  name: string;
-  nameRu?: string;
-  type: 'number' | 'select' | 'text';
-  label: string;
-  labelRu?: string;
-  required?: boolean;
-  min?: number;
-  max?: number;
-  step?: number;
-  unit?: string;
-  unitRu?: string;
-  options?: {
-    value: string;
-    label: string;
-    labelRu?: string;
-    sexFactor?: number;
-  }[];
-}
+import type { Calculator } from './types';
 
-export interface InterpretationRule {
-  condition: string;
-  interpretation: string;
-  interpretationRu?: string;
-  severity?: 'normal' | 'warning' | 'danger';
-}
-
-export interface Calculator {
-  name: string;
-  nameRu?: string;
-  description?: string;
-  descriptionRu?: string;
-  category: string;
-  categoryRu?: string;
-  inputFields: InputField[];
-  interpretationRules?: InterpretationRule[];
-  calculate: (inputData: Record<string, any>) => number;
-  interpret?: (resultValue: number) => { text: string; textRu?: string; severity?: string };
-}
+export type { Calculator, InputField, InterpretationRule } from './types';
 
 export const cockcroftGaultCalculator: Calculator = {
   name: 'Cockcroft-Gault Creatinine Clearance',
@@ -50,6 +14,7 @@ export const cockcroftGaultCalculator: Calculator = {
   descriptionRu: 'Оценка функции почек для коррекции доз лекарств',
   category: 'nephrology',
   categoryRu: 'нефрология',
+  keywords: ['CrCl', 'kidney', 'renal', 'dose', 'почки', 'доза'],
   
   inputFields: [
     {
@@ -1,19 +1,85 @@
 /**
  * Calculator registry
- * All calculators are defined here on the frontend
+ * Lists, lookups and search use the generated manifest (./manifest.ts), so
+ * a calculator's module (fields, rules, formula) is only loaded when the
+ * calculator is opened, and is kept once loaded.
+ * After adding or changing a calculator run `npm run gen calculators`.
  */
 
-import { cockcroftGaultCalculator, Calculator } from './cockcroftGault';
+import { calculatorManifest } from './manifest';
+import type { Calculator, CalculatorManifestEntry } from './types';
 
-// Export all calculators
-export const calculators: Calculator[] = [
-  cockcroftGaultCalculator
-];
+// All calculators, in manifest order
+export const calculatorEntries: readonly CalculatorManifestEntry[] = calculatorManifest;
 
-// Helper function to get calculator by name
-export const getCalculatorByName = (name: string): Calculator | undefined => {
-  return calculators.find(calc => calc.name === name);
+const entriesByName = new Map<string, CalculatorManifestEntry>(
+  calculatorManifest.map(entry => [entry.name, entry])
+);
+
+const entriesByCategory = new Map<string, CalculatorManifestEntry[]>();
+for (const entry of calculatorManifest) {
+  const entries = entriesByCategory.get(entry.category);
+  if (entries) {
+    entries.push(entry);
+  } else {
+    entriesByCategory.set(entry.category, [entry]);
+  }
+}
+
+const loadedCalculators = new Map<string, Calculator>();
+const pendingLoads = new Map<string, Promise<Calculator>>();
+
+// Manifest entry by calculator name
+export const getCalculatorEntry = (name: string): CalculatorManifestEntry | undefined => {
+  return entriesByName.get(name);
+};
+
+// Calculators grouped by category, in manifest order
+export const getCalculatorsByCategory = (): ReadonlyMap<string, readonly CalculatorManifestEntry[]> => {
+  return entriesByCategory;
+};
+
+// Calculators whose keywords start with every word of the query (all for an empty query)
+export const searchCalculators = (query: string): CalculatorManifestEntry[] => {
+  const words = query.toLowerCase().split(/[^0-9a-zа-яё]+/).filter(Boolean);
+  if (words.length === 0) return [...calculatorManifest];
+
+  return calculatorManifest.filter(entry =>
+    words.every(word => entry.keywords.some(keyword => keyword.startsWith(word)))
+  );
+};
+
+// Calculator if it has already been loaded (no loading)
+export const getLoadedCalculator = (name: string): Calculator | undefined => {
+  return loadedCalculators.get(name);
+};
+
+// Load a calculator's module once; concurrent callers share the load
+export const loadCalculator = (name: string): Promise<Calculator> => {
+  const loaded = loadedCalculators.get(name);
+  if (loaded) return Promise.resolve(loaded);
+
+  const pending = pendingLoads.get(name);
+  if (pending) return pending;
+
+  const entry = entriesByName.get(name);
+  if (!entry) return Promise.reject(new Error(`Unknown calculator '${name}'`));
+
+  const load = entry.load().then(
+    calculator => {
+      loadedCalculators.set(name, calculator);
+      pendingLoads.delete(name);
+      return calculator;
+    },
+    error => {
+      // Not cached, so the next call retries
+      pendingLoads.delete(name);
+      throw error;
+    }
+  );
+  pendingLoads.set(name, load);
+  return load;
 };
 
 // Export types
-export type { Calculator, InputField, InterpretationRule } from './cockcroftGault';
+export type { Calculator, CalculatorManifestEntry, InputField, InterpretationRule } from './types';
@@ -0,0 +1,19 @@
+/**
+ * Calculator manifest
+ * Generated by `npm run gen calculators` from lib/calculators - do not edit
+ */
+
+import type { CalculatorManifestEntry } from './types';
+
+export const calculatorManifest: CalculatorManifestEntry[] = [
+  {
+    name: 'Cockcroft-Gault Creatinine Clearance',
+    nameRu: 'Клиренс креатинина (Cockcroft-Gault)',
+    description: 'Kidney function assessment for medication dose adjustment',
+    descriptionRu: 'Оценка функции почек для коррекции доз лекарств',
+    category: 'nephrology',
+    categoryRu: 'нефрология',
+    keywords: ['cockcroft', 'gault', 'creatinine', 'clearance', 'клиренс', 'креатинина', 'nephrology', 'нефрология', 'crcl', 'kidney', 'renal', 'dose', 'почки', 'доза'],
+    load: () => import('./cockcroftGault').then(m => m.cockcroftGaultCalculator),
+  },
+];
@@ -0,0 +1,59 @@
+/**
+ * Calculator types
+ * Shared by the calculator modules, the generated manifest and the registry
+ */
+
+export interface InputField {
+  name: string;
+  nameRu?: string;
+  type: 'number' | 'select' | 'text';
+  label: string;
+  labelRu?: string;
+  required?: boolean;
+  min?: number;
+  max?: number;
+  step?: number;
+  unit?: string;
+  unitRu?: string;
+  options?: {
+    value: string;
+    label: string;
+    labelRu?: string;
+    sexFactor?: number;
+  }[];
+}
+
+export interface InterpretationRule {
+  condition: string;
+  interpretation: string;
+  interpretationRu?: string;
+  severity?: 'normal' | 'warning' | 'danger';
+}
+
+export interface Calculator {
+  name: string;
+  nameRu?: string;
+  description?: string;
+  descriptionRu?: string;
+  category: string;
+  categoryRu?: string;
+  keywords?: string[];  // extra search terms besides the names and category
+  inputFields: InputField[];
+  interpretationRules?: InterpretationRule[];
+  calculate: (inputData: Record<string, any>) => number;
+  interpret?: (resultValue: number) => { text: string; textRu?: string; severity?: string };
+}
+
+/**
+ * Manifest entry: what lists and search need, without loading the module
+ */
+export interface CalculatorManifestEntry {
+  name: string;
+  nameRu?: string;
+  description?: string;
+  descriptionRu?: string;
+  category: string;
+  categoryRu?: string;
+  keywords: string[];  // lowercase search tokens
+  load: () => Promise<Calculator>;
+}
@@ -0,0 +1,184 @@
+const fs = require('fs');
+const path = require('path');
+const Module = require('module');
+const { say, createFile, resetTracking, showSummary } = require('./generator-utils');
+
+/**
+ * Calculator Definitions Generator
+ * Exports calculator metadata and input field definitions from lib/calculators
+ * to api/app/data/calculators.json, so the Python API uses the same
+ * definitions as the app (validation, analytics export), and writes
+ * lib/calculators/manifest.ts, which the app's registry uses to list and
+ * search calculators without loading their modules.
+ *
+ * Usage: npm run gen calculators
+ */
+
+const CALCULATORS_DIR = 'lib/calculators';
+const DEFINITIONS_PATH = 'api/app/data/calculators.json';
+const MANIFEST_PATH = 'lib/calculators/manifest.ts';
+
+// Modules in lib/calculators that define no calculators
+const SUPPORT_MODULES = ['index.ts', 'manifest.ts', 'types.ts'];
+
+// Calculator properties copied into the manifest
+const MANIFEST_FIELDS = [
+  'name',
+  'nameRu',
+  'description',
+  'descriptionRu',
+  'category',
+  'categoryRu',
+];
+
+// Serializable calculator properties (functions are evaluated in the app only)
+const EXPORTED_FIELDS = [
+  'name',
+  'nameRu',
+  'description',
+  'descriptionRu',
+  'category',
+  'categoryRu',
+  'inputFields',
+  'interpretationRules',
+];
+
+/**
+ * Load a TypeScript module by transpiling it to CommonJS in memory
+ */
+function requireTypeScript(filePath, cache = {}) {
+  if (cache[filePath]) return cache[filePath].exports;
+
+  const ts = require('typescript');
+  const source = fs.readFileSync(filePath, 'utf8');
+  const { outputText } = ts.transpileModule(source, {
+    compilerOptions: { module: ts.ModuleKind.CommonJS, target: ts.ScriptTarget.ES2019 },
+    fileName: filePath,
+  });
+
+  const mod = new Module(filePath);
+  mod.filename = filePath;
+  mod.paths = Module._nodeModulePaths(path.dirname(filePath));
+  cache[filePath] = mod;
+
+  // Resolve relative imports to sibling .ts files, everything else normally
+  mod.require = (request) => {
+    if (request.startsWith('.')) {
+      const resolved = path.resolve(path.dirname(filePath), request);
+      const candidate = [resolved, `${resolved}.ts`, path.join(resolved, 'index.ts')]
+        .find(p => fs.existsSync(p) && fs.statSync(p).isFile());
+      if (candidate && candidate.endsWith('.ts')) {
+        return requireTypeScript(candidate, cache);
+      }
+    }
+    return Module.prototype.require.call(mod, request);
+  };
+
+  mod._compile(outputText, filePath);
+  return mod.exports;
+}
+
+/**
+ * Find every exported calculator object in lib/calculators
+ */
+function collectCalculators() {
+  const dir = path.join(process.cwd(), CALCULATORS_DIR);
+  const cache = {};
+  const calculators = [];
+
+  const files = fs.readdirSync(dir)
+    .filter(file => file.endsWith('.ts') && !SUPPORT_MODULES.includes(file) && !file.endsWith('.d.ts'))
+    .sort();
+
+  for (const file of files) {
+    const exports = requireTypeScript(path.join(dir, file), cache);
+    for (const [exportName, value] of Object.entries(exports)) {
+      const isCalculator = value && typeof value === 'object'
+        && typeof value.name === 'string'
+        && Array.isArray(value.inputFields)
+        && typeof value.calculate === 'function';
+      if (!isCalculator) continue;
+
+      const definition = { module: path.basename(file, '.ts'), exportName };
+      for (const field of EXPORTED_FIELDS) {
+        if (value[field] !== undefined) definition[field] = value[field];
+      }
+      calculators.push({ definition, keywords: searchKeywords(value) });
+    }
+  }
+
+  return calculators;
+}
+
+/**
+ * Lowercase search tokens from the names, category and extra keywords
+ * (the app searches in English and Russian)
+ */
+function searchKeywords(calculator) {
+  const text = [
+    calculator.name,
+    calculator.nameRu,
+    calculator.category,
+    calculator.categoryRu,
+    ...(calculator.keywords || []),
+  ].filter(Boolean).join(' ');
+  const tokens = text.toLowerCase().split(/[^0-9a-zа-яё]+/).filter(token => token.length > 1);
+  return [...new Set(tokens)];
+}
+
+function tsString(value) {
+  return `'${String(value).replace(/\\/g, '\\\\').replace(/'/g, "\\'")}'`;
+}
+
+/**
+ * Source of lib/calculators/manifest.ts; each entry imports its module on first load
+ */
+function renderManifest(calculators) {
+  const entries = calculators.map(({ definition, keywords }) => {
+    const lines = MANIFEST_FIELDS
+      .filter(field => definition[field] !== undefined)
+      .map(field => `    ${field}: ${tsString(definition[field])},`);
+    lines.push(`    keywords: [${keywords.map(tsString).join(', ')}],`);
+    lines.push(`    load: () => import('./${definition.module}').then(m => m.${definition.exportName}),`);
+    return `  {\n${lines.join('\n')}\n  },`;
+  });
+
+  return `/**
+ * Calculator manifest
+ * Generated by \`npm run gen calculators\` from lib/calculators - do not edit
+ */
+
+import type { CalculatorManifestEntry } from './types';
+
+export const calculatorManifest: CalculatorManifestEntry[] = [
+${entries.join('\n')}
+];
+`;
+}
+
+function generateCalculators() {
+  resetTracking();
+  say('\nExporting calculator definitions...', 'cyan');
+
+  const collected = collectCalculators();
+  const calculators = collected.map(({ definition }) => definition);
+  const names = new Set();
+  for (const calc of calculators) {
+    if (names.has(calc.name)) {
+      throw new Error(`Duplicate calculator name '${calc.name}'`);
+    }
+    names.add(calc.name);
+  }
+
+  const definitions = {
+    _generated: 'Do not edit - run `npm run gen calculators` after changing lib/calculators',
+    calculators,
+  };
+  createFile(DEFINITIONS_PATH, JSON.stringify(definitions, null, 2) + '\n', { force: true });
+  createFile(MANIFEST_PATH, renderManifest(collected), { force: true });
+
+  say(`Exported ${calculators.length} calculator(s)`, 'green');
+  showSummary();
+}
+
+module.exports = generateCalculators;
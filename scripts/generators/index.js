@@ -13,6 +13,7 @@ const fs = require('fs');
 const generators = {
   authentication: require('./authentication'),
   api: require('./api-generator'),
+  calculators: require('./calculators'),
   // Add more generators here
 };
 
@@ -34,12 +35,17 @@ Available Generators:
   api              Generate API service and types
                    Example: npm run gen api posts index show create update
 
+  calculators      Export lib/calculators definitions for the Python API
+                   and the app manifest
+                   Example: npm run gen calculators
+
 Options:
   --help           Show this help message
 
 Examples:
   npm run gen authentication
   npm run gen api posts index show create update
+  npm run gen calculators
 `);
   process.exit(0);
 }
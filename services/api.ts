@@ -23,7 +23,7 @@ function toSnakeCase(str: string): string {
 /**
  * Deep convert object keys from snake_case to camelCase
  */
-function keysToCamelCase(obj: any): any {
+export function keysToCamelCase(obj: any): any {
   if (obj === null || obj === undefined) return obj;
   if (typeof obj !== 'object') return obj;
 
@@ -62,6 +62,45 @@ function keysToSnakeCase(obj: any): any {
   return result;
 }
 
+/**
+ * Current session token, refreshed from Firebase if it changed
+ */
+export async function getAuthToken(): Promise<string | null> {
+  let token = await storage.get('session_token');
+  
+  // Try to refresh token if available
+  if (token) {
+    try {
+      const { auth } = await import('./firebase');
+      const currentUser = auth.currentUser;
+      if (currentUser) {
+        const { getIdToken } = await import('firebase/auth');
+        const freshToken = await getIdToken(currentUser, false); // Don't force refresh, but ensure it's valid
+        if (freshToken && freshToken !== token) {
+          await storage.set('session_token', freshToken);
+          token = freshToken;
+          console.log('🔄 Token refreshed automatically');
+        }
+      }
+    } catch (error) {
+      console.warn('⚠️ Failed to refresh token:', error);
+      // Continue with existing token
+    }
+  }
+  return token;
+}
+
+/**
+ * Error response from the API (status is the HTTP status code, detail the
+ * response's detail field)
+ */
+export class ApiError extends Error {
+  constructor(message: string, public status: number, public detail?: any) {
+    super(message);
+    this.name = 'ApiError';
+  }
+}
+
 class ApiService {
   private async request<T>(
     url: string,
@@ -69,27 +108,7 @@ class ApiService {
     skipJsonConversion: boolean = false
   ): Promise<T> {
     // Refresh token before each request to ensure it's fresh
-    let token = await storage.get('session_token');
-    
-    // Try to refresh token if available
-    if (token) {
-      try {
-        const { auth } = await import('./firebase');
-        const currentUser = auth.currentUser;
-        if (currentUser) {
-          const { getIdToken } = await import('firebase/auth');
-          const freshToken = await getIdToken(currentUser, false); // Don't force refresh, but ensure it's valid
-          if (freshToken && freshToken !== token) {
-            await storage.set('session_token', freshToken);
-            token = freshToken;
-            console.log('🔄 Token refreshed automatically');
-          }
-        }
-      } catch (error) {
-        console.warn('⚠️ Failed to refresh token:', error);
-        // Continue with existing token
-      }
-    }
+    const token = await getAuthToken();
     const headers: Record<string, string> = {
       ...(options.headers as Record<string, string>),
     };
@@ -118,7 +137,7 @@ class ApiService {
       // For 204 No Content or empty responses, return null
       if (response.status === 204 || response.headers.get('content-length') === '0') {
         if (!response.ok) {
-          throw new Error('Request failed');
+          throw new ApiError('Request failed', response.status);
         }
         return null as T;
       }
@@ -143,7 +162,8 @@ class ApiService {
           }
         }
         
-        throw new Error(data.error || data.errors?.join(', ') || data.detail || 'Request failed');
+        const message = data.error || data.errors?.join(', ') || (typeof data.detail === 'string' ? data.detail : 'Request failed');
+        throw new ApiError(message, response.status, data.detail);
       }
 
       // Convert snake_case response from Rails to camelCase for JS
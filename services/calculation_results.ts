@@ -4,6 +4,7 @@
  */
 
 import { api } from './api';
+import type { BatchItemOutcome, OutboxEntry } from './outbox';
 import type {
   CalculationResult,
   CalculationResultResponse,
@@ -24,16 +25,40 @@ class CalculationResultsService {
   /**
    * Get a single calculation_result by ID
    */
-  async getById(id: number): Promise<CalculationResultResponse> {
+  async getById(id: string): Promise<CalculationResultResponse> {
     return api.get<CalculationResultResponse>(`${API_BASE_URL}/api/v1/calculation_results/${id}`);
   }
 
   /**
    * Create a new calculation_result
-   * Supports both JSON and FormData (for file uploads)
+   * Supports both JSON and FormData (for file uploads); retries with the
+   * same idempotencyKey return the original instead of a duplicate
    */
-  async create(data: CreateCalculationResultInput | FormData): Promise<CalculationResultResponse> {
-    return api.post<CalculationResultResponse>(`${API_BASE_URL}/api/v1/calculation_results`, data);
+  async create(data: CreateCalculationResultInput | FormData, idempotencyKey?: string): Promise<CalculationResultResponse> {
+    return api.post<CalculationResultResponse>(
+      `${API_BASE_URL}/api/v1/calculation_results`,
+      data,
+      idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined
+    );
+  }
+
+  /**
+   * Create queued calculation_results in one request (see services/outbox.ts)
+   * Each item has its own idempotency key and status in the response, and is
+   * stored with the time it was queued rather than the time it was sent
+   */
+  async createBatch(entries: OutboxEntry[]): Promise<BatchItemOutcome[]> {
+    const response = await api.post<{ results: BatchItemOutcome[] }>(
+      `${API_BASE_URL}/api/v1/calculation_results/batch`,
+      {
+        items: entries.map((entry) => ({
+          ...entry.payload,
+          idempotencyKey: entry.key,
+          performedAt: new Date(entry.queuedAt).toISOString(),
+        })),
+      }
+    );
+    return response.results;
   }
 }
 
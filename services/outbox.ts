@@ -0,0 +1,402 @@
+/**
+ * Outbox Service
+ * Persisted queue of calculation result writes. Saves are queued locally and
+ * sent in batches to POST /api/v1/calculation_results/batch, so a result
+ * survives a missing signal or an app restart. Every entry carries an
+ * idempotency key, so resending a batch after a timeout never duplicates it,
+ * and is sent with its queuedAt as performed_at, so a result keeps the time
+ * it was calculated however late it reaches the server. The API rejects
+ * batch entries older than OFFLINE_MAX_AGE_DAYS, so entries close to that
+ * age are re-posted through the single create instead and stored with the
+ * server's time.
+ *
+ * Entries the server refuses (409 or 422) are not dropped: they move to a
+ * rejected list the user can see, export, retry or discard.
+ *
+ * Entries are stored one per key (outbox_item_<seq>, outbox_rejected_<seq>)
+ * because SecureStore values are limited to about 2 KB; outbox_meta and
+ * outbox_rejected_meta hold the bounds of each list.
+ */
+
+import { AppState, Platform } from 'react-native';
+import { storage } from './storage';
+import { ApiError } from './api';
+import { calculationResultsService } from './calculation_results';
+import type { CalculationResult, CreateCalculationResultInput } from '../types/calculation_results';
+
+export interface OutboxEntry {
+  key: string;
+  payload: CreateCalculationResultInput;
+  queuedAt: number;
+}
+
+export interface RejectedEntry extends OutboxEntry {
+  status: number;
+  detail: any;
+  rejectedAt: number;
+  // Key for retries after a 409 (the original key is taken by another payload)
+  retryKey?: string;
+}
+
+export interface BatchItemOutcome {
+  idempotencyKey?: string;
+  status: number;
+  result?: CalculationResult;
+  detail?: any;
+}
+
+export interface OutboxListener {
+  onSaved?: (entry: OutboxEntry, result: CalculationResult) => void;
+  onRejected?: (entry: RejectedEntry, detail: any) => void;
+}
+
+interface OutboxStorage {
+  get(key: string): Promise<string | null>;
+  set(key: string, value: string): Promise<void>;
+  remove(key: string): Promise<void>;
+}
+
+type BatchSender = (entries: OutboxEntry[]) => Promise<BatchItemOutcome[]>;
+type SingleSender = (payload: CreateCalculationResultInput, idempotencyKey: string) => Promise<CalculationResult>;
+
+const META_KEY = 'outbox_meta';
+const ITEM_KEY_PREFIX = 'outbox_item_';
+const REJECTED_META_KEY = 'outbox_rejected_meta';
+const REJECTED_KEY_PREFIX = 'outbox_rejected_';
+
+export const OUTBOX_BATCH_SIZE = 50;
+const MAX_ENTRIES = 500;
+const MAX_REJECTED = 100;
+// A day inside the API's OFFLINE_MAX_AGE_DAYS (30), for clock skew
+const STALE_AFTER_MS = 29 * 24 * 60 * 60 * 1000;
+// Identical saves queued this close together are one save (double taps)
+const COALESCE_MS = 5000;
+// Short delay so saves made in quick succession share a batch
+const FLUSH_DELAY_MS = 250;
+const MIN_RETRY_MS = 2000;
+const MAX_RETRY_MS = 5 * 60 * 1000;
+
+function newIdempotencyKey(): string {
+  const random = globalThis.crypto?.randomUUID?.();
+  if (random) return random;
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
+export class Outbox {
+  private entries: OutboxEntry[] = [];
+  // Storage sequence number of entries[0]
+  private head = 0;
+  private rejectedEntries: RejectedEntry[] = [];
+  // Storage sequence numbers of rejectedEntries, and the next one to use
+  private rejectedSeqs: number[] = [];
+  private nextRejectedSeq = 0;
+  private loading: Promise<void> | null = null;
+  private flushing: Promise<void> | null = null;
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private failures = 0;
+  private started = false;
+  private listeners = new Set<OutboxListener>();
+
+  constructor(
+    private send: BatchSender,
+    private store: OutboxStorage = storage,
+    private create: SingleSender = (payload, key) => calculationResultsService.create(payload, key)
+  ) {}
+
+  /**
+   * Load persisted entries (once)
+   */
+  load(): Promise<void> {
+    if (!this.loading) {
+      this.loading = (async () => {
+        await this.loadRejected();
+        const meta = await this.store.get(META_KEY);
+        if (!meta) return;
+        const { head, count } = JSON.parse(meta) as { head: number; count: number };
+        const loaded: OutboxEntry[] = [];
+        for (let seq = head; seq < head + count; seq++) {
+          const item = await this.store.get(`${ITEM_KEY_PREFIX}${seq}`);
+          if (item) loaded.push(JSON.parse(item));
+        }
+        this.head = head;
+        this.entries = loaded;
+        // A write interrupted mid-way can leave a hole; keep the queue dense
+        if (loaded.length !== count) await this.rewrite();
+      })();
+    }
+    return this.loading;
+  }
+
+  private async loadRejected(): Promise<void> {
+    const meta = await this.store.get(REJECTED_META_KEY);
+    if (!meta) return;
+    const { next, seqs } = JSON.parse(meta) as { next: number; seqs: number[] };
+    this.nextRejectedSeq = next;
+    for (const seq of seqs) {
+      const item = await this.store.get(`${REJECTED_KEY_PREFIX}${seq}`);
+      if (item) {
+        this.rejectedEntries.push(JSON.parse(item));
+        this.rejectedSeqs.push(seq);
+      }
+    }
+  }
+
+  /**
+   * Load the queue, flush it, and flush again whenever the app comes back
+   * to the foreground or the browser goes online
+   */
+  start(): void {
+    if (this.started) return;
+    this.started = true;
+
+    AppState.addEventListener('change', (state) => {
+      if (state === 'active') this.flushSoon(0);
+    });
+    if (Platform.OS === 'web' && typeof window !== 'undefined') {
+      window.addEventListener('online', () => this.flushSoon(0));
+    }
+    this.load().then(() => this.flushSoon(0));
+  }
+
+  subscribe(listener: OutboxListener): () => void {
+    this.listeners.add(listener);
+    return () => {
+      this.listeners.delete(listener);
+    };
+  }
+
+  /**
+   * Entries not yet accepted by the server, oldest first
+   */
+  pending(): OutboxEntry[] {
+    return [...this.entries];
+  }
+
+  /**
+   * Entries the server refused, oldest first
+   */
+  rejected(): RejectedEntry[] {
+    return this.rejectedEntries.map((entry) => ({ ...entry }));
+  }
+
+  /**
+   * Rejected entries as JSON, for the user to keep or send to support
+   */
+  exportRejected(): string {
+    return JSON.stringify(
+      this.rejectedEntries.map((entry) => ({
+        ...entry.payload,
+        queuedAt: new Date(entry.queuedAt).toISOString(),
+        rejectedAt: new Date(entry.rejectedAt).toISOString(),
+        status: entry.status,
+        detail: entry.detail,
+      })),
+      null,
+      2
+    );
+  }
+
+  /**
+   * Send a rejected entry again through the single create (stored with the
+   * server's time); it stays in the rejected list if the server refuses it again
+   */
+  async retryRejected(key: string): Promise<CalculationResult> {
+    await this.load();
+    const index = this.rejectedEntries.findIndex((entry) => entry.key === key);
+    if (index < 0) throw new Error('Rejected save not found');
+
+    const entry = this.rejectedEntries[index];
+    const retryKey = entry.retryKey ?? (entry.status === 409 ? newIdempotencyKey() : entry.key);
+    if (retryKey !== entry.retryKey) {
+      entry.retryKey = retryKey;
+      await this.saveRejected(entry);
+    }
+
+    const outcome = await this.sendOne(entry, retryKey);
+    if (outcome.result) {
+      await this.discardRejected(key);
+      this.listeners.forEach((listener) => listener.onSaved?.(entry, outcome.result as CalculationResult));
+      return outcome.result;
+    }
+
+    entry.status = outcome.status;
+    entry.detail = outcome.detail;
+    entry.rejectedAt = Date.now();
+    await this.saveRejected(entry);
+    throw new ApiError(typeof outcome.detail === 'string' ? outcome.detail : 'Request failed', outcome.status, outcome.detail);
+  }
+
+  /**
+   * Forget a rejected entry
+   */
+  async discardRejected(key: string): Promise<void> {
+    await this.load();
+    const index = this.rejectedEntries.findIndex((entry) => entry.key === key);
+    if (index < 0) return;
+    const [seq] = this.rejectedSeqs.splice(index, 1);
+    this.rejectedEntries.splice(index, 1);
+    await this.writeRejectedMeta();
+    await this.store.remove(`${REJECTED_KEY_PREFIX}${seq}`);
+  }
+
+  /**
+   * Queue a save; resolves once it is persisted locally
+   */
+  async enqueue(payload: CreateCalculationResultInput): Promise<OutboxEntry> {
+    await this.load();
+
+    const serialized = JSON.stringify(payload);
+    const now = Date.now();
+    const duplicate = this.entries.find(
+      (entry) => now - entry.queuedAt < COALESCE_MS && JSON.stringify(entry.payload) === serialized
+    );
+    if (duplicate) return duplicate;
+
+    if (this.entries.length >= MAX_ENTRIES) {
+      throw new Error('Too many unsaved results - connect to the internet to sync them');
+    }
+
+    const entry: OutboxEntry = { key: newIdempotencyKey(), payload, queuedAt: now };
+    const seq = this.head + this.entries.length;
+    this.entries.push(entry);
+    await this.store.set(`${ITEM_KEY_PREFIX}${seq}`, JSON.stringify(entry));
+    await this.writeMeta();
+
+    this.flushSoon(FLUSH_DELAY_MS);
+    return entry;
+  }
+
+  /**
+   * Send queued entries in batches until the queue is empty or a batch fails
+   */
+  flush(): Promise<void> {
+    if (!this.flushing) {
+      this.flushing = this.flushBatches().finally(() => {
+        this.flushing = null;
+      });
+    }
+    return this.flushing;
+  }
+
+  private async flushBatches(): Promise<void> {
+    await this.load();
+
+    while (this.entries.length) {
+      // Entries are oldest first, so stale ones are sent one by one before the rest
+      const stale = Date.now() - this.entries[0].queuedAt > STALE_AFTER_MS;
+      const batch = stale ? this.entries.slice(0, 1) : this.entries.slice(0, OUTBOX_BATCH_SIZE);
+      let outcomes: BatchItemOutcome[];
+      try {
+        outcomes = stale ? [await this.sendOne(batch[0], batch[0].key)] : await this.send(batch);
+      } catch (error) {
+        // Offline, timed out or server error: retry the same batch later
+        this.scheduleRetry();
+        return;
+      }
+
+      const byKey = new Map(outcomes.map((outcome) => [outcome.idempotencyKey, outcome]));
+      let done = 0;
+      for (const entry of batch) {
+        const outcome = byKey.get(entry.key);
+        if (!outcome) break;
+        if (outcome.status === 200 || outcome.status === 201) {
+          this.listeners.forEach((listener) => listener.onSaved?.(entry, outcome.result as CalculationResult));
+        } else if (outcome.status === 409 || outcome.status === 422) {
+          // The server won't accept this entry as sent; keep it for the user instead of retrying
+          const rejected = await this.addRejected(entry, outcome);
+          this.listeners.forEach((listener) => listener.onRejected?.(rejected, outcome.detail));
+        } else {
+          break;
+        }
+        done += 1;
+      }
+
+      await this.removeFirst(done);
+      if (done < batch.length) {
+        this.scheduleRetry();
+        return;
+      }
+      this.failures = 0;
+    }
+  }
+
+  /**
+   * Post one entry through the single create; 409 and 422 become outcomes
+   */
+  private async sendOne(entry: OutboxEntry, idempotencyKey: string): Promise<BatchItemOutcome> {
+    try {
+      const result = await this.create(entry.payload, idempotencyKey);
+      return { idempotencyKey: entry.key, status: 201, result };
+    } catch (error) {
+      if (error instanceof ApiError && (error.status === 409 || error.status === 422)) {
+        return { idempotencyKey: entry.key, status: error.status, detail: error.detail ?? error.message };
+      }
+      throw error;
+    }
+  }
+
+  private async addRejected(entry: OutboxEntry, outcome: BatchItemOutcome): Promise<RejectedEntry> {
+    const rejected: RejectedEntry = { ...entry, status: outcome.status, detail: outcome.detail, rejectedAt: Date.now() };
+    const seq = this.nextRejectedSeq++;
+    this.rejectedEntries.push(rejected);
+    this.rejectedSeqs.push(seq);
+    await this.store.set(`${REJECTED_KEY_PREFIX}${seq}`, JSON.stringify(rejected));
+    while (this.rejectedEntries.length > MAX_REJECTED) {
+      const [dropped] = this.rejectedEntries.splice(0, 1);
+      console.warn('⚠️ Outbox: too many rejected saves, dropping the oldest:', dropped.payload);
+      await this.store.remove(`${REJECTED_KEY_PREFIX}${this.rejectedSeqs.shift()}`);
+    }
+    await this.writeRejectedMeta();
+    return rejected;
+  }
+
+  private async saveRejected(entry: RejectedEntry): Promise<void> {
+    const index = this.rejectedEntries.indexOf(entry);
+    // Discarded meanwhile
+    if (index < 0) return;
+    await this.store.set(`${REJECTED_KEY_PREFIX}${this.rejectedSeqs[index]}`, JSON.stringify(entry));
+  }
+
+  private flushSoon(delay: number): void {
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      this.flush().catch((error) => console.warn('⚠️ Outbox flush failed:', error));
+    }, delay);
+  }
+
+  private scheduleRetry(): void {
+    this.failures += 1;
+    const backoff = Math.min(MAX_RETRY_MS, MIN_RETRY_MS * 2 ** (this.failures - 1));
+    // Jitter so devices coming back online together don't retry in lockstep
+    this.flushSoon(backoff / 2 + Math.random() * backoff / 2);
+  }
+
+  private async removeFirst(count: number): Promise<void> {
+    if (!count) return;
+    const removedFrom = this.head;
+    this.entries = this.entries.slice(count);
+    this.head += count;
+    await this.writeMeta();
+    for (let seq = removedFrom; seq < removedFrom + count; seq++) {
+      await this.store.remove(`${ITEM_KEY_PREFIX}${seq}`);
+    }
+  }
+
+  private async rewrite(): Promise<void> {
+    for (let index = 0; index < this.entries.length; index++) {
+      await this.store.set(`${ITEM_KEY_PREFIX}${this.head + index}`, JSON.stringify(this.entries[index]));
+    }
+    await this.writeMeta();
+  }
+
+  private async writeMeta(): Promise<void> {
+    await this.store.set(META_KEY, JSON.stringify({ head: this.head, count: this.entries.length }));
+  }
+
+  private async writeRejectedMeta(): Promise<void> {
+    await this.store.set(REJECTED_META_KEY, JSON.stringify({ next: this.nextRejectedSeq, seqs: this.rejectedSeqs }));
+  }
+}
+
+export const outbox = new Outbox((entries) => calculationResultsService.createBatch(entries));
@@ -0,0 +1,124 @@
+/**
+ * Result Events Service
+ * Live calculation result updates from GET /api/v1/calculation_results/stream
+ * (Server-Sent Events). Read over XMLHttpRequest so it works in React Native
+ * without an EventSource polyfill, and so the auth header can be sent.
+ */
+
+import { getAuthToken, keysToCamelCase } from './api';
+import type { CalculationResult } from '../types/calculation_results';
+import { API_BASE_URL } from '../config/api';
+
+export type ResultEvent =
+  | { type: 'created'; result: CalculationResult }
+  | { type: 'deleted'; id: CalculationResult['id'] }
+  | { type: 'resync' };
+
+const STREAM_URL = `${API_BASE_URL}/api/v1/calculation_results/stream`;
+const MAX_RETRY_MS = 60000;
+// XHR keeps the whole response body; reconnect before it grows large
+const MAX_RESPONSE_CHARS = 1_000_000;
+
+/**
+ * Open the result event stream; reconnects with backoff until unsubscribed.
+ * A "resync" event is emitted after every reconnect, since events may have
+ * been missed while disconnected.
+ */
+export function subscribeToResultEvents(onEvent: (event: ResultEvent) => void): () => void {
+  let closed = false;
+  let xhr: XMLHttpRequest | null = null;
+  let retryTimer: ReturnType<typeof setTimeout> | null = null;
+  let retryMs = 3000;
+  let failures = 0;
+  let connectedBefore = false;
+
+  const handleFrame = (frame: string) => {
+    let eventName = 'message';
+    const data: string[] = [];
+    for (const line of frame.split('\n')) {
+      if (line.startsWith(':')) continue; // heartbeat
+      const colon = line.indexOf(':');
+      const field = colon < 0 ? line : line.slice(0, colon);
+      const value = colon < 0 ? '' : line.slice(colon + 1).replace(/^ /, '');
+      if (field === 'event') eventName = value;
+      else if (field === 'data') data.push(value);
+      else if (field === 'retry' && !isNaN(Number(value))) retryMs = Number(value);
+    }
+    if (!data.length) return;
+
+    const payload = JSON.parse(data.join('\n'));
+    if (eventName === 'created') {
+      onEvent({ type: 'created', result: keysToCamelCase(payload) });
+    } else if (eventName === 'deleted') {
+      onEvent({ type: 'deleted', id: payload.id });
+    } else if (eventName === 'resync') {
+      onEvent({ type: 'resync' });
+    }
+  };
+
+  const scheduleReconnect = () => {
+    if (closed || retryTimer) return;
+    failures += 1;
+    const delay = Math.min(MAX_RETRY_MS, retryMs * 2 ** (failures - 1));
+    retryTimer = setTimeout(() => {
+      retryTimer = null;
+      connect();
+    }, delay);
+  };
+
+  const connect = async () => {
+    const token = await getAuthToken();
+    if (closed) return;
+
+    const request = new XMLHttpRequest();
+    xhr = request;
+    let offset = 0;
+    let buffer = '';
+
+    request.onprogress = () => {
+      if (request.status !== 200) return;
+      if (offset === 0) {
+        failures = 0;
+        if (connectedBefore) onEvent({ type: 'resync' });
+        connectedBefore = true;
+      }
+
+      const text = request.responseText;
+      buffer += text.slice(offset);
+      offset = text.length;
+
+      let end = buffer.indexOf('\n\n');
+      while (end >= 0) {
+        try {
+          handleFrame(buffer.slice(0, end));
+        } catch (error) {
+          console.warn('⚠️ Bad result event:', error);
+        }
+        buffer = buffer.slice(end + 2);
+        end = buffer.indexOf('\n\n');
+      }
+
+      if (offset > MAX_RESPONSE_CHARS) request.abort();
+    };
+
+    request.onloadend = () => {
+      if (xhr === request) xhr = null;
+      scheduleReconnect();
+    };
+
+    request.open('GET', STREAM_URL);
+    request.setRequestHeader('Accept', 'text/event-stream');
+    if (token) {
+      request.setRequestHeader('Authorization', `Bearer ${token}`);
+    }
+    request.send();
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    if (retryTimer) clearTimeout(retryTimer);
+    xhr?.abort();
+  };
+}
@@ -6,22 +6,70 @@
 
 import { create } from 'zustand';
 import { calculationResultsService } from '@/services/calculation_results';
+import { outbox, type OutboxEntry, type RejectedEntry } from '@/services/outbox';
+import { subscribeToResultEvents, type ResultEvent } from '@/services/resultEvents';
 import type { CalculationResult, CreateCalculationResultInput, UpdateCalculationResultInput } from '@/types/calculation_results';
 
 interface CalculationResultsStore {
   // State
   items: CalculationResult[];
+  // Saves the server refused, kept on the device until retried or discarded
+  rejected: RejectedEntry[];
   loading: boolean;
   error: string | null;
 
   // Actions
   fetchAll: () => Promise<void>;
   addItem: (data: CreateCalculationResultInput | FormData) => Promise<CalculationResult>;
+  retryRejected: (key: string) => Promise<void>;
+  discardRejected: (key: string) => Promise<void>;
+  applyEvent: (event: ResultEvent) => void;
+  startLiveUpdates: () => () => void;
   reset: () => void;
 }
 
-export const useCalculationResultsStore = create<CalculationResultsStore>((set) => ({
+// One stream shared by every screen showing results
+let liveSubscribers = 0;
+let stopStream: (() => void) | null = null;
+
+/**
+ * Placeholder shown for a save still waiting in the outbox
+ */
+function pendingItem(entry: OutboxEntry): CalculationResult {
+  const queuedAt = new Date(entry.queuedAt).toISOString();
+  return {
+    ...entry.payload,
+    id: `pending-${entry.key}`,
+    userId: '',
+    performedAt: queuedAt,
+    createdAt: queuedAt,
+    updatedAt: queuedAt,
+    pending: true,
+    idempotencyKey: entry.key,
+  };
+}
+
+/**
+ * Put a saved result in place of its pending placeholder (or on top)
+ */
+function mergeSaved(items: CalculationResult[], saved: CalculationResult, key?: string): CalculationResult[] {
+  let placed = false;
+  const merged: CalculationResult[] = [];
+  for (const item of items) {
+    const matches = item.id === saved.id || (key !== undefined && item.idempotencyKey === key);
+    if (!matches) {
+      merged.push(item);
+    } else if (!placed) {
+      merged.push(saved);
+      placed = true;
+    }
+  }
+  return placed ? merged : [saved, ...merged];
+}
+
+export const useCalculationResultsStore = create<CalculationResultsStore>((set, get) => ({
   items: [],
+  rejected: [],
   loading: false,
   error: null,
 
@@ -29,7 +77,9 @@ export const useCalculationResultsStore = create<CalculationResultsStore>((set)
     set({ loading: true, error: null });
     try {
       const items = await calculationResultsService.getAll();
-      set({ items, loading: false });
+      // Saves still queued offline stay visible on top
+      const pending = outbox.pending().reverse().map(pendingItem);
+      set({ items: [...pending, ...items], rejected: outbox.rejected(), loading: false });
     } catch (error: any) {
       console.error('Failed to fetch calculation_results:', error);
       set({ error: error.message || 'Failed to load calculation_results', loading: false });
@@ -37,21 +87,98 @@ export const useCalculationResultsStore = create<CalculationResultsStore>((set)
   },
 
   addItem: async (data: CreateCalculationResultInput | FormData) => {
-    set({ loading: true, error: null });
+    // File uploads can't be queued; send them directly
+    if (data instanceof FormData) {
+      set({ loading: true, error: null });
+      try {
+        const newItem = await calculationResultsService.create(data);
+        set((state) => ({ items: mergeSaved(state.items, newItem), loading: false, error: null }));
+        return newItem;
+      } catch (error: any) {
+        console.error('Failed to create calculation_result:', error);
+        set({ error: error.message || 'Failed to create calculation_result', loading: false });
+        throw error;
+      }
+    }
+
+    // Optimistic: shown immediately, saved by the outbox when online
     try {
-      const newItem = await calculationResultsService.create(data);
+      const entry = await outbox.enqueue(data);
+      const item = pendingItem(entry);
       set((state) => ({
-        items: [newItem, ...state.items],
-        loading: false,
+        items: state.items.some((existing) => existing.idempotencyKey === entry.key)
+          ? state.items
+          : [item, ...state.items],
         error: null
       }));
-      return newItem;
+      return item;
     } catch (error: any) {
-      console.error('Failed to create calculation_result:', error);
-      set({ error: error.message || 'Failed to create calculation_result', loading: false });
+      console.error('Failed to queue calculation_result:', error);
+      set({ error: error.message || 'Failed to create calculation_result' });
       throw error;
     }
   },
 
+  retryRejected: async (key: string) => {
+    try {
+      await outbox.retryRejected(key);
+      set({ rejected: outbox.rejected(), error: null });
+    } catch (error: any) {
+      console.error('Failed to retry calculation_result:', error);
+      set({ rejected: outbox.rejected(), error: error.message || 'Failed to save calculation result' });
+    }
+  },
+
+  discardRejected: async (key: string) => {
+    await outbox.discardRejected(key);
+    set({ rejected: outbox.rejected() });
+  },
+
+  applyEvent: (event: ResultEvent) => {
+    if (event.type === 'created') {
+      set((state) => ({ items: mergeSaved(state.items, event.result, event.result.idempotencyKey) }));
+    } else if (event.type === 'deleted') {
+      set((state) => ({ items: state.items.filter((item) => item.id !== event.id) }));
+    } else {
+      get().fetchAll();
+    }
+  },
+
+  startLiveUpdates: () => {
+    liveSubscribers += 1;
+    if (!stopStream) {
+      stopStream = subscribeToResultEvents((event) => get().applyEvent(event));
+    }
+    let stopped = false;
+    return () => {
+      if (stopped) return;
+      stopped = true;
+      liveSubscribers -= 1;
+      if (liveSubscribers === 0 && stopStream) {
+        stopStream();
+        stopStream = null;
+      }
+    };
+  },
+
   reset: () => set({ items: [], loading: false, error: null }),
 }));
+
+// Reconcile optimistic placeholders as the outbox drains
+outbox.subscribe({
+  onSaved: (entry, result) => {
+    useCalculationResultsStore.setState((state) => ({
+      items: mergeSaved(state.items, result, entry.key),
+    }));
+  },
+  onRejected: (entry, detail) => {
+    console.error('Calculation result rejected by server:', detail);
+    useCalculationResultsStore.setState((state) => ({
+      items: state.items.filter((item) => item.idempotencyKey !== entry.key),
+      rejected: outbox.rejected(),
+      error: typeof detail === 'string' ? detail : 'Failed to save calculation result',
+    }));
+  },
+});
+outbox.start();
+outbox.load().then(() => useCalculationResultsStore.setState({ rejected: outbox.rejected() }));
@@ -7,8 +7,8 @@
  */
 
 export interface CalculationResult {
-  id: number;
-  userId: number;
+  id: string;
+  userId: string;
   calculatorName: string;
   calculatorNameRu?: string;
   inputData: Record<string, any>;
@@ -17,6 +17,9 @@ export interface CalculationResult {
   performedAt: string;
   createdAt: string;
   updatedAt: string;
+  // Queued in the offline outbox, not yet saved on the server
+  pending?: boolean;
+  idempotencyKey?: string;
 }
 
 export interface CreateCalculationResultInput {